@@ -8,88 +8,51 @@ Analysis on the calibration of probabilities and anticipated goals
 import numpy as np
 import pandas as pd
 import os
-from sklearn.calibration import calibration_curve
 import matplotlib.pyplot as plt
-from bettingCalculationTools.ProbabilityCalculation import BasicNormalisation, ShinModel
-from bettingCalculationTools.AnticipatedGoalsCalculation import Regression, InvertedPoisson
-from bettingCalculationTools.DataImport import DataImporter
-from scipy.stats import binned_statistic
 from bettingCalculationTools.Metrics import MetricsCalculation
-from AverageCalculation import AverageCalculation
+from bettingCalculationTools.Calibration import Calibration, outcomes
+from DataPipeline import createStandardPipeline
 
 
 
-#loads, prepares and saves all data
-def prepareData():
-    root = os.path.join(os.path.dirname(__file__), "input")
-    mapping = os.path.join(os.path.dirname(__file__), "inputMappings\inputMappingMatchDataAverageOdds.csv")
-    data = DataImporter.inputAllFiles(root, mapping, missingDataAllowed = ['shotsHome', 'shotsAway', 'shotsTargetHome', 'shotsTargetAway'])
-    
-    #add average points and goals to data
-    data = AverageCalculation.calculateAverages(data)
-    
-    #add data for two different methods of probability calculation
-    Calculator = BasicNormalisation()
-    dataBasicNormalisation = Calculator.addProbabilities(data)
-    dataBasicNormalisation.to_csv(os.path.join(os.path.dirname(__file__), "data\dataBasicNormalisation.csv"))
-
-    Calculator = ShinModel()
-    dataShin = Calculator.addProbabilities(data)
-    dataShin.to_csv(os.path.join(os.path.dirname(__file__), "data\dataShin.csv"))
+#input folder and mapping of all data used in the analysis
+root = os.path.join(os.path.dirname(__file__), "input")
+mapping = os.path.join(os.path.dirname(__file__), "inputMappings\inputMappingMatchDataAverageOdds.csv")
 
-    #add data for two different methods of anticipated goals calculation based on the Shin probabilities
-    Calculator = Regression("linear")
-    dataRegression = Calculator.addAnticipatedGoals(dataShin)
-    dataRegression.to_csv(os.path.join(os.path.dirname(__file__), "data\dataRegression.csv"))
-    
-    Calculator = InvertedPoisson()
-    dataInvertedPoisson = Calculator.addAnticipatedGoals(dataShin, os.path.join(os.path.dirname(__file__), "data\Table.csv"))
-    dataInvertedPoisson.to_csv(os.path.join(os.path.dirname(__file__), "data\dataInvertedPoisson.csv"))
-    
 
+#loads, prepares and saves all data (probabilities with two different methods and anticipated goals with two different methods based on the Shin probabilities)
+def prepareData(pipeline):
+    for stage in ['basicNormalisation', 'shin', 'regression', 'invertedPoisson']:
+        pipeline.run(stage)
     
     
     
 #calculates the mean squared error between anticipated and actual goals for various methods  
-def analysisMeanSquaredErrors():
-    #read data
-    dataShin = pd.read_csv(os.path.join(os.path.dirname(__file__), "data\dataShin.csv"), sep = ",")   
-    dataRegression = pd.read_csv(os.path.join(os.path.dirname(__file__), "data\dataRegression.csv"), sep = ",")   
-    dataInvertedPoisson = pd.read_csv(os.path.join(os.path.dirname(__file__), "data\dataInvertedPoisson.csv"), sep = ",")     
-    
+def analysisMeanSquaredErrors(pipeline):
+    #read data and combine anticipated goals of all methods
+    keys = ['date', 'teamHome', 'teamAway']
+    data = pipeline.obtain('shin')
+    data = data.merge(pipeline.obtain('invertedPoisson')[keys + ['anticipatedGoalsHome', 'anticipatedGoalsAway']], on = keys, how = 'left')
+    data = data.merge(pipeline.obtain('regression')[keys + ['anticipatedGoalsHome', 'anticipatedGoalsAway']], on = keys, how = 'left', suffixes = ('InvertedPoisson', 'Regression'))
+    goalModels = {'Average Home Advantage': ['avgGoalsHomeAllTeams', 'avgGoalsAwayAllTeams'],
+                  'Average Goals': ['anticipatedGoalsHomeAverage', 'anticipatedGoalsAwayAverage'],
+                  'Inverse Poisson': ['anticipatedGoalsHomeInvertedPoisson', 'anticipatedGoalsAwayInvertedPoisson'],
+                  'Regression': ['anticipatedGoalsHomeRegression', 'anticipatedGoalsAwayRegression']}
 
     #print results    
     print('----- All Matches -----')
-    print('MSE Average Home Advantage')
-    print(MetricsCalculation.calculateSquaredErrorAverageHA(dataShin))
-    print('MSE Average Goals')
-    print(MetricsCalculation.calculateSquaredErrorAverageGoals(dataShin))
-    print('MSE Inverse Poisson')
-    print(MetricsCalculation.calculateSquaredErrorAnticipatedGoals(dataInvertedPoisson))
-    print('MSE Regression')
-    print(MetricsCalculation.calculateSquaredErrorAnticipatedGoals(dataRegression))
-        
-    dataShin = dataShin[dataShin['round']=='second']
-    dataRegression = dataRegression[dataRegression['round']=='second']
-    dataInvertedPoisson = dataInvertedPoisson[dataInvertedPoisson['round']=='second']
+    print(MetricsCalculation.scoreModels(data, goalModels = goalModels))
         
     print('----- Only Second round -----')
-    print('MSE Average Home Advantage')
-    print(MetricsCalculation.calculateSquaredErrorAverageHA(dataShin))
-    print('MSE Average Goals')
-    print(MetricsCalculation.calculateSquaredErrorAverageGoals(dataShin))
-    print('MSE Inverse Poisson')
-    print(MetricsCalculation.calculateSquaredErrorAnticipatedGoals(dataInvertedPoisson))
-    print('MSE Regression')
-    print(MetricsCalculation.calculateSquaredErrorAnticipatedGoals(dataRegression))
+    print(MetricsCalculation.scoreModels(data[data['round']=='second'], goalModels = goalModels))
     
     
     
 #plots calibration curves for home win probabilities for two methods (Basic Normalisation and Shin Formula)
-def plotCalibrationProbabilityHome():
+def plotCalibrationProbabilityHome(pipeline):
     #read data
-    dataShin = pd.read_csv(os.path.join(os.path.dirname(__file__), "data\dataShin.csv"), sep = ",")   
-    dataBasicNormalisation = pd.read_csv(os.path.join(os.path.dirname(__file__), "data\dataBasicNormalisation.csv"), sep = ",")   
+    dataShin = pipeline.obtain('shin')   
+    dataBasicNormalisation = pipeline.obtain('basicNormalisation')   
 
          
     # plot baseline
@@ -119,26 +82,18 @@ def plotCalibrationProbabilityHome():
 
     #plot calibration curves
     #home
-    y_true = dataBasicNormalisation['goalsHome']>dataBasicNormalisation['goalsAway']
-    y_pred = dataBasicNormalisation['probHome']
-    prob_true, prob_pred = calibration_curve(y_true, y_pred, n_bins=10, strategy = 'quantile')
-    ax1.plot(prob_pred, prob_true, marker='o', linewidth=1, color = 'firebrick', markersize=4, label='basic normalisation')
-
-    
-
-    y_true = dataShin['goalsHome']>dataShin['goalsAway']
-    y_pred = dataShin['probHome']
-    prob_true, prob_pred = calibration_curve(y_true, y_pred, n_bins=10, strategy = 'quantile')
-    ax2.plot(prob_pred, prob_true, marker='o', linewidth=1, color = 'firebrick', markersize=4, label='Shin')
-  
+    reliability = Calibration(10, 'quantile').calculateReliability({'basic normalisation': dataBasicNormalisation, 'Shin': dataShin}, {'Home': ('probHome', outcomes['home'])})
+    for method, ax in [('basic normalisation', ax1), ('Shin', ax2)]:
+        curve = reliability[reliability['method'] == method]
+        ax.plot(curve['predicted'], curve['observed'], marker='o', linewidth=1, color = 'firebrick', markersize=4, label=method)
         
 
     
  #plots calibration curves for two methods (Basic Normalisation and Shin Formula) and all match outcomes
-def plotCalibrationProbabilities():
+def plotCalibrationProbabilities(pipeline):
     #read data
-    dataShin = pd.read_csv(os.path.join(os.path.dirname(__file__), "data\dataShin.csv"), sep = ",")   
-    dataBasicNormalisation = pd.read_csv(os.path.join(os.path.dirname(__file__), "data\dataBasicNormalisation.csv"), sep = ",")   
+    dataShin = pipeline.obtain('shin')   
+    dataBasicNormalisation = pipeline.obtain('basicNormalisation')   
     
         
     #plot calibration for two methods and all match outcomes
@@ -195,66 +150,24 @@ def plotCalibrationProbabilities():
     
 
 
-    #plot calibration curves
-    #home
-    y_true = dataBasicNormalisation['goalsHome']>dataBasicNormalisation['goalsAway']
-    y_pred = dataBasicNormalisation['probHome']
-    prob_true, prob_pred = calibration_curve(y_true, y_pred, n_bins=10, strategy = 'quantile')
-    fig1Home.plot(prob_pred, prob_true, marker='o', linewidth=1, color = 'firebrick', markersize=4, label='basic normalisation')
-    #draw
-    y_true = dataBasicNormalisation['goalsHome']==dataBasicNormalisation['goalsAway']
-    y_pred = dataBasicNormalisation['probDraw']
-    prob_true, prob_pred = calibration_curve(y_true, y_pred, n_bins=10, strategy = 'quantile')
-    fig1Draw.plot(prob_pred, prob_true, marker='o', linewidth=1, color = 'firebrick', markersize=4, label='basic normalisation')
-    #away
-    y_true = dataBasicNormalisation['goalsHome']<dataBasicNormalisation['goalsAway']
-    y_pred = dataBasicNormalisation['probAway']
-    prob_true, prob_pred = calibration_curve(y_true, y_pred, n_bins=10, strategy = 'quantile')
-    fig1Away.plot(prob_pred, prob_true, marker='o', linewidth=1, color = 'firebrick', markersize=4, label='basic normalisation')
-    #over25
-    y_true = dataBasicNormalisation['goalsHome']+dataBasicNormalisation['goalsAway']>2.5
-    y_pred = dataBasicNormalisation['probOver25']
-    prob_true, prob_pred = calibration_curve(y_true, y_pred, n_bins=10, strategy = 'quantile')
-    fig1Over.plot(prob_pred, prob_true, marker='o', linewidth=1, color = 'firebrick', markersize=4, label='basic normalisation')
-    #over25
-    y_true = dataBasicNormalisation['goalsHome']+dataBasicNormalisation['goalsAway']<2.5
-    y_pred = dataBasicNormalisation['probUnder25']
-    prob_true, prob_pred = calibration_curve(y_true, y_pred, n_bins=10, strategy = 'quantile')
-    fig1Under.plot(prob_pred, prob_true, marker='o', linewidth=1, color = 'firebrick', markersize=4, label='basic normalisation')
-
-    
-
-    y_true = dataShin['goalsHome']>dataShin['goalsAway']
-    y_pred = dataShin['probHome']
-    prob_true, prob_pred = calibration_curve(y_true, y_pred, n_bins=10, strategy = 'quantile')
-    fig2Home.plot(prob_pred, prob_true, marker='o', linewidth=1, color = 'firebrick', markersize=4, label='Shin')
-    #draw
-    y_true = dataShin['goalsHome']==dataShin['goalsAway']
-    y_pred = dataShin['probDraw']
-    prob_true, prob_pred = calibration_curve(y_true, y_pred, n_bins=10, strategy = 'quantile')
-    fig2Draw.plot(prob_pred, prob_true, marker='o', linewidth=1, color = 'firebrick', markersize=4, label='Shin')
-    #away
-    y_true = dataShin['goalsHome']<dataShin['goalsAway']
-    y_pred = dataShin['probAway']
-    prob_true, prob_pred = calibration_curve(y_true, y_pred, n_bins=10, strategy = 'quantile')
-    fig2Away.plot(prob_pred, prob_true, marker='o', linewidth=1, color = 'firebrick', markersize=4, label='Shin')
-    #over25
-    y_true = dataShin['goalsHome']+dataShin['goalsAway']>2.5
-    y_pred = dataShin['probOver25']
-    prob_true, prob_pred = calibration_curve(y_true, y_pred, n_bins=10, strategy = 'quantile')
-    fig2Over.plot(prob_pred, prob_true, marker='o', linewidth=1, color = 'firebrick', markersize=4, label='Shin')
-    #over25
-    y_true = dataShin['goalsHome']+dataShin['goalsAway']<2.5
-    y_pred = dataShin['probUnder25']
-    prob_true, prob_pred = calibration_curve(y_true, y_pred, n_bins=10, strategy = 'quantile')
-    fig2Under.plot(prob_pred, prob_true, marker='o', linewidth=1, color = 'firebrick', markersize=4, label='Shin')
+    #plot calibration curves for all match outcomes
+    predictions = {'Home': ('probHome', outcomes['home']),
+                   'Draw': ('probDraw', outcomes['draw']),
+                   'Away': ('probAway', outcomes['away']),
+                   'Over25': ('probOver25', outcomes['over25']),
+                   'Under25': ('probUnder25', outcomes['under25'])}
+    reliability = Calibration(10, 'quantile').calculateReliability({'basic normalisation': dataBasicNormalisation, 'Shin': dataShin}, predictions)
+    axes = {('basic normalisation', 'Home'): fig1Home, ('basic normalisation', 'Draw'): fig1Draw, ('basic normalisation', 'Away'): fig1Away, ('basic normalisation', 'Over25'): fig1Over, ('basic normalisation', 'Under25'): fig1Under,
+            ('Shin', 'Home'): fig2Home, ('Shin', 'Draw'): fig2Draw, ('Shin', 'Away'): fig2Away, ('Shin', 'Over25'): fig2Over, ('Shin', 'Under25'): fig2Under}
+    for (method, prediction), curve in reliability.groupby(['method', 'prediction']):
+        axes[(method, prediction)].plot(curve['predicted'], curve['observed'], marker='o', linewidth=1, color = 'firebrick', markersize=4, label=method)
          
        
    
-def plotCalibrationAnticipatedGoals():
+def plotCalibrationAnticipatedGoals(pipeline):
     #read data
-    dataInvertedPoisson = pd.read_csv(os.path.join(os.path.dirname(__file__), "data\dataInvertedPoisson.csv"), sep = ",")   
-    dataRegression = pd.read_csv(os.path.join(os.path.dirname(__file__), "data\dataRegression.csv"), sep = ",")   
+    dataInvertedPoisson = pipeline.obtain('invertedPoisson')   
+    dataRegression = pipeline.obtain('regression')   
     
     #genrate plot including four figures
     fig, ((ax1, ax3), (ax2, ax4)) = plt.subplots(2,2,figsize = (15, 10))
@@ -276,43 +189,28 @@ def plotCalibrationAnticipatedGoals():
     ax3.title.set_text('Home Goals - Regression')
     ax4.title.set_text('Away Goals - Regression')
 
-    #generate and plot calibration curves
-    for method in ['dataInvertedPoisson', 'dataRegression']:
-        if(method == 'dataInvertedPoisson'):
-            data = dataInvertedPoisson
-        if(method == 'dataRegression'):
-            data = dataRegression
-    
-
-        antHome = data['anticipatedGoalsHome']
-        realHome = data['goalsHome']
-        antAway = data['anticipatedGoalsAway']
-        realAway = data['goalsAway']
-     
-        binsHome = []
-        binsAway = []
-        for i in np.linspace(0,1,11):
-            binsHome.append(np.quantile(antHome, i))
-            binsAway.append(np.quantile(antAway, i))
-        xHome = binned_statistic(antHome, antHome, statistic='mean', bins=binsHome).statistic
-        yHome = binned_statistic(antHome, realHome, statistic=np.nanmean, bins=binsHome).statistic
-        xAway = binned_statistic(antAway, antAway, statistic='mean', bins=binsAway).statistic
-        yAway = binned_statistic(antAway, realAway, statistic=np.nanmean, bins=binsAway).statistic
-            
-        if(method == 'dataInvertedPoisson'):
-            ax1.scatter(xHome, yHome)
-            ax2.scatter(xAway, yAway)
-        if(method == 'dataRegression'):
-            ax3.scatter(xHome, yHome)
-            ax4.scatter(xAway, yAway)
+    #generate and plot calibration curves (bins of the same number of matches including their lower edge)
+    predictions = {'Home': ('anticipatedGoalsHome', 'goalsHome'),
+                   'Away': ('anticipatedGoalsAway', 'goalsAway')}
+    reliability = Calibration(10, 'quantile', rightClosed = False).calculateReliability({'dataInvertedPoisson': dataInvertedPoisson, 'dataRegression': dataRegression}, predictions)
+    axes = {('dataInvertedPoisson', 'Home'): ax1, ('dataInvertedPoisson', 'Away'): ax2, ('dataRegression', 'Home'): ax3, ('dataRegression', 'Away'): ax4}
+    for (method, prediction), curve in reliability.groupby(['method', 'prediction']):
+        axes[(method, prediction)].scatter(curve['predicted'], curve['observed'])
         
         
 
-prepareData()   
-analysisMeanSquaredErrors()
-plotCalibrationProbabilityHome()
-plotCalibrationProbabilities()
-plotCalibrationAnticipatedGoals()
+#runs the whole analysis on the pipeline of all data of the input folder (also used by the command-line entry point)
+def runAnalysis(root = root, mapping = mapping):
+    pipeline = createStandardPipeline(root, mapping, missingDataAllowed = ['shotsHome', 'shotsAway', 'shotsTargetHome', 'shotsTargetAway'])
+    prepareData(pipeline)   
+    analysisMeanSquaredErrors(pipeline)
+    plotCalibrationProbabilityHome(pipeline)
+    plotCalibrationProbabilities(pipeline)
+    plotCalibrationAnticipatedGoals(pipeline)
+
+
+if __name__ == '__main__':
+    runAnalysis()
 
     
 
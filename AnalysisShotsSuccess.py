@@ -9,26 +9,24 @@ import os
 import numpy as np
 import pandas as pd
 from bettingCalculationTools.DataImport import DataImporter
-from bettingCalculationTools.ProbabilityCalculation import ShinModel
-from bettingCalculationTools.AnticipatedGoalsCalculation import InvertedPoisson
+from DataPipeline import createStandardPipeline
 import matplotlib.pyplot as plt
 
 
 
+#input folder and mapping of all data used in the analysis
+root = os.path.join(os.path.dirname(__file__), "input")
+mapping = os.path.join(os.path.dirname(__file__), "inputMappings\inputMappingMatchDataAverageOdds.csv")
+
+
 #loads and saves all data
-def saveData():
-    root = os.path.join(os.path.dirname(__file__), "input")
-    mapping = os.path.join(os.path.dirname(__file__), "inputMappings\inputMappingMatchDataAverageOdds.csv")
-    DataImporter.inputAllFiles(root, mapping, missingDataAllowed = ['shotsHome', 'shotsAway', 'shotsTargetHome', 'shotsTargetAway'])
+def saveData(pipeline):
+    pipeline.run('data')
 
 #prepares and saves data to be used for the visualisations
-def prepareData():
-    data = pd.read_csv(os.path.join(os.path.dirname(__file__), "data\data.csv"), sep = ",")   
-
-    #add favourite information, probabilities and anticipated number of goals
-    Calculator = ShinModel()
-    data = Calculator.addProbabilities(data)
-    data = InvertedPoisson().addAnticipatedGoals(data, os.path.join(os.path.dirname(__file__), "data\Table.csv"))
+def prepareData(pipeline):
+    #data including Shin probabilities and anticipated number of goals (shared with the calibration analysis)
+    data = pipeline.obtain('invertedPoisson')
 
     dataHome = data[['league','date','teamHome','result','goalsHome','shotsHome','shotsAway','shotsTargetHome','shotsTargetAway','season','oddsHome','oddsDraw', 'oddsAway', 'probHome','probDraw','anticipatedGoalsHome']].copy()
     dataAway = data[['league','date','teamAway','result','goalsAway','shotsAway','shotsHome','shotsTargetAway','shotsTargetHome','season','oddsAway','oddsDraw','oddsHome', 'probAway','probDraw','anticipatedGoalsAway']].copy()
@@ -40,7 +38,7 @@ def prepareData():
     dataHome['result'] = dataHome['result'].map({'H': 'W', 'A': 'L'})
     dataAway['result'] = dataAway['result'].map({'A': 'W', 'H': 'L'})
     
-    data = pd.concat([dataHome, dataAway])
+    data = pd.concat([dataHome, dataAway], ignore_index = True)
     
     data['fav'] = data.apply (lambda row: DataImporter.favOut(row), axis=1)
         
@@ -148,11 +146,18 @@ def visualiseDataAnticipatedGoals(variable, data):
     
     
 
-saveData()     
-prepareData() 
-visualiseDataFavoriteOutsider('shots', pd.read_csv(os.path.join(os.path.dirname(__file__), "data\dataPrepared.csv"), sep = ","))
-visualiseDataWinningProbability('shots', pd.read_csv(os.path.join(os.path.dirname(__file__), "data\dataPrepared.csv"), sep = ","))
-visualiseDataAnticipatedGoals('shots', pd.read_csv(os.path.join(os.path.dirname(__file__), "data\dataPrepared.csv"), sep = ","))
-visualiseDataFavoriteOutsider('shotsTarget', pd.read_csv(os.path.join(os.path.dirname(__file__), "data\dataPrepared.csv"), sep = ","))
-visualiseDataWinningProbability('shotsTarget', pd.read_csv(os.path.join(os.path.dirname(__file__), "data\dataPrepared.csv"), sep = ","))
-visualiseDataAnticipatedGoals('shotsTarget', pd.read_csv(os.path.join(os.path.dirname(__file__), "data\dataPrepared.csv"), sep = ","))
+#runs the whole analysis on the pipeline of all data of the input folder (also used by the command-line entry point)
+def runAnalysis(root = root, mapping = mapping):
+    pipeline = createStandardPipeline(root, mapping, missingDataAllowed = ['shotsHome', 'shotsAway', 'shotsTargetHome', 'shotsTargetAway'])
+    saveData(pipeline)     
+    dataPrepared = prepareData(pipeline)
+    visualiseDataFavoriteOutsider('shots', dataPrepared.copy())
+    visualiseDataWinningProbability('shots', dataPrepared.copy())
+    visualiseDataAnticipatedGoals('shots', dataPrepared.copy())
+    visualiseDataFavoriteOutsider('shotsTarget', dataPrepared.copy())
+    visualiseDataWinningProbability('shotsTarget', dataPrepared.copy())
+    visualiseDataAnticipatedGoals('shotsTarget', dataPrepared.copy())
+
+
+if __name__ == '__main__':
+    runAnalysis()
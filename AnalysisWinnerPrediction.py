@@ -5,95 +5,60 @@
 Analysis on the accuracy of betting odds in picking the winner of a match compared to several other methods
 """
 
+import numpy as np
 import pandas as pd
-from bettingCalculationTools.DataImport import DataImporter
-from AverageCalculation import AverageCalculation
 import os
-from EloModel import EloRating
-from statsmodels.stats.proportion import proportion_confint
+from DataPipeline import createStandardPipeline
+from bettingCalculationTools.Metrics import MetricsCalculation
 import matplotlib.pyplot as plt 
 
 #best performing Elo specification in the present experiment
 ha = 80
 k = 25
 
+#input folder and mapping of all data used in the analysis
+root = os.path.join(os.path.dirname(__file__), "input")
+mapping = os.path.join(os.path.dirname(__file__), "inputMappings\inputMappingMatchDataAverageOdds.csv")
+
 #loads, prepares and saves all data
-def prepareData():
-    root = os.path.join(os.path.dirname(__file__), "input")
-    mapping = os.path.join(os.path.dirname(__file__), "inputMappings\inputMappingMatchDataAverageOdds.csv")
-    data = DataImporter.inputAllFiles(root, mapping, missingDataAllowed = ['shotsHome', 'shotsAway', 'shotsTargetHome', 'shotsTargetAway'])
-    data = AverageCalculation.calculateAverages(data)
-    
-    Rating = EloRating()
-    data = Rating.calculateRating(data, k, ha)
-    
-    data.to_csv(os.path.join(os.path.dirname(__file__), "data\dataWinnerPrediction.csv"))
+def prepareData(pipeline):
+    return pipeline.obtain('elo')
 
 
 #analyses and prints the accuracy of betting odds and further method to correctly predict the winner of a match 
 def calculateAccuracyWinnerPrediction(data, excludeSeason = 'NAN'):
     
-    #exclude draws, set favourites and check winners
-    data.insert(len(data.columns),'winner',0)
-    data.loc[data['goalsHome'] > data['goalsAway'], 'winner'] = 1
-    data.loc[data['goalsHome'] < data['goalsAway'], 'winner'] = 2
-    
     #exclude first season to allow fair comparison to Elo ratings
     print('Number of total matches: '+str(len(data.index)))
     data = data[data['season'] != excludeSeason]
+    draws = data['goalsHome'] == data['goalsAway']
     print('Number of total matches wo season '+excludeSeason+': '+str(len(data.index)))
-    print('Number of draw matches: '+str(len(data[data['winner'] == 0].index)))
-    print('Percentage of draw matches: '+str(len(data[data['winner'] == 0].index)/len(data.index)))
-    data = data[data['winner'] != 0]
-    print('Number of matches without draw: ' + str(len(data.index)))
-        
-    data.insert(len(data.columns),'location',1)
-        
-    data.insert(len(data.columns),'odds',0)
-    data.loc[data['oddsHome'] < data['oddsAway'], 'odds'] = 1
-    data.loc[data['oddsHome'] > data['oddsAway'], 'odds'] = 2
-
-    data.insert(len(data.columns),'points',0)
-    data.loc[data['avgPointsHome'] > data['avgPointsAway'], 'points'] = 1
-    data.loc[data['avgPointsHome'] < data['avgPointsAway'], 'points'] = 2
+    print('Number of draw matches: '+str(draws.sum()))
+    print('Percentage of draw matches: '+str(draws.sum()/len(data.index)))
+    print('Number of matches without draw: ' + str(len(data.index) - draws.sum()))
     
-    data.insert(len(data.columns),'elo',0)
-    data.loc[data['eloHome']+ha > data['eloAway'], 'elo'] = 1
-    data.loc[data['eloHome']+ha < data['eloAway'], 'elo'] = 2
-        
-    data.insert(len(data.columns),'goals',0)
-    data.loc[data['avgGoalsHome'] - data['avgGoalsAgainstHome'] > data['avgGoalsAway'] - data['avgGoalsAgainstAway'], 'goals'] = 1
-    data.loc[data['avgGoalsHome'] - data['avgGoalsAgainstHome'] < data['avgGoalsAway'] - data['avgGoalsAgainstAway'], 'goals'] = 2    
+    #favourites of all methods as difference in strength between home and away team (draws are excluded by the accuracy calculation)
+    predictors = {'location': lambda data: np.ones(len(data.index)),
+                  'odds': lambda data: data['oddsAway'] - data['oddsHome'],
+                  'points': lambda data: data['avgPointsHome'] - data['avgPointsAway'],
+                  'goals': lambda data: (data['avgGoalsHome'] - data['avgGoalsAgainstHome']) - (data['avgGoalsAway'] - data['avgGoalsAgainstAway']),
+                  'elo': lambda data: data['eloHome'] + ha - data['eloAway']}
+    accuracy = MetricsCalculation.calculateWinnerAccuracy(data, predictors, groupings = [[], ['round'], ['season', 'round']])
 
     #print results for each of the methods
-    dataBySeason = pd.DataFrame()
-    for variable in ['location', 'odds', 'points', 'goals', 'elo']:
-        dataEval = data[data[variable] != 0]
-        
-        n = len(dataEval.index)
-        favouriteWins = len(dataEval[dataEval['winner'] == dataEval[variable]].index)
-        print('------------ '+variable+' -----------------')
-        print('Total matches '+ str(n))
-        print('Number of favourite wins '+str(favouriteWins))
-        print('Percentage of favourite wins '+str(favouriteWins/n))
-        print('Confidence Interval Lower '+str(proportion_confint(favouriteWins, n, method = 'binom_test')[0]))
-        print('Confidence Interval Upper '+str(proportion_confint(favouriteWins, n, method = 'binom_test')[1]))
-        
-        #clculate accuracies by half seasons to be used in the plot
-        nSeason = dataEval.groupby(['season', 'round'])['season'].count()
-        favoriteWinsSeason = dataEval[dataEval['winner'] == dataEval[variable]].groupby(['season', 'round'])['season'].count()
-        accuracySeason = favoriteWinsSeason / nSeason * 100
-        dataBySeason[variable]=accuracySeason
-        
-        dataEval = dataEval[dataEval['round']=='second']
-        n = len(dataEval.index)
-        favouriteWins = len(dataEval[dataEval['winner'] == dataEval[variable]].index)
-        print('------------ Only second -----------------')
-        print('Total matches '+ str(n))
-        print('Number of favourite wins '+str(favouriteWins))
-        print('Percentage of favourite wins '+str(favouriteWins/n))
-        print('Confidence Interval Lower '+str(proportion_confint(favouriteWins, n, method = 'binom_test')[0]))
-        print('Confidence Interval Upper '+str(proportion_confint(favouriteWins, n, method = 'binom_test')[1]))
+    overall = accuracy[accuracy['grouping'] == 'overall'].set_index('predictor')
+    second = accuracy[(accuracy['grouping'] == 'round') & (accuracy['round'] == 'second')].set_index('predictor')
+    for variable in predictors:
+        for title, results in [(variable, overall), ('Only second', second)]:
+            print('------------ '+title+' -----------------')
+            print('Total matches '+ str(results.loc[variable, 'matches']))
+            print('Number of favourite wins '+str(results.loc[variable, 'hits']))
+            print('Percentage of favourite wins '+str(results.loc[variable, 'rate']))
+            print('Confidence Interval Lower '+str(results.loc[variable, 'lower']))
+            print('Confidence Interval Upper '+str(results.loc[variable, 'upper']))
+    
+    #accuracies by half seasons to be used in the plot
+    dataBySeason = accuracy[accuracy['grouping'] == 'season/round'].pivot(index = ['season', 'round'], columns = 'predictor', values = 'rate') * 100
 
     
     #plot accuracies by half season
@@ -125,7 +90,13 @@ def calculateAccuracyWinnerPrediction(data, excludeSeason = 'NAN'):
             
     plt.show()
     
-prepareData()
-#calculateAccuracyWinnerPrediction(pd.read_csv(os.path.join(os.path.dirname(__file__), "data\dataWinnerPrediction.csv")), '2005/2006')
-calculateAccuracyWinnerPrediction(pd.read_csv(os.path.join(os.path.dirname(__file__), "data\dataWinnerPrediction.csv")))
+#calculateAccuracyWinnerPrediction(prepareData(pipeline), '2005/2006')
+#runs the whole analysis on the pipeline of all data of the input folder (also used by the command-line entry point)
+def runAnalysis(root = root, mapping = mapping):
+    pipeline = createStandardPipeline(root, mapping, missingDataAllowed = ['shotsHome', 'shotsAway', 'shotsTargetHome', 'shotsTargetAway'], k = k, ha = ha)
+    calculateAccuracyWinnerPrediction(prepareData(pipeline))
+
+
+if __name__ == '__main__':
+    runAnalysis()
    
\ No newline at end of file
@@ -3,25 +3,25 @@
 @author: FW
 """
 
-import os
 import numpy as np
 import pandas as pd
+from bettingCalculationTools.Instrumentation import instrumented
 
 
 #class ised to calculate the average number of points or goals to be used in further analysis
 class AverageCalculation:
 
-    #expects dataframe and calculates average number of points and goals for each team in each match 
-    def calculateAverages(data):
+    #expects dataframe and calculates average number of points and goals for each team in each match (no file is written, the pipeline exports the averages to data/dataAverages.csv)
+    #if a state is given (see TeamStateStore), averages continue from the state and the state is updated with the new matches
+    @instrumented('averages')
+    def calculateAverages(data, state = None):
         #reset to use right order
         data['date'] = pd.to_datetime(data['date'], format = '%d/%m/%y')
         data.sort_values(by=['date','teamHome','teamAway'], ascending = [True, True, True], inplace=True)
         data.reset_index(drop = True, inplace=True)
         
         #set season and flag for first/second round
-        data['round'] = np.nan
-        data.loc[data['date'].dt.month >= 7, 'round'] = 'first'
-        data.loc[data['date'].dt.month < 7, 'round'] = 'second'
+        data['round'] = np.where(data['date'].dt.month >= 7, 'first', 'second')
         
         #add points to data
         conditions = [data['goalsHome'] > data['goalsAway'],
@@ -33,77 +33,99 @@ class AverageCalculation:
         data['pointsAway'] = np.select(conditions, choices, default=3)
         
 
-        #calculation of average goals and points for each team as well as averages across teams and anticipated goals based on these
-        data.insert(len(data.columns),'avgGoalsHome',np.nan)
-        data.insert(len(data.columns),'avgGoalsAway',np.nan)
-        data.insert(len(data.columns),'avgGoalsAgainstHome',np.nan)
-        data.insert(len(data.columns),'avgGoalsAgainstAway',np.nan)
-        data.insert(len(data.columns),'avgPointsHome',np.nan)
-        data.insert(len(data.columns),'avgPointsAway',np.nan)
-        data.insert(len(data.columns),'avgGoalsHomeAllTeams',np.nan)
-        data.insert(len(data.columns),'avgGoalsAwayAllTeams',np.nan)
-        avgGoalsHomeAllTeams = 0
-        avgGoalsAwayAllTeams = 0
-        data.insert(len(data.columns),'anticipatedGoalsHomeAverage',np.nan)
-        data.insert(len(data.columns),'anticipatedGoalsAwayAverage',np.nan)
+        #calculation of average goals and points for each team before each match (reset for every new season of a team)
+        averages = AverageCalculation.calculateTeamAverages(data, None if state is None else state['teams'])
+        data['avgGoalsHome'] = averages['goals'][0]
+        data['avgGoalsAway'] = averages['goals'][1]
+        data['avgGoalsAgainstHome'] = averages['goalsAgainst'][0]
+        data['avgGoalsAgainstAway'] = averages['goalsAgainst'][1]
+        data['avgPointsHome'] = averages['points'][0]
+        data['avgPointsAway'] = averages['points'][1]
         
+        #averages of home/away goals across all teams and all previous matches
+        allTeams = {'matches': 0, 'goalsHome': 0.0, 'goalsAway': 0.0} if state is None else state['allTeams']
+        data['avgGoalsHomeAllTeams'] = AverageCalculation.calculatePreviousAverage(data['goalsHome'].to_numpy(dtype=float), allTeams['matches'], allTeams['goalsHome'])
+        data['avgGoalsAwayAllTeams'] = AverageCalculation.calculatePreviousAverage(data['goalsAway'].to_numpy(dtype=float), allTeams['matches'], allTeams['goalsAway'])
+        if(state is not None):
+            allTeams['matches'] += len(data.index)
+            allTeams['goalsHome'] += float(data['goalsHome'].sum())
+            allTeams['goalsAway'] += float(data['goalsAway'].sum())
         
-        teamInformation = dict.fromkeys(np.unique(np.concatenate([data['teamHome'], data['teamAway']])))
-        for key in teamInformation:
-            teamInformation[key] = {'season': 'None', 'goals': 0, 'goalsAgainst':0, 'points': 0, 'matches': 0}
-            
-        #iterate over all matches
-        for i in range(0,len(data.index)):
-            teamHome = data['teamHome'][i]
-            teamAway = data['teamAway'][i]
-            season = data['season'][i]
-            goalsHome = data['goalsHome'][i]
-            goalsAway = data['goalsAway'][i]
-            pointsHome = data['pointsHome'][i]
-            pointsAway = data['pointsAway'][i]
-
-                
-            #reset data in case of new season
-            if(season != teamInformation[teamHome]['season']):
-                teamInformation[teamHome] = {'season': 'None', 'goals': 0, 'goalsAgainst': 0, 'points': 0, 'match': 0}
-            if(season != teamInformation[teamAway]['season']):
-                teamInformation[teamAway] = {'season': 'None', 'goals': 0, 'goalsAgainst': 0, 'points': 0, 'match': 0}                
-            
-            #set average goals and points for both teams as well as averages across all teams and anticipated goals based on these
-            data.iloc[i, data.columns.get_loc('avgPointsHome')] = teamInformation[teamHome]['points']
-            data.iloc[i, data.columns.get_loc('avgGoalsHome')] = teamInformation[teamHome]['goals']
-            data.iloc[i, data.columns.get_loc('avgGoalsAgainstHome')] = teamInformation[teamHome]['goalsAgainst']
-            data.iloc[i, data.columns.get_loc('avgPointsAway')] = teamInformation[teamAway]['points']
-            data.iloc[i, data.columns.get_loc('avgGoalsAway')] = teamInformation[teamAway]['goals']
-            data.iloc[i, data.columns.get_loc('avgGoalsAgainstAway')] = teamInformation[teamAway]['goalsAgainst']
-            data.iloc[i, data.columns.get_loc('avgGoalsHomeAllTeams')] = avgGoalsHomeAllTeams
-            data.iloc[i, data.columns.get_loc('avgGoalsAwayAllTeams')] = avgGoalsAwayAllTeams
-            anticipatedGoalDiffAverage = 1/2*((data['avgGoalsHome'][i] - data['avgGoalsAgainstHome'][i]) - (data['avgGoalsAway'][i] - data['avgGoalsAgainstAway'][i]))
-            data.iloc[i, data.columns.get_loc('anticipatedGoalsHomeAverage')] = data['avgGoalsHomeAllTeams'][i] + 1/2 * anticipatedGoalDiffAverage
-            data.iloc[i, data.columns.get_loc('anticipatedGoalsAwayAverage')] = data['avgGoalsAwayAllTeams'][i] - 1/2 * anticipatedGoalDiffAverage
-            
-            
-            
-            #update team information, particularly average goals and points
-            match = teamInformation[teamHome]['match']
-            teamInformation[teamHome]['points'] = (teamInformation[teamHome]['points']*match + pointsHome)/(match + 1)
-            teamInformation[teamHome]['goals'] = (teamInformation[teamHome]['goals']*match + goalsHome)/(match + 1)
-            teamInformation[teamHome]['goalsAgainst'] = (teamInformation[teamHome]['goalsAgainst']*match + goalsAway)/(match + 1)
-            teamInformation[teamHome]['season'] = season
-            teamInformation[teamHome]['match'] = match + 1
-            
-            match = teamInformation[teamAway]['match']
-            teamInformation[teamAway]['points'] = (teamInformation[teamAway]['points']*match + pointsAway)/(match + 1)
-            teamInformation[teamAway]['goals'] = (teamInformation[teamAway]['goals']*match + goalsAway)/(match + 1)
-            teamInformation[teamAway]['goalsAgainst'] = (teamInformation[teamAway]['goalsAgainst']*match + goalsHome)/(match + 1)
-            teamInformation[teamAway]['season'] = season
-            teamInformation[teamAway]['match'] = match + 1
-            
-            #update average number of home/away goals across all teams
-            avgGoalsHomeAllTeams = (avgGoalsHomeAllTeams*(i)+goalsHome)/(i+1)
-            avgGoalsAwayAllTeams = (avgGoalsAwayAllTeams*(i)+goalsAway)/(i+1)            
-       
-        data.to_csv(os.path.join(os.path.dirname(__file__), "data\dataAverages.csv"))          
+        #anticipated goals based on the averages
+        anticipatedGoalDiffAverage = 1/2*((data['avgGoalsHome'] - data['avgGoalsAgainstHome']) - (data['avgGoalsAway'] - data['avgGoalsAgainstAway']))
+        data['anticipatedGoalsHomeAverage'] = data['avgGoalsHomeAllTeams'] + 1/2 * anticipatedGoalDiffAverage
+        data['anticipatedGoalsAwayAverage'] = data['avgGoalsAwayAllTeams'] - 1/2 * anticipatedGoalDiffAverage
         return data
-            
     
+    
+    #helper method to calculate the average of all previous values for each element of an array (0 for the first element)
+    #count and sum of values before the array can be given to continue an average
+    def calculatePreviousAverage(values, initialCount = 0, initialSum = 0.0):
+        previousSums = np.cumsum(values) - values + initialSum
+        previousCounts = np.arange(len(values)) + initialCount
+        return np.divide(previousSums, previousCounts, out=np.zeros(len(values)), where=previousCounts > 0)
+    
+    
+    #calculates the average goals, goals against and points of each team in all previous matches of the same season of the team
+    #uses a long format with one row per team and match, sorted by team and match, where a new season of a team starts a new group
+    #returns a dictionary of arrays with home teams in the first and away teams in the second row
+    #teamState is an optional dictionary of matches and sums in the current season per team (see TeamStateStore) that is continued and updated
+    def calculateTeamAverages(data, teamState = None):
+        numberMatches = len(data.index)
+        teams, teamNames = pd.factorize(pd.concat([data['teamHome'], data['teamAway']], ignore_index=True))
+        positions = np.tile(np.arange(numberMatches), 2)
+        sides = np.repeat([0, 1], numberMatches)
+        seasons, seasonNames = pd.factorize(pd.concat([data['season'], data['season']], ignore_index=True))
+        values = {'goals': np.concatenate([data['goalsHome'], data['goalsAway']]).astype(float),
+                  'goalsAgainst': np.concatenate([data['goalsAway'], data['goalsHome']]).astype(float),
+                  'points': np.concatenate([data['pointsHome'], data['pointsAway']]).astype(float)}
+        
+        order = np.lexsort((positions, teams))
+        teams = teams[order]
+        seasons = seasons[order]
+        
+        #each group is a consecutive run of matches of a team in the same season
+        groupStart = np.ones(len(order), dtype=bool)
+        groupStart[1:] = (teams[1:] != teams[:-1]) | (seasons[1:] != seasons[:-1])
+        groupStartIndex = np.maximum.accumulate(np.where(groupStart, np.arange(len(order)), 0))
+        previousCounts = np.arange(len(order)) - groupStartIndex
+        
+        #the first group of a team continues the stored season of the team
+        initialCounts = np.zeros(len(order))
+        initialSums = {variable: np.zeros(len(order)) for variable in values}
+        if(teamState is not None):
+            firstAppearance = np.flatnonzero(np.insert(teams[1:] != teams[:-1], 0, True))
+            for i in firstAppearance:
+                stored = teamState.get(teamNames[teams[i]])
+                if(stored is not None and stored['season'] == seasonNames[seasons[i]]):
+                    initialCounts[i] = stored['matches']
+                    for variable in values:
+                        initialSums[variable][i] = stored[variable]
+            previousCounts = previousCounts + initialCounts[groupStartIndex]
+        lastAppearance = np.append(np.flatnonzero(teams[1:] != teams[:-1]), len(order) - 1)
+        
+        averages = {}
+        for variable in values:
+            sortedValues = values[variable][order]
+            #missing values are summed as 0 and counted separately, so that they only make the averages of the same group missing (as in a loop over the matches)
+            missing = np.isnan(sortedValues)
+            knownValues = np.where(missing, 0.0, sortedValues)
+            cumulativeSums = np.cumsum(knownValues)
+            cumulativeMissing = np.cumsum(missing)
+            #sums of all previous matches within the group
+            previousSums = cumulativeSums - knownValues - (cumulativeSums - knownValues)[groupStartIndex] + initialSums[variable][groupStartIndex]
+            previousMissing = cumulativeMissing - missing - (cumulativeMissing - missing)[groupStartIndex]
+            previousSums[previousMissing > 0] = np.nan
+            average = np.divide(previousSums, previousCounts, out=np.zeros(len(order)), where=previousCounts > 0)
+            averages[variable] = np.empty((2, numberMatches))
+            averages[variable][sides[order], positions[order]] = average
+            
+            if(teamState is not None):
+                for i in lastAppearance:
+                    teamState.setdefault(teamNames[teams[i]], {})[variable] = float(previousSums[i] + sortedValues[i])
+        
+        if(teamState is not None):
+            for i in lastAppearance:
+                teamState[teamNames[teams[i]]]['season'] = seasonNames[seasons[i]]
+                teamState[teamNames[teams[i]]]['matches'] = int(previousCounts[i] + 1)
+        return averages
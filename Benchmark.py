@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+Benchmark of all stages of the data preparation (import, averages, probabilities, anticipated goals, Elo ratings and metrics) on synthetic data of several sizes
+Results are saved as json files, so that runs of different versions of the code can be compared to find regressions
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+import tracemalloc
+import numpy as np
+import pandas as pd
+from SyntheticData import SyntheticDataGenerator
+from bettingCalculationTools.DataImport import DataImporter
+from bettingCalculationTools.Metrics import MetricsCalculation
+from bettingCalculationTools.ProbabilityModelling import PoissonModel
+from AverageCalculation import AverageCalculation
+from DataPipeline import addProbabilities, addRegressionGoals, addInvertedPoissonGoals, addEloRatings
+
+
+#default directories of the generated data and the results
+benchmarkDirectory = os.path.join(os.path.dirname(__file__), 'data', 'benchmarks')
+defaultMapping = os.path.join(os.path.dirname(__file__), 'inputMappings', 'inputMappingMatchDataAverageOdds.csv')
+
+
+#functions of the benchmarked stages
+def importSyntheticData(directory, mapping):
+    return DataImporter.inputAllFiles(directory, mapping, missingDataAllowed = ['shotsHome', 'shotsAway', 'shotsTargetHome', 'shotsTargetAway'], cache = False)
+
+def calculatePoissonTable():
+    return PoissonModel().calculateTable()
+
+def scoreStandardModels(data):
+    return MetricsCalculation.scoreModels(data, {'shin': ['probHome', 'probDraw', 'probAway', 'probOver25', 'probUnder25']},
+                                          {'invertedPoisson': ['anticipatedGoalsHome', 'anticipatedGoalsAway'], 'averages': ['anticipatedGoalsHomeAverage', 'anticipatedGoalsAwayAverage']})
+
+
+#stages as name: (name of the input stage, function), in the order of execution, the import stage is called with the folder of the generated files and the mapping
+standardStages = {'import': (None, importSyntheticData),
+                  'averages': ('import', AverageCalculation.calculateAverages),
+                  'basicNormalisation': ('averages', lambda data: addProbabilities(data, 'basicNormalisation')),
+                  'shin': ('averages', lambda data: addProbabilities(data, 'shin')),
+                  'table': (None, calculatePoissonTable),
+                  'invertedPoisson': ('shin', lambda data: addInvertedPoissonGoals(data, 0.0, 6.0, 0.025, False)),
+                  'regression': ('shin', lambda data: addRegressionGoals(data, 'linear')),
+                  'elo': ('averages', lambda data: addEloRatings(data, 25, 80)),
+                  'metrics': ('invertedPoisson', scoreStandardModels)}
+
+
+#times every stage for synthetic data of all sizes (approximate numbers of matches, see SyntheticDataGenerator.createForMatches)
+#the time is the minimum of the repeated runs, the memory is the peak of the memory allocated by the stage (measured in a separate run, as tracing slows down the stage)
+class Benchmark:
+
+    def __init__(self, sizes = [10000, 100000], repeats = 3, memory = True, stages = None, directory = benchmarkDirectory, mapping = defaultMapping, generatorArguments = {}):
+        self.sizes = sizes
+        self.repeats = repeats
+        self.memory = memory
+        self.stages = standardStages if stages is None else {name: standardStages[name] for name in standardStages if name in stages}
+        self.directory = directory
+        self.mapping = mapping
+        self.generatorArguments = generatorArguments
+
+
+    #runs all sizes, saves the results and returns them as dataframe with one row per size and stage
+    def run(self, file = None):
+        results = []
+        for size in self.sizes:
+            generator = SyntheticDataGenerator.createForMatches(size, **self.generatorArguments)
+            dataDirectory = self.generateData(generator)
+            outputs = {}
+            for name, (inputName, function) in self.stages.items():
+                if(inputName is not None and inputName not in outputs):
+                    raise ValueError("Stage "+name+" needs the stage "+inputName)
+                if(name == 'import'):
+                    arguments = (dataDirectory, self.mapping)
+                elif(inputName is None):
+                    arguments = ()
+                else:
+                    arguments = (outputs[inputName],)
+                seconds, peakMemory, outputs[name] = self.measureStage(function, arguments)
+                results.append({'size': size, 'matches': generator.countMatches(), 'data': generator.createName(), 'stage': name,
+                                'seconds': seconds, 'peakMemoryMB': peakMemory, 'repeats': self.repeats})
+                print("Benchmark of "+name+" for "+str(generator.countMatches())+" matches: "+str(round(seconds, 3))+" s")
+        results = pd.DataFrame(results)
+        self.saveResults(results, file)
+        return results
+
+
+    #generates the data of a generator once, further runs use the existing files
+    def generateData(self, generator):
+        dataDirectory = os.path.join(self.directory, 'synthetic', generator.createName())
+        completeFile = os.path.join(dataDirectory, 'complete.json')
+        if(not os.path.exists(completeFile)):
+            generator.generate(os.path.join(dataDirectory, 'input'))
+            with open(completeFile, 'w') as file:
+                json.dump({'matches': generator.countMatches()}, file)
+        return os.path.join(dataDirectory, 'input')
+
+
+    #returns the minimum time of all repeats, the peak memory in MB (or NaN) and the output of the stage
+    #inputs are copied before every run, as some stages change the given data (e.g. sorting)
+    def measureStage(self, function, arguments):
+        times = []
+        for repeat in range(self.repeats):
+            copies = [argument.copy() if isinstance(argument, pd.DataFrame) else argument for argument in arguments]
+            start = time.perf_counter()
+            output = function(*copies)
+            times.append(time.perf_counter() - start)
+
+        peakMemory = np.nan
+        if(self.memory):
+            copies = [argument.copy() if isinstance(argument, pd.DataFrame) else argument for argument in arguments]
+            tracemalloc.start()
+            try:
+                function(*copies)
+                peakMemory = tracemalloc.get_traced_memory()[1] / 2**20
+            finally:
+                tracemalloc.stop()
+        return min(times), peakMemory, output
+
+
+    #saves the results together with the environment as json file (default is a new file with the current time in the benchmark directory)
+    def saveResults(self, results, file = None):
+        if(file is None):
+            file = os.path.join(self.directory, 'benchmark_' + time.strftime('%Y%m%d_%H%M%S') + '.json')
+        os.makedirs(os.path.dirname(os.path.abspath(file)), exist_ok = True)
+        content = {'environment': Benchmark.describeEnvironment(),
+                   'results': results.to_dict(orient = 'records')}
+        with open(file, 'w') as output:
+            json.dump(content, output, indent = 1)
+        print("Saved benchmark results to "+file)
+
+
+    #versions of python and the main packages as well as the git commit of the code (if available)
+    def describeEnvironment():
+        try:
+            commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd = os.path.dirname(os.path.abspath(__file__)), capture_output = True, text = True).stdout.strip()
+        except OSError:
+            commit = ''
+        return {'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'commit': commit,
+                'python': sys.version.split()[0],
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'platform': platform.platform(),
+                'processor': platform.processor(),
+                'cpus': os.cpu_count()}
+
+
+    #loads the results of a saved run
+    def loadResults(file):
+        with open(file) as content:
+            return pd.DataFrame(json.load(content)['results'])
+
+
+    #compares a run with a baseline run for all sizes and stages of both runs
+    #ratios above the threshold are flagged as regressions (e.g. 1.2 for 20 % slower or more memory)
+    def compareResults(baselineFile, file, threshold = 1.2):
+        keys = ['size', 'stage']
+        baseline = Benchmark.loadResults(baselineFile)
+        results = Benchmark.loadResults(file)
+        comparison = baseline[keys + ['seconds', 'peakMemoryMB']].merge(results[keys + ['seconds', 'peakMemoryMB']], on = keys, suffixes = ('Baseline', ''))
+        comparison['ratioSeconds'] = comparison['seconds'] / comparison['secondsBaseline']
+        comparison['ratioMemory'] = comparison['peakMemoryMB'] / comparison['peakMemoryMBBaseline']
+        comparison['regression'] = (comparison['ratioSeconds'] > threshold) | (comparison['ratioMemory'] > threshold)
+        return comparison
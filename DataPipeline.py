@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+Memoized pipeline of the data preparation (import, averages, probabilities, anticipated goals and Elo ratings) shared by all analysis scripts
+"""
+
+import os
+import sys
+import dis
+import json
+import types
+import inspect
+import pickle
+import hashlib
+import pandas as pd
+from collections import OrderedDict
+from bettingCalculationTools.DataImport import DataImporter
+from bettingCalculationTools.ProbabilityCalculation import BasicNormalisation, ShinModel
+from bettingCalculationTools.AnticipatedGoalsCalculation import Regression, InvertedPoisson
+from AverageCalculation import AverageCalculation
+from EloModel import EloRating
+
+
+#default directories of the cached results of all stages and of the exported csv files
+pipelineCacheDirectory = os.path.join(os.path.dirname(__file__), 'data', 'pipelineCache')
+exportDirectory = os.path.join(os.path.dirname(__file__), 'data')
+#only the source code of modules in this directory is part of the cache keys (see findModules)
+sourceDirectory = os.path.dirname(os.path.abspath(__file__))
+
+#results of all stages calculated or loaded in this process (by key of the stage), shared by all pipelines
+#only the memoryCacheSize results used last are kept, memoryCache.clear() releases all of them
+memoryCache = OrderedDict()
+memoryCacheSize = 16
+
+
+#a stage of the pipeline, the function is called with the outputs of all input stages (in the given order) and the parameters as keyword arguments
+#columns are the output columns the stage has to provide, files is an optional function returning all files the stage reads (e.g. input files of the import)
+#if export is given, the output is saved as csv file with this name whenever the stage is executed
+#the source files of the modules used by the function are part of the cache key (see findModules), version is part of the cache key as well and can be increased to recalculate a stage for other reasons (e.g. changed libraries)
+class PipelineStage:
+
+    def __init__(self, name, function, inputs = [], parameters = {}, columns = [], files = None, export = None, version = 1):
+        self.name = name
+        self.function = function
+        self.version = version
+        self.inputs = inputs
+        self.parameters = parameters
+        self.columns = columns
+        self.files = files
+        self.export = export
+
+
+#executes stages in order of their dependencies and caches their results by a hash of the upstream data and the parameters of the stage
+#a stage is only executed if its inputs or parameters changed, otherwise the result is taken from memory or from the cache directory
+class DataPipeline:
+
+    def __init__(self, stages, directory = pipelineCacheDirectory, exportDirectory = exportDirectory):
+        self.stages = {stage.name: stage for stage in stages}
+        self.directory = directory
+        self.exportDirectory = exportDirectory
+
+
+    #returns the output of a stage, all stages it depends on are executed or loaded first
+    #a copy is returned, so that the cached results are not changed by further analysis
+    def obtain(self, name):
+        return self.run(name)[0].copy()
+
+
+    #returns the output and the hash of the output of a stage
+    def run(self, name):
+        stage = self.stages[name]
+        upstream = [self.run(inputName) for inputName in stage.inputs]
+        key = self.calculateKey(stage, [dataHash for data, dataHash in upstream])
+        if(key in memoryCache):
+            memoryCache.move_to_end(key)
+            return memoryCache[key]
+
+        cachedFile = os.path.join(self.directory, stage.name + '_' + key + '.pkl')
+        if(os.path.exists(cachedFile)):
+            print("Loading cached stage: "+stage.name)
+            data = pd.read_pickle(cachedFile)
+        else:
+            print("Executing stage: "+stage.name)
+            #inputs are copied, as some stages change the given data (e.g. sorting)
+            data = stage.function(*[data.copy() for data, dataHash in upstream], **stage.parameters)
+            missingColumns = [column for column in stage.columns if column not in data]
+            if(len(missingColumns) > 0):
+                raise ValueError("Stage "+stage.name+" does not provide the columns "+str(missingColumns))
+            self.saveResult(data, cachedFile)
+            if(stage.export is not None):
+                data.to_csv(os.path.join(self.exportDirectory, stage.export))
+
+        result = (data, DataPipeline.hashData(data))
+        memoryCache[key] = result
+        while(len(memoryCache) > memoryCacheSize):
+            memoryCache.popitem(last = False)
+        return result
+
+
+    #key of a stage from its name, version, the source code of its function and of the modules it uses, parameters, the hashes of the outputs of its inputs and the size and modification time of all files read by the stage
+    def calculateKey(self, stage, inputHashes):
+        content = [stage.name, str(stage.version), DataPipeline.readSource(stage.function), json.dumps(stage.parameters, sort_keys = True, default = str)] + inputHashes
+        for module in DataPipeline.findModules(stage.function):
+            with open(module.__file__, 'rb') as source:
+                content += [module.__name__, hashlib.sha256(source.read()).hexdigest()]
+        if(stage.files is not None):
+            for file in stage.files(**stage.parameters):
+                fileStat = os.stat(file)
+                content += [os.path.abspath(file), str(fileStat.st_size), str(fileStat.st_mtime_ns)]
+        return hashlib.sha256('|'.join(content).encode()).hexdigest()
+
+
+    #source code of the function of a stage (of the undecorated function), functions without available source (e.g. built-ins) are identified by their name
+    def readSource(function):
+        try:
+            return inspect.getsource(inspect.unwrap(function))
+        except (OSError, TypeError):
+            return getattr(function, '__module__', '') + '.' + getattr(function, '__qualname__', repr(function))
+
+
+    #modules of the repository used by a function: the modules of all classes, functions and modules the function refers to and, recursively, all modules of the repository these modules refer to
+    #(e.g. ProbabilityModelling and Markets for a stage calling InvertedPoisson), modules outside of sourceDirectory (e.g. pandas) are not considered
+    def findModules(function):
+        def findModule(value):
+            module = value if isinstance(value, types.ModuleType) else sys.modules.get(getattr(value, '__module__', None) or '')
+            if(module is not None and os.path.abspath(getattr(module, '__file__', None) or os.sep).startswith(os.path.join(sourceDirectory, ''))):
+                return module
+            return None
+        
+        function = inspect.unwrap(function)
+        #global names loaded by the function (and by functions defined within it), attribute names are not considered
+        codes = [function.__code__]
+        names = set()
+        while(len(codes) > 0):
+            code = codes.pop()
+            names.update(instruction.argval for instruction in dis.get_instructions(code) if instruction.opname in ['LOAD_GLOBAL', 'LOAD_NAME'])
+            codes += [constant for constant in code.co_consts if isinstance(constant, types.CodeType)]
+        pending = [findModule(function.__globals__[name]) for name in names if name in function.__globals__]
+        modules = {}
+        while(len(pending) > 0):
+            module = pending.pop()
+            if(module is None or module.__name__ in modules):
+                continue
+            modules[module.__name__] = module
+            pending += [findModule(value) for value in list(vars(module).values())]
+        return [modules[name] for name in sorted(modules)]
+
+
+    #hash of the content of a dataframe (values, index, column names and data types)
+    def hashData(data):
+        hashValue = hashlib.sha256(pd.util.hash_pandas_object(data, index = True).to_numpy().tobytes())
+        hashValue.update(str(list(zip(data.columns, data.dtypes.astype(str)))).encode())
+        return hashValue.hexdigest()
+
+
+    #saves a result of a stage, a temporary file is used so that an interrupted run does not leave a broken cache
+    def saveResult(self, data, file):
+        os.makedirs(self.directory, exist_ok = True)
+        temporaryFile = file + '.tmp'
+        with open(temporaryFile, 'wb') as content:
+            pickle.dump(data, content)
+        os.replace(temporaryFile, file)
+
+
+    #deletes all cached results (e.g. after changes of the code of a stage)
+    def clearCache(self):
+        memoryCache.clear()
+        if(os.path.exists(self.directory)):
+            for file in os.listdir(self.directory):
+                os.remove(os.path.join(self.directory, file))
+
+
+
+#functions of the standard stages
+def importData(root, mapping, missingDataAllowed):
+    return DataImporter.inputAllFiles(root, mapping, missingDataAllowed = missingDataAllowed)
+
+def listImportFiles(root, mapping, missingDataAllowed):
+    return DataImporter.listInputFiles(root) + [mapping]
+
+def addProbabilities(data, method):
+    Calculator = {'basicNormalisation': BasicNormalisation, 'shin': ShinModel}[method]()
+    return Calculator.addProbabilities(data)
+
+def addRegressionGoals(data, regressionType):
+    return Regression(regressionType).addAnticipatedGoals(data)
+
+def addInvertedPoissonGoals(data, start, stop, step, continuous):
+    return InvertedPoisson(start, stop, step, continuous = continuous).addAnticipatedGoals(data)
+
+def addEloRatings(data, k, ha):
+    Rating = EloRating()
+    return Rating.calculateRating(data, k, ha)
+
+
+#creates the pipeline used by the analysis scripts: import -> averages -> probabilities (basic normalisation / Shin) -> anticipated goals (regression / inverted Poisson) and averages -> Elo ratings
+#all analysis scripts use the same stages, so stages already calculated by another analysis are reused from the cache
+#changes of the code used by a stage recalculate the stage (see findModules), only stages with changed results for other reasons (e.g. changed libraries) need a new version
+def createStandardPipeline(root, mapping, missingDataAllowed = [], k = 25, ha = 80, regressionType = 'linear', start = 0.0, stop = 6.0, step = 0.025, continuous = False):
+    probabilityColumns = ['probHome', 'probDraw', 'probAway', 'probOver25', 'probUnder25']
+    anticipatedGoalsColumns = ['anticipatedGoalsHome', 'anticipatedGoalsAway']
+    return DataPipeline([
+        PipelineStage('data', importData, [], {'root': root, 'mapping': mapping, 'missingDataAllowed': missingDataAllowed}, ['date', 'teamHome', 'teamAway', 'goalsHome', 'goalsAway', 'season'], listImportFiles, export = 'data.csv'),
+        PipelineStage('averages', AverageCalculation.calculateAverages, ['data'], {}, ['round', 'avgGoalsHome', 'avgGoalsAway', 'avgPointsHome', 'avgPointsAway', 'anticipatedGoalsHomeAverage', 'anticipatedGoalsAwayAverage'], export = 'dataAverages.csv'),
+        PipelineStage('basicNormalisation', addProbabilities, ['averages'], {'method': 'basicNormalisation'}, probabilityColumns, export = 'dataBasicNormalisation.csv'),
+        PipelineStage('shin', addProbabilities, ['averages'], {'method': 'shin'}, probabilityColumns, export = 'dataShin.csv'),
+        PipelineStage('regression', addRegressionGoals, ['shin'], {'regressionType': regressionType}, anticipatedGoalsColumns, export = 'dataRegression.csv', version = 2),
+        PipelineStage('invertedPoisson', addInvertedPoissonGoals, ['shin'], {'start': start, 'stop': stop, 'step': step, 'continuous': continuous}, anticipatedGoalsColumns, export = 'dataInvertedPoisson.csv'),
+        PipelineStage('elo', addEloRatings, ['averages'], {'k': k, 'ha': ha}, ['eloHome', 'eloAway'], export = 'dataWinnerPrediction.csv')])
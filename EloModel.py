@@ -8,6 +8,7 @@ import numpy as np
 import pandas as pd
 from abc import ABC, abstractmethod
 import os
+from bettingCalculationTools.Instrumentation import instrumented
 
 
 pd.options.mode.chained_assignment = None
@@ -24,110 +25,121 @@ class RatingModel(ABC):
         pass
 
         
+    #maps teams, leagues and seasons of the (sorted) dataset to integer ids, which are used as indices of the rating and pool arrays
+    def encodeMatches(self, data):
+        teamIds, teams = pd.factorize(pd.concat([data['teamHome'], data['teamAway']], ignore_index=True))
+        leagueIds, leagues = pd.factorize(data['league'])
+        seasonIds, seasons = pd.factorize(data['season'])
+        return teamIds[:len(data.index)], teamIds[len(data.index):], teams, leagueIds, leagues, seasonIds, seasons
+    
+    
+    #initialises the pools of ratings used for promoted (index 0) and relegated (index 1) teams per league 
+    #the pools are kept as running sums and counts together with the season of the last update, starting with two ratings of 1000
+    def initialiseRelegationPromotionPools(self, numberLeagues):
+        poolSums = np.full((2, numberLeagues), 2000.0)
+        poolCounts = np.full((2, numberLeagues), 2)
+        poolSeasons = np.full((2, numberLeagues), -1)
+        return poolSums, poolCounts, poolSeasons
+    
+    
+    #sets ratings and pools from a stored state (see TeamStateStore), teams and leagues not in the state keep their initial values
+    #seasons of the pools are only compared for equality, so seasons not in the current data are mapped to -1
+    def loadRatingState(self, state, teams, leagues, seasons, currentRatings, poolSums, poolCounts, poolSeasons):
+        seasonIds = {season: i for i, season in enumerate(seasons)}
+        for i, team in enumerate(teams):
+            if(team in state['ratings']):
+                currentRatings[i] = state['ratings'][team]
+        for i, league in enumerate(leagues):
+            if(league in state['pools']):
+                pool = state['pools'][league]
+                poolSums[:, i] = pool['sums']
+                poolCounts[:, i] = pool['counts']
+                poolSeasons[:, i] = [seasonIds.get(season, -1) for season in pool['seasons']]
+    
+    
+    #writes ratings, pools and the latest division of each team of the data into the state (see TeamStateStore)
+    def saveRatingState(self, state, data, teams, leagues, seasons, currentRatings, poolSums, poolCounts, poolSeasons):
+        state['ratings'].update({team: float(currentRatings[i]) for i, team in enumerate(teams)})
+        for i, league in enumerate(leagues):
+            previousSeasons = state['pools'].get(league, {'seasons': [None, None]})['seasons']
+            state['pools'][league] = {'sums': poolSums[:, i].tolist(), 
+                                      'counts': poolCounts[:, i].tolist(), 
+                                      'seasons': [seasons[poolSeasons[pool, i]] if poolSeasons[pool, i] >= 0 else previousSeasons[pool] for pool in [0, 1]]}
+        appearances = pd.DataFrame({'team': pd.concat([data['teamHome'], data['teamAway']], ignore_index=True),
+                                    'position': np.tile(np.arange(len(data.index)), 2),
+                                    'division': np.tile(data['league'].str[-1].astype(int).to_numpy(), 2)})
+        lastDivisions = appearances.sort_values('position', kind='stable').groupby('team', observed = True)['division'].last()
+        state['divisions'].update({team: int(division) for team, division in lastDivisions.items()})
+        
+    
     #helper method to update information on the initial ratings to be used for promoted or relegated teams
-    def updateRelegationPromotionRatings(self, data, i, season, league, columnName, team, currentRatings, relegationRating, promotionRating):
-        if(data[columnName][i]==1):
-            #reset relegation ratings in case of new seasons
-            if(relegationRating[league]['season']!=season):
-                relegationRating[league]['rating']=[] 
-            relegationRating[league]['season']=season
-            relegationRating[league]['rating'].append(currentRatings[team]['calculated'])  
-        elif(data[columnName][i]==-1):
-            #reset promotion ratings in case of new seasons
-            if(promotionRating[league]['season']!=season):
-                 promotionRating[league]['rating']=[] 
-            promotionRating[league]['season']=season
-            promotionRating[league]['rating'].append(currentRatings[team]['calculated'])  
+    #flag 1 (last match before promotion) adds the rating to the pool for teams relegated to the league, flag -1 (last match before relegation) to the pool for promoted teams
+    def updateRelegationPromotionRatings(self, flag, season, league, rating, poolSums, poolCounts, poolSeasons):
+        pool = 1 if flag == 1 else 0
+        #reset ratings in case of new seasons
+        if(poolSeasons[pool, league] != season):
+            poolSums[pool, league] = 0.0
+            poolCounts[pool, league] = 0
+        poolSeasons[pool, league] = season
+        poolSums[pool, league] += rating
+        poolCounts[pool, league] += 1
                     
         
+    #helper method to initialise ratings to be used for promoted or relegated teams
+    #flag 2 (first match after promotion) uses the pool of promoted teams, flag -2 (first match after relegation) the pool of relegated teams          
+    def initialiseRating(self, flag, league, poolSums, poolCounts):
+        pool = 0 if flag == 2 else 1
+        return poolSums[pool, league] / poolCounts[pool, league]
+
+
+    #derives the timeline of all teams, i.e. one row per appearance of a team sorted by team and match position in the data
+    #each appearance carries the division (last character of the league) and season (first two characters) of the previous and next appearance of the team
+    #teams are assumed to come from initialDivision before their first appearance, which is either a division for all teams or a dictionary of divisions per team (with 9 for missing teams)
+    def calculateTeamTimeline(self, data, initialDivision = 9):
+        numberMatches = len(data.index)
+        teams, teamNames = pd.factorize(pd.concat([data['teamHome'], data['teamAway']], ignore_index=True))
+        positions = np.tile(np.arange(numberMatches), 2)
+        sides = np.repeat([0, 1], numberMatches)
+        divisions = np.tile(data['league'].str[-1].astype(int).to_numpy(), 2)
+        seasons = np.tile(data['season'].str[:2].astype(int).to_numpy(), 2)
+        
+        order = np.lexsort((positions, teams))
+        timeline = pd.DataFrame({'team': teams[order], 'position': positions[order], 'side': sides[order], 'division': divisions[order], 'season': seasons[order]})
+        
+        sameTeamNext = np.append(timeline['team'].to_numpy()[1:] == timeline['team'].to_numpy()[:-1], False)
+        sameTeamPrevious = np.insert(sameTeamNext[:-1], 0, False)
+        timeline['hasNext'] = sameTeamNext
+        if(isinstance(initialDivision, dict)):
+            initialDivision = pd.Series(teamNames[timeline['team']]).map(initialDivision).fillna(9).to_numpy()
+        timeline['divisionPrevious'] = np.where(sameTeamPrevious, timeline['division'].shift(1), initialDivision).astype(int)
+        timeline['divisionNext'] = np.where(sameTeamNext, timeline['division'].shift(-1), -1).astype(int)
+        timeline['seasonNext'] = np.where(sameTeamNext, timeline['season'].shift(-1), -1).astype(int)
+        return timeline
+    
     
-    #helper method to initialise ratings to be used for promoted or relegated teams          
-    def initialiseRating(self, data, i, columnName, league, team, currentRatings, relegationRating, promotionRating):
-        if(data[columnName][i]==2):
-            currentRatings[team]['calculated']=np.mean(promotionRating[league]['rating'])
-        elif(data[columnName][i]==-2):
-            currentRatings[team]['calculated']=np.mean(relegationRating[league]['rating'])
-
-
     #this method flags promoted or relegated teams, which is important for rating calculation, e.g. in ELO or pi-rating
-    def flagPromotedRelegatedTeams(self, data, teamInformation):
-        promotedHome = [0]*len(data.index)
-        promotedAway = [0]*len(data.index)
-        relegatedHome = [0]*len(data.index)
-        relegatedAway = [0]*len(data.index)
-        
+    #2 means first match after promotion, 1 means last match before promotion, -2 means first match after relegation, -1 means last match before relegation
+    #every match is flagged as last match before relegation, unless the team appears again in the data with the same or a better division in the next season 
+    #teams who have not been in the dataset before are considered to be promoted
+    def flagPromotedRelegatedTeams(self, data, initialDivision = 9):
+        timeline = self.calculateTeamTimeline(data, initialDivision)
+        division = timeline['division'].to_numpy()
+        divisionPrevious = timeline['divisionPrevious'].to_numpy()
+        divisionNext = timeline['divisionNext'].to_numpy()
+        hasNext = timeline['hasNext'].to_numpy()
         
-        for i in range(0,len(data.index)):
-            teamHome = data['teamHome'][i]
-            teamAway = data['teamAway'][i]
-            season = int(data['season'][i][:2])
-            
-            #get information on old and new league
-            leagueOldHome = teamInformation[teamHome]['league']
-            divisionOldHome = int(leagueOldHome[-1])
-            leagueOldAway = teamInformation[teamAway]['league']            
-            divisionOldAway = int(leagueOldAway[-1])
-            leagueNew = data['league'][i]
-            divisionNew = int(leagueNew[-1])
-
-            #promoted teams are flagged in current and last match, league is adjusted
-            #1 means last match before promotion, 2 means first match after promotion
-            #teams who have not been in the dataset for min a season are considered to be promoted
-            if(divisionOldHome>divisionNew):# or season - teamInformation[teamHome]['lastMatchSeason'] > 1):
-                RatingModel.updateTeamInformation(i, teamHome, teamInformation, leagueNew, promotedHome, promotedAway, home = True)
-            if(divisionOldAway>divisionNew):# or season - teamInformation[teamHome]['lastMatchSeason'] > 1):
-                RatingModel.updateTeamInformation(i, teamAway, teamInformation, leagueNew, promotedHome, promotedAway, home = False)
-
-            #every team is flagged as relegated in every match. Once the team appears again in the data, still has the same or better league, it is unflagged again
-            relegatedHome[i] = 1
-            relegatedAway[i] = 1
-            if(divisionOldHome >= divisionNew and season - teamInformation[teamHome]['lastMatchSeason'] <= 1):
-                if(teamInformation[teamHome]['homeAway']=='home'):
-                    if(relegatedHome[teamInformation[teamHome]['lastMatchIndex']] == 1):
-                        relegatedHome[teamInformation[teamHome]['lastMatchIndex']] = 0
-                else:
-                    if(relegatedAway[teamInformation[teamHome]['lastMatchIndex']] == 1):
-                        relegatedAway[teamInformation[teamHome]['lastMatchIndex']] = 0
-            if(divisionOldAway >= divisionNew and season - teamInformation[teamAway]['lastMatchSeason'] <= 1):
-                if(teamInformation[teamAway]['homeAway']=='home'):
-                    if(relegatedHome[teamInformation[teamAway]['lastMatchIndex']] == 1):
-                        relegatedHome[teamInformation[teamAway]['lastMatchIndex']] = 0
-                else:
-                    if(relegatedAway[teamInformation[teamAway]['lastMatchIndex']] == 1):
-                        relegatedAway[teamInformation[teamAway]['lastMatchIndex']] = 0
-                    
-            #relegated teams are flagged in current and last match, league is adjusted
-            #1 means last match before relegation, 2 means first match after relegation
-            if(divisionOldHome<divisionNew):            
-                RatingModel.updateTeamInformation(i, teamHome, teamInformation, leagueNew, relegatedHome, relegatedAway, home = True)   
-            if(divisionOldAway<divisionNew):
-                 RatingModel.updateTeamInformation(i, teamAway, teamInformation, leagueNew, relegatedHome, relegatedAway, home = False) 
-
-            #save the current match information as last match in the team information
-            teamInformation[teamHome]['lastMatchIndex']=i
-            teamInformation[teamHome]['homeAway']='home'
-            teamInformation[teamHome]['lastMatchSeason']=season
-            teamInformation[teamAway]['lastMatchIndex']=i
-            teamInformation[teamAway]['homeAway']='away'
-            teamInformation[teamAway]['lastMatchSeason']=season
-             
-        data['leagueChangeHome']=np.array(promotedHome) - np.array(relegatedHome)
-        data['leagueChangeAway']=np.array(promotedAway) - np.array(relegatedAway)
-         
+        #the flag of the last match before promotion overrides the flag of the first match after promotion
+        promoted = np.where(hasNext & (division > divisionNext), 1, np.where(divisionPrevious > division, 2, 0))
         
+        #the flag of the last match before relegation overrides the flag of the first match after relegation
+        relegated = np.where(divisionPrevious < division, 2, 1)
+        unflagged = hasNext & (division >= divisionNext) & (timeline['seasonNext'].to_numpy() - timeline['season'].to_numpy() <= 1) & (relegated == 1)
+        relegated = np.where(hasNext & (division < divisionNext), 1, np.where(unflagged, 0, relegated))
         
-    #helper method to update information on the promoted or relegated teams
-    def updateTeamInformation(i, team, teamInformation, leagueNew, flagHome, flagAway, home = True):
-        if(teamInformation[team]['homeAway']=='home'):
-            flagHome[teamInformation[team]['lastMatchIndex']]=1
-        elif(teamInformation[team]['homeAway']=='away'):
-            flagAway[teamInformation[team]['lastMatchIndex']]=1
-        if(home == True):
-            flagHome[i]=2
-        else:
-            flagAway[i]=2
-        teamInformation[team]['league']=leagueNew
-    
+        leagueChange = np.empty((2, len(data.index)), dtype=int)
+        leagueChange[timeline['side'].to_numpy(), timeline['position'].to_numpy()] = promoted - relegated
+        data['leagueChangeHome'] = leagueChange[0]
+        data['leagueChangeAway'] = leagueChange[1]
     
     
 #implements ELO rating based on the work of Hvattum&Arntzen (2010)
@@ -136,81 +148,78 @@ class EloRating(RatingModel):
     def __init__(self):
         super().__init__('ELORating')
         
-    def calculateRating(self, data, k, ha):
-        teamInformation = dict.fromkeys(np.unique(np.concatenate([data['teamHome'], data['teamAway']])))
-        for key in teamInformation:
-            teamInformation[key] = {'league': 'Start9', 'lastMatchSeason': -1, 'lastMatchIndex': 0, 'homeAway': 'NaN'}
-            
-        super().flagPromotedRelegatedTeams(data, teamInformation)
+    #if a state is given (see TeamStateStore), ratings continue from the state and the state is updated with the new ratings
+    @instrumented('ratings')
+    def calculateRating(self, data, k, ha, state = None):
+        #flags are reused if they were already calculated for the data (e.g. by another rating model)
+        if('leagueChangeHome' not in data or 'leagueChangeAway' not in data):
+            super().flagPromotedRelegatedTeams(data, 9 if state is None else state['divisions'])
         
         #sort data by date
         data.sort_values(by=['date'], inplace = True)
         data.reset_index(inplace=True, drop = True)
         
-        #distinct list of all teams in the dataset, initialised with rating of 1000/ initialised with league, last match and home/away information
-        currentRatings = dict.fromkeys(np.unique(np.concatenate([data['teamHome'], data['teamAway']])))
-        #if no data is avaiable, the actual rating is not set, but a calculated one exists, the history flag is false until data was available for the first time
-        for key in currentRatings:
-            currentRatings[key] = {'calculated': 0}        
-        #distinct lists of all leagues in the dataset
-        promotionRating = dict.fromkeys(np.unique(data['league']))
-        for key in promotionRating:
-            promotionRating[key] = {'season': 'NaN', 'rating': [1000,1000]}   
-        relegationRating = dict.fromkeys(np.unique(data['league']))
-        for key in relegationRating:
-            relegationRating[key] = {'season': 'NaN', 'rating': [1000,1000]}   
+        #integer ids of all teams and leagues, ratings of all teams are stored in one array (initialised via the promotion flag of the first match)
+        teamsHome, teamsAway, teamNames, leagues, leagueNames, seasons, seasonNames = self.encodeMatches(data)
+        currentRatings = np.zeros(len(teamNames))
+        poolSums, poolCounts, poolSeasons = self.initialiseRelegationPromotionPools(len(leagueNames))
+        if(state is not None):
+            super().loadRatingState(state, teamNames, leagueNames, seasonNames, currentRatings, poolSums, poolCounts, poolSeasons)
+        
+        flagsHome = data['leagueChangeHome'].to_numpy()
+        flagsAway = data['leagueChangeAway'].to_numpy()
+        #actual result from the perspective of the home team
+        actualHome = np.where(data['result'] == 'D', 0.5, np.where(data['result'] == 'A', 0.0, 1.0))
 
         #Calculation of ELO ratings
-        eloRatingsHome=[]
-        eloRatingsAway=[]
+        eloRatingsHome = np.empty(len(data.index))
+        eloRatingsAway = np.empty(len(data.index))
         
         #iterate over all matches
         for i in range(0,len(data.index)):
-            teamHome = data['teamHome'][i]
-            teamAway = data['teamAway'][i]
-            league = data['league'][i]
-            season = data['season'][i]
+            teamHome = teamsHome[i]
+            teamAway = teamsAway[i]
+            league = leagues[i]
+            flagHome = flagsHome[i]
+            flagAway = flagsAway[i]
             
-            #update average ratings for promoted or relegated teams
-            super().updateRelegationPromotionRatings(data, i, season, league, 'leagueChangeHome', teamHome, currentRatings, relegationRating, promotionRating)
-            super().updateRelegationPromotionRatings(data, i, season, league, 'leagueChangeAway', teamAway, currentRatings, relegationRating, promotionRating)
-
-            #initialise rating if needed 
-            super().initialiseRating(data, i, 'leagueChangeHome', league, teamHome, currentRatings, relegationRating, promotionRating)
-            super().initialiseRating(data, i, 'leagueChangeAway', league, teamAway, currentRatings, relegationRating, promotionRating)
-
-
-            eloHome = currentRatings[teamHome]['calculated']
-            eloAway = currentRatings[teamAway]['calculated']
-            eloRatingsHome.append(eloHome)
-            eloRatingsAway.append(eloAway)
+            if(flagHome != 0 or flagAway != 0):
+                #update average ratings for promoted or relegated teams
+                if(flagHome == 1 or flagHome == -1):
+                    super().updateRelegationPromotionRatings(flagHome, seasons[i], league, currentRatings[teamHome], poolSums, poolCounts, poolSeasons)
+                if(flagAway == 1 or flagAway == -1):
+                    super().updateRelegationPromotionRatings(flagAway, seasons[i], league, currentRatings[teamAway], poolSums, poolCounts, poolSeasons)
+                    
+                #initialise rating if needed 
+                if(flagHome == 2 or flagHome == -2):
+                    currentRatings[teamHome] = super().initialiseRating(flagHome, league, poolSums, poolCounts)
+                if(flagAway == 2 or flagAway == -2):
+                    currentRatings[teamAway] = super().initialiseRating(flagAway, league, poolSums, poolCounts)
+
+            eloHome = currentRatings[teamHome]
+            eloAway = currentRatings[teamAway]
+            eloRatingsHome[i] = eloHome
+            eloRatingsAway[i] = eloAway
             
             #calculate expected result (using c = 10 and d=400 and ha as specified)
             expHome = 1/(1+10**((eloAway-eloHome-ha)/400))
             expAway = 1-expHome
             
-
-            
-            #obtain actual result
-            actHome = 1
-            if(data['result'][i] == 'D'):
-                actHome = 0.5
-            elif(data['result'][i] == 'A'):
-                actHome = 0
-
+            actHome = actualHome[i]
             actAway = 1 - actHome
 
-
-
-            #calculate new elo rating (using k = 20)
-            currentRatings[teamHome]['calculated']=eloHome + k * (actHome-expHome)
-            currentRatings[teamAway]['calculated']=eloAway + k * (actAway-expAway)
+            #calculate new elo rating
+            currentRatings[teamHome] = eloHome + k * (actHome-expHome)
+            currentRatings[teamAway] = eloAway + k * (actAway-expAway)
 
 
 
         #set final ratings in dataframe    
         data['eloHome'] = eloRatingsHome
         data['eloAway'] = eloRatingsAway
+        
+        if(state is not None):
+            super().saveRatingState(state, data, teamNames, leagueNames, seasonNames, currentRatings, poolSums, poolCounts, poolSeasons)
             
         return data
 
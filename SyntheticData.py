@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+Generator of synthetic leagues in the format of the input folder (see Example_League*.csv and the inputMappings) to test and benchmark the tools on large amounts of data
+"""
+
+import os
+import math
+import numpy as np
+import pandas as pd
+from bettingCalculationTools.ProbabilityModelling import PoissonModel
+
+
+#columns of the generated files as in the example leagues (inputMappingMatchDataAverageOdds)
+fileColumns = ['Div', 'Date', 'HomeTeam', 'AwayTeam', 'FTHG', 'FTAG', 'FTR', 'AvgH', 'AvgD', 'AvgA', 'Avg<2.5', 'Avg>2.5', 'HS', 'AS', 'HST', 'AST']
+
+
+#generates countries with several divisions each, every division is a double round robin per season (one file per division and season)
+#teams have attacking and defending strengths that change between seasons, goals are drawn from independent Poisson distributions
+#odds are calculated from a noisy estimate of the expected goals of the bookmaker including a margin
+#after each season, the worst teams of a division are exchanged with the best teams of the division below, the worst teams of the lowest division are replaced by new teams
+class SyntheticDataGenerator:
+
+    def __init__(self, countries = 1, divisions = 3, teams = 18, seasons = 5, relegated = 3, startYear = 2000, missingShots = 0.1, seed = 0):
+        if(divisions < 1 or divisions > 9):
+            raise ValueError("Divisions are identified by the last digit of the league, expected 1 to 9 divisions but got "+str(divisions))
+        if(teams % 2 != 0 or relegated >= teams / 2):
+            raise ValueError("Expected an even number of teams and less relegated teams than half of the teams")
+        if(startYear < 1969 or startYear + seasons > 2068):
+            raise ValueError("Dates are stored with two-digit years, all seasons have to be within 1969 and 2068")
+        self.countries = countries
+        self.divisions = divisions
+        self.teams = teams
+        self.seasons = seasons
+        self.relegated = relegated
+        self.startYear = startYear
+        self.missingShots = missingShots
+        self.seed = seed
+        self.model = PoissonModel()
+
+    #number of matches of all files
+    def countMatches(self):
+        return self.countries * self.divisions * self.seasons * self.teams * (self.teams - 1)
+
+    #name of a generator, e.g. to store the generated files of different configurations in separate folders
+    def createName(self):
+        return '_'.join(name + str(value) for name, value in [('c', self.countries), ('d', self.divisions), ('t', self.teams), ('s', self.seasons), ('r', self.relegated), ('seed', self.seed)])
+
+    #chooses the number of countries and seasons (up to maxSeasons) to obtain at least the given number of matches
+    def createForMatches(matches, divisions = 3, teams = 18, maxSeasons = 20, **arguments):
+        matchesSeason = divisions * teams * (teams - 1)
+        countries = max(1, math.ceil(matches / (matchesSeason * maxSeasons)))
+        seasons = max(1, math.ceil(matches / (matchesSeason * countries)))
+        return SyntheticDataGenerator(countries, divisions, teams, seasons, **arguments)
+
+
+    #writes all files to the directory and returns the number of matches
+    def generate(self, directory):
+        os.makedirs(directory, exist_ok = True)
+        rng = np.random.default_rng(self.seed)
+        fixtures = self.createFixtures()
+        matches = 0
+        for country in range(self.countries):
+            code = self.createCountryCode(country)
+            #teams of all divisions (one row per division) and strengths of all teams by name
+            names = np.array([[code + 'Team' + str(division * self.teams + team + 1) for team in range(self.teams)] for division in range(self.divisions)], dtype = object)
+            strengths = {}
+            for division in range(self.divisions):
+                for name in names[division]:
+                    strengths[name] = self.createStrength(rng, division)
+            newTeams = self.divisions * self.teams
+
+            for season in range(self.seasons):
+                year = self.startYear + season
+                for name in strengths:
+                    strengths[name] = strengths[name] + rng.normal(0, 0.05, 2)
+                ranked = []
+                for division in range(self.divisions):
+                    league = code + str(division + 1)
+                    data, ranking = self.generateDivision(rng, fixtures, names[division], strengths, league, year)
+                    data.to_csv(os.path.join(directory, league + '_' + str(year) + '.csv'), index = False)
+                    ranked.append(ranking)
+                    matches += len(data.index)
+
+                #promotion and relegation between neighbouring divisions, new teams in the lowest division
+                for division in range(self.divisions - 1):
+                    names[division] = np.concatenate([ranked[division][:-self.relegated], ranked[division + 1][:self.relegated]])
+                    ranked[division + 1] = np.concatenate([ranked[division][-self.relegated:], ranked[division + 1][self.relegated:]])
+                lowest = list(ranked[-1][:-self.relegated])
+                for team in range(self.relegated):
+                    newTeams += 1
+                    name = code + 'Team' + str(newTeams)
+                    strengths[name] = self.createStrength(rng, self.divisions - 1)
+                    lowest.append(name)
+                names[-1] = np.array(lowest, dtype = object)
+            print("Generated "+str(self.divisions * self.seasons)+" files of country "+code)
+        return matches
+
+
+    #generates all matches of a division and season and returns them in the format of the input files together with the names of all teams ordered by their final position
+    def generateDivision(self, rng, fixtures, names, strengths, league, year):
+        names = rng.permutation(names)
+        home = fixtures[:,:,0].ravel()
+        away = fixtures[:,:,1].ravel()
+        rounds = np.repeat(np.arange(len(fixtures)), fixtures.shape[1])
+
+        #matches are played on weekends from August on, all rounds fit in less than a year
+        interval = min(7, 300 // len(fixtures))
+        dates = pd.Timestamp(year, 8, 1) + pd.to_timedelta(rounds * interval + rng.integers(0, 3, len(rounds)), unit = 'D')
+
+        attack = np.array([strengths[name][0] for name in names])
+        defence = np.array([strengths[name][1] for name in names])
+        expectedHome = np.clip(np.exp(np.log(1.35) + 0.12 + attack[home] - defence[away]), 0.1, 5.5)
+        expectedAway = np.clip(np.exp(np.log(1.35) - 0.12 + attack[away] - defence[home]), 0.1, 5.5)
+        goalsHome = rng.poisson(expectedHome)
+        goalsAway = rng.poisson(expectedAway)
+
+        #bookmakers estimate the expected goals with some noise and add a margin to all outcomes
+        estimates = np.exp(np.log(np.column_stack([expectedHome, expectedAway])) + rng.normal(0, 0.08, (len(home), 2)))
+        probabilities = self.model.calculateOutcomeProbabilities(estimates[:,0], estimates[:,1])
+        margins = rng.uniform(0.03, 0.08, (len(home), 1))
+        odds = np.maximum(np.round(1 / (probabilities * (1 + margins)), 2), 1.01)
+
+        shotsHome = rng.poisson(4 + 6 * expectedHome)
+        shotsAway = rng.poisson(4 + 6 * expectedAway)
+        shotsTargetHome = rng.binomial(shotsHome, 0.35)
+        shotsTargetAway = rng.binomial(shotsAway, 0.35)
+        missing = rng.random(len(home)) < self.missingShots
+
+        data = pd.DataFrame({'Div': league,
+                             'Date': dates.strftime('%d/%m/%y'),
+                             'HomeTeam': names[home],
+                             'AwayTeam': names[away],
+                             'FTHG': goalsHome,
+                             'FTAG': goalsAway,
+                             'FTR': np.where(goalsHome > goalsAway, 'H', np.where(goalsHome == goalsAway, 'D', 'A')),
+                             'AvgH': odds[:,0],
+                             'AvgD': odds[:,1],
+                             'AvgA': odds[:,2],
+                             'Avg<2.5': odds[:,4],
+                             'Avg>2.5': odds[:,3]})
+        for column, values in [('HS', shotsHome), ('AS', shotsAway), ('HST', shotsTargetHome), ('AST', shotsTargetAway)]:
+            data[column] = pd.array(values, dtype = 'Int64')
+            data.loc[missing, column] = pd.NA
+
+        #points and goal difference to rank the teams at the end of the season
+        pointsHome = np.select([goalsHome > goalsAway, goalsHome == goalsAway], [3, 1], 0)
+        pointsAway = np.select([goalsHome < goalsAway, goalsHome == goalsAway], [3, 1], 0)
+        points = np.bincount(home, pointsHome, len(names)) + np.bincount(away, pointsAway, len(names))
+        goalDifference = np.bincount(home, goalsHome - goalsAway, len(names)) + np.bincount(away, goalsAway - goalsHome, len(names))
+        #matches are stored in chronological order as in the example leagues
+        data = data.iloc[np.argsort(dates.to_numpy(), kind = 'stable')]
+        return data[fileColumns], names[np.lexsort((-goalDifference, -points))]
+
+
+    #double round robin of all teams (circle method), returns an array of rounds x matches x (home, away) of indices of the teams
+    def createFixtures(self):
+        teams = list(range(self.teams))
+        rounds = []
+        for round in range(self.teams - 1):
+            pairs = [(teams[i], teams[self.teams - 1 - i]) for i in range(self.teams // 2)]
+            #alternating home advantage of the fixed team
+            if(round % 2 == 1):
+                pairs[0] = (pairs[0][1], pairs[0][0])
+            rounds.append(pairs)
+            teams = [teams[0]] + [teams[-1]] + teams[1:-1]
+        rounds += [[(away, home) for home, away in pairs] for pairs in rounds]
+        return np.array(rounds)
+
+    #attacking and defending strength of a new team, lower divisions are weaker
+    def createStrength(self, rng, division):
+        return rng.normal(-0.12 * division, 0.18, 2)
+
+    #letters identifying a country (A to Z, AA to ZZ, ...)
+    def createCountryCode(self, country):
+        code = ''
+        country += 1
+        while(country > 0):
+            country, remainder = divmod(country - 1, 26)
+            code = chr(ord('A') + remainder) + code
+        return code
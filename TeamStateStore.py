@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+Persistent state of all teams (Elo ratings, initial ratings of promoted/relegated teams and season averages) to add new matches without recalculating the whole history
+"""
+
+import os
+import json
+import copy
+import logging
+import numpy as np
+import pandas as pd
+from AverageCalculation import AverageCalculation
+from EloModel import EloRating
+
+
+#progress of the updates is logged (e.g. logging.basicConfig(level = logging.INFO) to show it)
+logger = logging.getLogger(__name__)
+
+
+#stores the state of all teams in a json file and applies new matches on top of it
+#promotion and relegation flags of a match depend on the next appearance of the team. Therefore, the state is stored at a checkpoint before the last appearance of all teams
+#that played within the last replayDays days, together with all matches after the checkpoint. These matches are recalculated with every update, so that the results equal
+#a full recalculation unless a team reappears after an absence of more than replayDays days
+class TeamStateStore:
+
+    #file is the json file of the state (None to keep the state in memory only), k and ha are the parameters of the Elo rating
+    def __init__(self, file, k, ha, replayDays = 365):
+        self.file = file
+        self.k = k
+        self.ha = ha
+        self.replayDays = replayDays
+        self.state = self.loadState()
+
+
+    #creates the state before the first match
+    def initialiseState(self):
+        return {'lastDate': None,
+                'k': self.k,
+                'ha': self.ha,
+                'checkpoint': {'elo': {'ratings': {}, 'pools': {}, 'divisions': {}},
+                               'averages': {'teams': {}, 'allTeams': {'matches': 0, 'goalsHome': 0.0, 'goalsAway': 0.0}}},
+                'matchesAfterCheckpoint': None}
+
+
+    #loads the state from the file or initialises a new state if no file exists
+    def loadState(self):
+        if(self.file is None or not os.path.exists(self.file)):
+            return self.initialiseState()
+        with open(self.file) as file:
+            state = json.load(file)
+        if(state['k'] != self.k or state['ha'] != self.ha):
+            raise ValueError("State in "+self.file+" was calculated with k = "+str(state['k'])+" and ha = "+str(state['ha']))
+        return state
+
+
+    #saves the state, a temporary file is used so that an interrupted run does not leave a broken state
+    def saveState(self):
+        if(self.file is None):
+            return
+        temporaryFile = self.file + '.tmp'
+        with open(temporaryFile, 'w') as file:
+            json.dump(self.state, file)
+        os.replace(temporaryFile, self.file)
+
+
+    #expects a dataframe as obtained by the DataImporter and adds averages and Elo ratings to all matches after the last processed date
+    #only these new matches are returned, the state is updated and saved afterwards
+    def addMatches(self, dataInput):
+        data = dataInput.copy()
+        data['date'] = pd.to_datetime(data['date'], format = '%d/%m/%y')
+        if(self.state['lastDate'] is not None):
+            data = data[data['date'] > pd.Timestamp(self.state['lastDate'])]
+        logger.info("Adding %d new matches after %s", len(data), self.state['lastDate'])
+        if(len(data.index) == 0):
+            return data.reset_index(drop = True)
+
+        #new matches are calculated together with the matches after the checkpoint
+        if(self.state['matchesAfterCheckpoint'] is not None):
+            matchesAfterCheckpoint = pd.DataFrame(**self.state['matchesAfterCheckpoint'])
+            matchesAfterCheckpoint['date'] = pd.to_datetime(matchesAfterCheckpoint['date'], format = '%d/%m/%y')
+            data = pd.concat([matchesAfterCheckpoint, data], ignore_index = True)
+        data.sort_values(by=['date','teamHome','teamAway'], ascending = [True, True, True], inplace=True)
+        data.reset_index(drop = True, inplace = True)
+        columns = list(data.columns)
+
+        #flags are calculated for all matches at once, as they depend on the next appearance of the teams
+        Rating = EloRating()
+        Rating.flagPromotedRelegatedTeams(data, self.state['checkpoint']['elo']['divisions'])
+
+        #new checkpoint before the last appearance of all teams that played recently
+        lastAppearances = pd.concat([data[['teamHome','date']].set_axis(['team','date'], axis=1), data[['teamAway','date']].set_axis(['team','date'], axis=1)]).groupby('team', observed = True)['date'].max()
+        recentAppearances = lastAppearances[lastAppearances > data['date'].max() - pd.Timedelta(days = self.replayDays)]
+        checkpointDate = recentAppearances.min()
+
+        #matches before the new checkpoint are final, the state after them is stored as new checkpoint
+        state = copy.deepcopy(self.state['checkpoint'])
+        results = []
+        if((data['date'] < checkpointDate).any()):
+            results.append(self.calculateFeatures(data[data['date'] < checkpointDate], state))
+        self.state['checkpoint'] = copy.deepcopy(state)
+        results.append(self.calculateFeatures(data[data['date'] >= checkpointDate], state))
+
+        matchesAfterCheckpoint = data.loc[data['date'] >= checkpointDate, [column for column in columns if column not in ['leagueChangeHome', 'leagueChangeAway']]].copy()
+        matchesAfterCheckpoint['date'] = matchesAfterCheckpoint['date'].dt.strftime('%d/%m/%y')
+        self.state['matchesAfterCheckpoint'] = matchesAfterCheckpoint.to_dict(orient = 'split', index = False)
+
+        data = pd.concat(results, ignore_index = True)
+        if(self.state['lastDate'] is not None):
+            data = data[data['date'] > pd.Timestamp(self.state['lastDate'])].reset_index(drop = True)
+        self.state['lastDate'] = data['date'].max().strftime('%Y-%m-%d')
+        self.saveState()
+        return data
+
+
+    #adds averages and Elo ratings to the matches, continuing and updating the given state
+    def calculateFeatures(self, data, state):
+        data = AverageCalculation.calculateAverages(data.reset_index(drop = True), state['averages'])
+        Rating = EloRating()
+        return Rating.calculateRating(data, self.k, self.ha, state['elo'])
+
+
+    #recalculates the features of all matches from the first match and replaces the stored state
+    def recalculate(self, data):
+        self.state = self.initialiseState()
+        return self.addMatches(data)
+
+
+    #compares features obtained incrementally with a full recalculation over all data (without changing the stored state)
+    #returns the maximum absolute difference per feature for all matches in incrementalData
+    def checkConsistency(self, data, incrementalData):
+        full = TeamStateStore(None, self.k, self.ha, self.replayDays).addMatches(data)
+        keys = ['date', 'teamHome', 'teamAway']
+        merged = incrementalData.merge(full, on = keys, how = 'left', suffixes = ('', 'Full'))
+        features = ['avgGoalsHome', 'avgGoalsAway', 'avgGoalsAgainstHome', 'avgGoalsAgainstAway', 'avgPointsHome', 'avgPointsAway',
+                    'avgGoalsHomeAllTeams', 'avgGoalsAwayAllTeams', 'anticipatedGoalsHomeAverage', 'anticipatedGoalsAwayAverage', 'eloHome', 'eloAway']
+        return pd.Series({feature: np.abs(merged[feature] - merged[feature+'Full']).max() for feature in features})
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+Command-line entry point of the repository, e.g. python BettingOddsPerformanceAnalysis import --output data/data.csv
+Heavy modules are only imported by the subcommand that needs them, so that the start-up stays fast
+For the same reason, statsmodels, sklearn and scipy.spatial are only imported inside the functions of bettingCalculationTools that use them
+"""
+
+import os
+import argparse
+
+
+#default input folder and mapping as used by the analysis scripts
+defaultRoot = os.path.join(os.path.dirname(os.path.abspath(__file__)), "input")
+defaultMapping = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inputMappings", "inputMappingMatchDataAverageOdds.csv")
+defaultMissingDataAllowed = ['shotsHome', 'shotsAway', 'shotsTargetHome', 'shotsTargetAway']
+
+#columns of the models evaluated by the evaluate subcommand (if they are available in the input files)
+probabilityColumns = ['probHome', 'probDraw', 'probAway', 'probOver25', 'probUnder25']
+goalColumns = {'anticipatedGoals': ['anticipatedGoalsHome', 'anticipatedGoalsAway'],
+               'averageGoals': ['anticipatedGoalsHomeAverage', 'anticipatedGoalsAwayAverage']}
+
+#analysis scripts that can be run by the plot subcommand
+analyses = {'calibration': 'AnalysisCalibration',
+            'shots': 'AnalysisShotsSuccess',
+            'winner': 'AnalysisWinnerPrediction'}
+
+
+#reads matches saved by one of the subcommands or the analysis scripts (csv files with or without index)
+#dates are kept in the format of the DataImporter if possible, otherwise they are parsed as saved by pandas
+def readMatches(file):
+    import pandas as pd
+    data = pd.read_csv(file, encoding = "latin")
+    if('Unnamed: 0' in data):
+        data = data.drop(columns = 'Unnamed: 0')
+    if('date' in data):
+        try:
+            pd.to_datetime(data['date'], format = '%d/%m/%y')
+        except ValueError:
+            data['date'] = pd.to_datetime(data['date'], format = 'ISO8601')
+    return data
+
+
+#saves matches or results as csv file (the folder is created if necessary)
+def saveMatches(data, file):
+    if(os.path.dirname(file) != ''):
+        os.makedirs(os.path.dirname(file), exist_ok = True)
+    data.to_csv(file, index = False)
+    print("Saved "+str(len(data.index))+" rows to "+file)
+
+
+#imports all files of the input folder with the given mapping
+def runImport(arguments):
+    from bettingCalculationTools.DataImport import DataImporter
+    data = DataImporter.inputAllFiles(arguments.root, arguments.mapping, missingDataAllowed = arguments.missingDataAllowed, cache = not arguments.noCache)
+    saveMatches(data, arguments.output)
+
+
+#adds averages of goals and points of the previous matches
+def runAverages(arguments):
+    from AverageCalculation import AverageCalculation
+    data = AverageCalculation.calculateAverages(readMatches(arguments.input))
+    saveMatches(data, arguments.output)
+
+
+#adds outcome probabilities obtained from the betting odds
+def runProbabilities(arguments):
+    from bettingCalculationTools import ProbabilityCalculation
+    Calculator = {'basicNormalisation': ProbabilityCalculation.BasicNormalisation,
+                  'shin': ProbabilityCalculation.ShinModel,
+                  'logisticRegression': ProbabilityCalculation.LogisticRegression}[arguments.method]()
+    data = Calculator.addProbabilities(readMatches(arguments.input))
+    saveMatches(data, arguments.output)
+
+
+#adds anticipated goals obtained from the betting odds (inverted Poisson expects probabilities, e.g. of the probabilities subcommand)
+def runAnticipatedGoals(arguments):
+    from bettingCalculationTools import AnticipatedGoalsCalculation
+    if(arguments.method == 'invertedPoisson'):
+        from bettingCalculationTools.ProbabilityModelling import probabilityModels
+        from bettingCalculationTools.Markets import MarketAggregator
+        model = probabilityModels[arguments.model]() if arguments.modelParameter is None else probabilityModels[arguments.model](arguments.modelParameter)
+        #markets of the whole board are fitted to all of their probability columns that are in the input (see MarketAggregator.createColumnName)
+        markets = MarketAggregator.createBoard() if arguments.markets == 'board' else None
+        weights = {column: float(weight) for column, weight in (weight.split('=') for weight in arguments.weights)} if arguments.weights else None
+        Calculator = AnticipatedGoalsCalculation.InvertedPoisson(continuous = arguments.continuous, model = model, markets = markets, weights = weights)
+    elif(arguments.method == 'walkForward'):
+        Calculator = AnticipatedGoalsCalculation.WalkForwardRegression(arguments.forgetting)
+    elif(arguments.method == 'doubleRegression'):
+        Calculator = AnticipatedGoalsCalculation.DoubleRegression()
+    else:
+        Calculator = AnticipatedGoalsCalculation.Regression(arguments.method)
+    data = Calculator.addAnticipatedGoals(readMatches(arguments.input))
+    saveMatches(data, arguments.output)
+
+
+#prices a market board (results, double chance, both teams to score, over/under, Asian handicap and correct scores) for all matches from their anticipated goals
+def runMarkets(arguments):
+    import pandas as pd
+    from bettingCalculationTools.Markets import MarketAggregator
+    from bettingCalculationTools.ProbabilityModelling import probabilityModels
+    model = probabilityModels[arguments.model]() if arguments.modelParameter is None else probabilityModels[arguments.model](arguments.modelParameter)
+    data = readMatches(arguments.input)
+    board = model.createMarketAggregator(MarketAggregator.createBoard(maxScore = arguments.maxScore)).priceMatches(data, model)
+    saveMatches(pd.concat([data[['date', 'teamHome', 'teamAway']], board], axis = 1), arguments.output)
+
+
+#adds Elo ratings of both teams before each match
+def runElo(arguments):
+    from EloModel import EloRating
+    Rating = EloRating()
+    data = Rating.calculateRating(readMatches(arguments.input), arguments.k, arguments.ha)
+    saveMatches(data, arguments.output)
+
+
+#scores the probabilities and anticipated goals of all input files (one model per file and set of columns) on the same matches
+#columns that are only passed through from an earlier file (e.g. the probabilities used to calculate anticipated goals) are not scored twice
+def runEvaluate(arguments):
+    import numpy as np
+    import pandas as pd
+    from bettingCalculationTools.Metrics import MetricsCalculation
+    keys = ['date', 'teamHome', 'teamAway']
+    data = None
+    candidates = []
+    for file in arguments.input:
+        name = os.path.splitext(os.path.basename(file))[0]
+        fileData = readMatches(file)
+        fileData['date'] = pd.to_datetime(fileData['date'], format = '%d/%m/%y' if fileData['date'].dtype == object else None)
+        columns = {}
+        if(all(column in fileData for column in probabilityColumns)):
+            candidates.append(('probability', name, [name+':'+column for column in probabilityColumns]))
+            columns.update({column: name+':'+column for column in probabilityColumns})
+        for model, modelColumns in goalColumns.items():
+            if(all(column in fileData for column in modelColumns)):
+                candidates.append(('goals', name+':'+model, [name+':'+column for column in modelColumns]))
+                columns.update({column: name+':'+column for column in modelColumns})
+        if(data is None):
+            data = fileData.rename(columns = columns)
+        else:
+            data = data.merge(fileData[keys + list(columns)].rename(columns = columns), on = keys, how = 'inner')
+
+    probabilityModels = {}
+    goalModels = {}
+    for kind, model, columns in candidates:
+        models = probabilityModels if kind == 'probability' else goalModels
+        values = data[columns].to_numpy(dtype = float)
+        if(not any(np.allclose(values, data[existing].to_numpy(dtype = float), equal_nan = True) for existing in models.values())):
+            models[model] = columns
+    if(len(probabilityModels) + len(goalModels) == 0):
+        raise ValueError("None of the input files contains probabilities or anticipated goals")
+
+    if(arguments.bootstrap > 0):
+        from bettingCalculationTools.Bootstrap import Bootstrap
+        results = Bootstrap(arguments.bootstrap, cluster = arguments.cluster).calculateIntervals(data, probabilityModels, goalModels)
+    else:
+        results = MetricsCalculation.scoreModels(data, probabilityModels, goalModels, arguments.groups)
+    if(arguments.output is None):
+        print(results.to_string(index = False))
+    else:
+        saveMatches(results, arguments.output)
+
+
+#runs one of the analysis scripts on the input folder and shows its figures or saves them to the output folder
+#to save the figures, plt.show of the scripts is replaced by saving and closing all open figures until the analysis is finished
+def runPlot(arguments):
+    import importlib
+    import matplotlib
+    if(arguments.output is not None):
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    savedFigures = []
+    def saveFigures(*args, **kwargs):
+        os.makedirs(arguments.output, exist_ok = True)
+        for number in plt.get_fignums():
+            file = os.path.join(arguments.output, arguments.analysis+'_'+str(len(savedFigures) + 1)+'.png')
+            plt.figure(number).savefig(file)
+            savedFigures.append(file)
+            print("Saved figure "+file)
+        plt.close('all')
+    show = plt.show
+    if(arguments.output is not None):
+        plt.show = saveFigures
+    try:
+        analysis = importlib.import_module(analyses[arguments.analysis])
+        analysis.runAnalysis(arguments.root, arguments.mapping)
+        plt.show()
+    finally:
+        plt.show = show
+
+
+#benchmarks all stages on synthetic data of the given sizes and optionally compares the results with an earlier run
+def runBenchmark(arguments):
+    from Benchmark import Benchmark
+    benchmark = Benchmark(arguments.sizes, arguments.repeats, not arguments.noMemory, arguments.stages)
+    results = benchmark.run(arguments.output)
+    print(results.to_string(index = False))
+    if(arguments.compare is not None):
+        file = arguments.output if arguments.output is not None else sorted(os.path.join(benchmark.directory, name) for name in os.listdir(benchmark.directory) if name.startswith('benchmark_'))[-1]
+        comparison = Benchmark.compareResults(arguments.compare, file, arguments.threshold)
+        print(comparison.to_string(index = False))
+        if(comparison['regression'].any()):
+            print("Regressions found in "+str(comparison['regression'].sum())+" stages")
+
+
+#creates the parser of all subcommands
+def createParser():
+    parser = argparse.ArgumentParser(description = "Tools to extract information enclosed in betting odds")
+    parser.add_argument('--profile', default = None, help = "json lines file to record time, rows and memory of all instrumented calculations")
+    parser.add_argument('--profile-memory', dest = 'profileMemory', action = 'store_true', help = "also record the peak memory (slower)")
+    subparsers = parser.add_subparsers(dest = 'command', required = True)
+
+    parserImport = subparsers.add_parser('import', help = "import all files of the input folder")
+    parserImport.add_argument('--root', default = defaultRoot)
+    parserImport.add_argument('--mapping', default = defaultMapping)
+    parserImport.add_argument('--missing-data-allowed', dest = 'missingDataAllowed', nargs = '*', default = defaultMissingDataAllowed)
+    parserImport.add_argument('--no-cache', dest = 'noCache', action = 'store_true', help = "do not use the import cache")
+    parserImport.add_argument('--output', required = True)
+    parserImport.set_defaults(function = runImport)
+
+    parserAverages = subparsers.add_parser('averages', help = "add averages of goals and points (input of the import subcommand)")
+    parserAverages.add_argument('--input', required = True)
+    parserAverages.add_argument('--output', required = True)
+    parserAverages.set_defaults(function = runAverages)
+
+    parserProbabilities = subparsers.add_parser('probabilities', help = "add outcome probabilities from the betting odds")
+    parserProbabilities.add_argument('--input', required = True)
+    parserProbabilities.add_argument('--method', choices = ['basicNormalisation', 'shin', 'logisticRegression'], default = 'shin')
+    parserProbabilities.add_argument('--output', required = True)
+    parserProbabilities.set_defaults(function = runProbabilities)
+
+    parserAnticipatedGoals = subparsers.add_parser('anticipated-goals', help = "add anticipated goals from the betting odds")
+    parserAnticipatedGoals.add_argument('--input', required = True)
+    parserAnticipatedGoals.add_argument('--method', choices = ['invertedPoisson', 'linear', 'poisson', 'doubleRegression', 'walkForward'], default = 'invertedPoisson')
+    parserAnticipatedGoals.add_argument('--continuous', action = 'store_true', help = "continuous inverted Poisson instead of the grid of anticipated goals")
+    parserAnticipatedGoals.add_argument('--model', choices = ['poissonModel', 'dixonColesModel', 'bivariatePoissonModel', 'negativeBinomialModel'], default = 'poissonModel', help = "model inverted by invertedPoisson")
+    parserAnticipatedGoals.add_argument('--model-parameter', dest = 'modelParameter', type = float, default = None, help = "rho, covariance or dispersion of the model")
+    parserAnticipatedGoals.add_argument('--markets', choices = ['standard', 'board'], default = 'standard', help = "fit home, draw, away and over/under 2.5 or all markets of the board that are in the input")
+    parserAnticipatedGoals.add_argument('--weight', dest = 'weights', action = 'append', default = [], metavar = 'COLUMN=WEIGHT', help = "weight of the squared differences of a market, e.g. probOver25=2")
+    parserAnticipatedGoals.add_argument('--forgetting', type = float, default = 1.0, help = "forgetting factor of the walk-forward regression")
+    parserAnticipatedGoals.add_argument('--output', required = True)
+    parserAnticipatedGoals.set_defaults(function = runAnticipatedGoals)
+
+    parserMarkets = subparsers.add_parser('markets', help = "price a market board from anticipated goals")
+    parserMarkets.add_argument('--input', required = True)
+    parserMarkets.add_argument('--model', choices = ['poissonModel', 'dixonColesModel', 'bivariatePoissonModel', 'negativeBinomialModel'], default = 'poissonModel')
+    parserMarkets.add_argument('--model-parameter', dest = 'modelParameter', type = float, default = None, help = "rho, covariance or dispersion of the model")
+    parserMarkets.add_argument('--max-score', dest = 'maxScore', type = int, default = 5, help = "highest number of goals per team of the correct scores")
+    parserMarkets.add_argument('--output', required = True)
+    parserMarkets.set_defaults(function = runMarkets)
+
+    parserElo = subparsers.add_parser('elo', help = "add Elo ratings of both teams (input of the averages subcommand)")
+    parserElo.add_argument('--input', required = True)
+    parserElo.add_argument('--k', type = float, default = 25)
+    parserElo.add_argument('--ha', type = float, default = 80)
+    parserElo.add_argument('--output', required = True)
+    parserElo.set_defaults(function = runElo)
+
+    parserEvaluate = subparsers.add_parser('evaluate', help = "score probabilities and anticipated goals of one or more files")
+    parserEvaluate.add_argument('--input', nargs = '+', required = True)
+    parserEvaluate.add_argument('--groups', nargs = '*', default = [], help = "columns to score separately, e.g. season round")
+    parserEvaluate.add_argument('--bootstrap', type = int, default = 0, help = "number of bootstrap replicates for confidence intervals (0 for none)")
+    parserEvaluate.add_argument('--cluster', default = None, help = "column of the clusters resampled by the bootstrap, e.g. season")
+    parserEvaluate.add_argument('--output', default = None)
+    parserEvaluate.set_defaults(function = runEvaluate)
+
+    parserPlot = subparsers.add_parser('plot', help = "run one of the analysis scripts of the paper")
+    parserPlot.add_argument('--analysis', choices = list(analyses), required = True)
+    parserPlot.add_argument('--root', default = defaultRoot)
+    parserPlot.add_argument('--mapping', default = defaultMapping)
+    parserPlot.add_argument('--output', default = None, help = "folder to save the figures to instead of showing them")
+    parserPlot.set_defaults(function = runPlot)
+
+    parserBenchmark = subparsers.add_parser('benchmark', help = "time and memory-profile all stages on synthetic data")
+    parserBenchmark.add_argument('--sizes', type = int, nargs = '+', default = [10000, 100000], help = "approximate numbers of matches")
+    parserBenchmark.add_argument('--repeats', type = int, default = 3)
+    parserBenchmark.add_argument('--no-memory', dest = 'noMemory', action = 'store_true', help = "do not measure the peak memory of the stages")
+    parserBenchmark.add_argument('--stages', nargs = '+', default = None)
+    parserBenchmark.add_argument('--output', default = None, help = "json file of the results (default is a new file in data/benchmarks)")
+    parserBenchmark.add_argument('--compare', default = None, help = "json file of an earlier run to compare with")
+    parserBenchmark.add_argument('--threshold', type = float, default = 1.2, help = "ratio of time or memory to the earlier run regarded as regression")
+    parserBenchmark.set_defaults(function = runBenchmark)
+    return parser
+
+
+def main(argv = None):
+    arguments = createParser().parse_args(argv)
+    if(arguments.profile is not None):
+        from bettingCalculationTools.Instrumentation import enableInstrumentation, JsonFileSink
+        enableInstrumentation(JsonFileSink(arguments.profile), traceMemory = arguments.profileMemory)
+    arguments.function(arguments)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,11 +6,13 @@
 """
 
 
+import numpy as np
 import pandas as pd
 from abc import ABC
-from bettingCalculationTools.ProbabilityModelling import PoissonModel
-
-from sklearn import linear_model
+from bettingCalculationTools.ProbabilityModelling import PoissonModel, tableDirectory
+from bettingCalculationTools.Markets import MarketAggregator
+from bettingCalculationTools.CrossFitting import CrossFitting
+from bettingCalculationTools.Instrumentation import instrumented
 
 
 #defining the interface of objects that calculate anticipated goals.
@@ -27,58 +29,56 @@ class AnticipatedGoalsCalculator(ABC):
     
 
 #uses linear or Poisson regression to transfer odds into anticipated goals
+#anticipated goals are obtained out-of-sample by cross-fitting (by default on both halves of the data, see CrossFitting for further schemes)
 class Regression(AnticipatedGoalsCalculator):
     #regressionType=''
     
-    def __init__(self, regressionType):
+    def __init__(self, regressionType, crossFitting = None):
         self.regressionType = regressionType
+        self.crossFitting = CrossFitting() if crossFitting is None else crossFitting
         super().__init__(regressionType)
 
     
+    @instrumented('anticipatedGoals')
     def addAnticipatedGoals(self, data):
-        #split in-sample and out-of-sample
+        #folds in chronological order
         data.sort_values(by=['date','teamHome','teamAway'], ascending = [True, True, True], inplace=True)
-        row = int(len(data)*0.5)
-        data1 = data.iloc[:row,:]
-        data2 = data.iloc[row:,:]
-        
-        if self.regressionType == 'poisson':
-            regressionHome = linear_model.PoissonRegressor()
-            regressionAway = linear_model.PoissonRegressor()      
-        else:
-            regressionHome = linear_model.LinearRegression()
-            regressionAway = linear_model.LinearRegression()
-        
-        odds1 = data1[['oddsHome','oddsDraw','oddsAway','oddsUnder25', 'oddsOver25']]
-        odds2 = data2[['oddsHome','oddsDraw','oddsAway','oddsUnder25', 'oddsOver25']]
-
-        regressionHome.fit(odds2,data2['goalsHome'])
-        regressionAway.fit(odds2,data2['goalsAway'])        
+        data = data.reset_index(drop = True)
         
-        data1 = data1.assign(anticipatedGoalsHome = regressionHome.predict(odds1))
-        data1 = data1.assign(anticipatedGoalsAway = regressionAway.predict(odds1))
+        odds = data[['oddsHome','oddsDraw','oddsAway','oddsUnder25', 'oddsOver25']]
+        anticipatedGoals = self.crossFitting.fitPredict(data, fitRegressionFold, odds, data[['goalsHome', 'goalsAway']], self.regressionType)
         
-        regressionHome.fit(odds1,data1['goalsHome'])
-        regressionAway.fit(odds1,data1['goalsAway'])
-        
-        data2 = data2.assign(anticipatedGoalsHome = regressionHome.predict(odds2))
-        data2 = data2.assign(anticipatedGoalsAway = regressionAway.predict(odds2))
-        
-        
-        return pd.concat([data1, data2], ignore_index=True, axis=0)
+        data = data.assign(anticipatedGoalsHome = anticipatedGoals[:,0])
+        data = data.assign(anticipatedGoalsAway = anticipatedGoals[:,1])
+        return data
 
         
 #uses the combination of two regressions to transfer odds into anticipated goals (only linear regression is possible as difference does not suit Poisson regression)
+#if crossFitting is given, anticipated goals of all matches are obtained by cross-fitting instead of the split into in-sample and out-of-sample
 class DoubleRegression(AnticipatedGoalsCalculator):
     #regressionType=''
     
-    def __init__(self):
+    def __init__(self, crossFitting = None):
         super().__init__('regression')
+        self.crossFitting = crossFitting
 
     
-    def addAnticipatedGoals(self, data, percentageIS):
+    @instrumented('anticipatedGoals')
+    def addAnticipatedGoals(self, data, percentageIS = 0.5):
+        from sklearn import linear_model
+        
         #split in-sample and out-of-sample
         data.sort_values(by=['date','teamHome','teamAway'], ascending = [True, True, True], inplace=True)
+        
+        if(self.crossFitting is not None):
+            data = data.reset_index(drop = True)
+            odds = data[['oddsHome','oddsDraw','oddsAway','oddsUnder25', 'oddsOver25']]
+            goals = np.column_stack([data['goalsHome']+data['goalsAway'], data['goalsHome']-data['goalsAway']])
+            goalsSumDifference = self.crossFitting.fitPredict(data, fitRegressionFold, odds, goals, 'linear')
+            data = data.assign(anticipatedGoalsHome = 0.5*(goalsSumDifference[:,0]+goalsSumDifference[:,1]))
+            data = data.assign(anticipatedGoalsAway = 0.5*(goalsSumDifference[:,0]-goalsSumDifference[:,1]))
+            return data
+        
         row = int(len(data)*percentageIS)
         inSample = data.iloc[:row,:]
         outOfSample = data.iloc[row+1:,:]
@@ -96,31 +96,157 @@ class DoubleRegression(AnticipatedGoalsCalculator):
         outOfSample = outOfSample.assign(anticipatedGoalsHome = 0.5*(regressionSum.predict(oddsOOS)+regressionDifference.predict(oddsOOS)))
         outOfSample = outOfSample.assign(anticipatedGoalsAway = 0.5*(regressionSum.predict(oddsOOS)-regressionDifference.predict(oddsOOS)))
         return pd.concat([inSample, outOfSample], ignore_index=True, axis=0)
+
+
+#uses recursive least squares to obtain anticipated goals walk-forward, i.e. the anticipated goals of a match only depend on matches played on earlier dates
+#all matches of a date are predicted with the same coefficients and added in one update afterwards, so that the whole history is processed in one pass
+#forgetting < 1 down-weights older matches exponentially (weight forgetting^n for a match followed by n matches on later dates)
+#double uses the sum and difference of goals as targets (see DoubleRegression), anticipated goals are missing for matches before minimumMatches previous matches are available
+class WalkForwardRegression(AnticipatedGoalsCalculator):
+    
+    def __init__(self, forgetting = 1.0, double = False, minimumMatches = 100, initialVariance = 1e6):
+        super().__init__('walkForwardRegression')
+        self.forgetting = forgetting
+        self.double = double
+        self.minimumMatches = minimumMatches
+        self.initialVariance = initialVariance
+
+    
+    @instrumented('anticipatedGoals')
+    def addAnticipatedGoals(self, data):
+        data.sort_values(by=['date','teamHome','teamAway'], ascending = [True, True, True], inplace=True)
+        data = data.reset_index(drop = True)
+        
+        #odds and intercept as features
+        odds = data[['oddsHome','oddsDraw','oddsAway','oddsUnder25', 'oddsOver25']].to_numpy(dtype = float)
+        features = np.column_stack([np.ones(len(data.index)), odds])
+        goalsHome = data['goalsHome'].to_numpy(dtype = float)
+        goalsAway = data['goalsAway'].to_numpy(dtype = float)
+        if(self.double):
+            targets = np.column_stack([goalsHome + goalsAway, goalsHome - goalsAway])
+        else:
+            targets = np.column_stack([goalsHome, goalsAway])
+        
+        predictions = self.predictWalkForward(data['date'].to_numpy(), features, targets)
+        if(self.double):
+            predictions = np.column_stack([0.5*(predictions[:,0]+predictions[:,1]), 0.5*(predictions[:,0]-predictions[:,1])])
+        
+        data = data.assign(anticipatedGoalsHome = predictions[:,0])
+        data = data.assign(anticipatedGoalsAway = predictions[:,1])
+        return data
+    
+    
+    #predicts the targets of all matches (sorted by date) from the coefficients fitted on all matches of earlier dates
+    def predictWalkForward(self, dates, features, targets):
+        coefficients = np.zeros((features.shape[1], targets.shape[1]))
+        covariance = self.initialVariance * np.eye(features.shape[1])
+        predictions = np.full(targets.shape, np.nan)
+        
+        dateStarts = np.flatnonzero(np.insert(dates[1:] != dates[:-1], 0, True))
+        dateEnds = np.append(dateStarts[1:], len(dates))
+        for start, end in zip(dateStarts, dateEnds):
+            if(start >= self.minimumMatches):
+                predictions[start:end] = features[start:end] @ coefficients
+            coefficients, covariance = self.updateRecursiveLeastSquares(coefficients, covariance, features[start:end], targets[start:end])
+        return predictions
+    
+    
+    #updates coefficients and covariance of the recursive least squares with a block of matches
+    #older information is down-weighted by forgetting to the power of the number of matches in the block
+    def updateRecursiveLeastSquares(self, coefficients, covariance, features, targets):
+        covariance = covariance / self.forgetting**len(features)
+        gain = np.linalg.solve(np.eye(len(features)) + features @ covariance @ features.T, features @ covariance).T
+        coefficients = coefficients + gain @ (targets - features @ coefficients)
+        covariance = covariance - gain @ features @ covariance
+        #keep the covariance symmetric to avoid the accumulation of rounding errors
+        covariance = (covariance + covariance.T) / 2
+        return coefficients, covariance
+
+
+#fits one regression per target (columns of targetsTrain) on one fold (see CrossFitting.fitPredict) and returns the predictions and the parameters of all regressions
+#Poisson regressions are warm-started from the given parameters, linear regressions are solved directly
+def fitRegressionFold(featuresTrain, targetsTrain, featuresTest, startParameters, regressionType):
+    from sklearn import linear_model
+    predictions = []
+    parameters = []
+    for target in range(targetsTrain.shape[1]):
+        if regressionType == 'poisson':
+            regression = linear_model.PoissonRegressor(warm_start = startParameters is not None)
+            if(startParameters is not None):
+                regression.coef_, regression.intercept_ = startParameters[target]
+        else:
+            regression = linear_model.LinearRegression()
+        regression.fit(featuresTrain, targetsTrain[:,target])
+        predictions.append(regression.predict(featuresTest))
+        parameters.append((regression.coef_, regression.intercept_))
+    return np.column_stack(predictions), parameters
         
 
 #uses a precalculated Poisson model to inversely obtain anticipated goals from odds
+#the table of the model is calculated on the given grid on first use and reused from the cache afterwards
+#in continuous mode, the best-fitting cells of the table are only used as starting values of a least-squares refinement (a coarse grid is sufficient then)
+#any other model of ProbabilityModelling can be inverted instead of the Poisson model (e.g. DixonColesModel to account for more draws)
+#by default the anticipated goals fit the probabilities of home, draw, away, over 2.5 and under 2.5, further markets can be given as in MarketAggregator
+#(e.g. [('home',), ('draw',), ('away',), ('over', 1.5), ('over', 2.5), ('asianHandicapHome', -0.5), ('bothScore',)]) with the probabilities in the columns of MarketAggregator.createColumnName
+#markets whose columns are not in the data are left out, missing probabilities of a match are left out of its fit (a match is only lost if all probabilities are missing)
+#weights are the weights of the squared differences of the markets by column (e.g. {'probOver25': 2.0}), all other markets have a weight of 1
+#tables are cached in the tableDirectory (by default data/tables, see ProbabilityModelling)
 class InvertedPoisson(AnticipatedGoalsCalculator):
     
-    def __init__(self):
+    def __init__(self, start = 0.0, stop = 6.0, step = 0.025, dtype = np.float64, continuous = False, model = None, markets = None, weights = None, tableDirectory = tableDirectory):
         super().__init__('invertedPoisson')
+        self.continuous = continuous
+        self.start = start
+        self.stop = stop
+        self.step = step
+        self.dtype = dtype
+        self.model = PoissonModel() if model is None else model
+        self.markets = markets
+        self.weights = weights
+        self.tableDirectory = tableDirectory
    
-    def addAnticipatedGoals(self, data, file):
-        model = PoissonModel()
-        table = model.loadTable(file)
-        antHome = []
-        antAway = []
-        for row in range(0,len(data)):
-            probabilities = data[['probHome', 'probDraw', 'probAway', 'probOver25', 'probUnder25']].iloc[row]
-            anticipations = model.obtainAnticipatedGoals(table, probabilities)
-            antHome.append(anticipations[0])
-            antAway.append(anticipations[1])
+    #a precalculated table can still be given as csv file, otherwise the cached table is used
+    @instrumented('anticipatedGoals')
+    def addAnticipatedGoals(self, data, file = None):
+        model = self.model
+        if(self.markets is not None or self.weights is not None):
+            return self.addMarketAnticipatedGoals(data, file)
+        if(file is None):
+            table = model.obtainTable(self.start, self.stop, self.step, self.dtype, self.tableDirectory)
+        else:
+            table = model.loadTable(file)
+        antHome, antAway = model.obtainAllAnticipatedGoals(table, data[model.probabilityColumns])
+        if(self.continuous):
+            antHome, antAway = model.refineAnticipatedGoals(data[model.probabilityColumns], antHome, antAway)
         
         data = data.assign(anticipatedGoalsHome = antHome)
         data = data.assign(anticipatedGoalsAway = antAway)
    
         return data
-
-        
     
-
-
+    #fits the anticipated goals to all given markets that are available in the data (the table of these markets is cached as the standard table), a table given as csv file has to contain the columns of these markets
+    def addMarketAnticipatedGoals(self, data, file = None):
+        model = self.model
+        markets = [('home',), ('draw',), ('away',), ('over', 2.5), ('under', 2.5)] if self.markets is None else self.markets
+        aggregator = model.createMarketAggregator([market for market in markets if MarketAggregator.createColumnName(market) in data.columns])
+        if(len(aggregator.markets) == 0):
+            raise ValueError("None of the columns of the markets "+str(markets)+" is in the data")
+        weights = {} if self.weights is None else self.weights
+        unknown = [column for column in weights if column not in aggregator.columns]
+        if(len(unknown) > 0):
+            raise ValueError("Weights of the columns "+str(unknown)+" do not belong to any fitted market "+str(aggregator.columns))
+        weights = np.array([weights.get(column, 1.0) for column in aggregator.columns])
+        if(file is None):
+            table = model.obtainMarketTable(aggregator, self.start, self.stop, self.step, self.dtype, self.tableDirectory)
+        else:
+            table = model.loadTable(file)
+        
+        probabilities = data[aggregator.columns]
+        antHome, antAway = model.obtainMarketAnticipatedGoals(table, probabilities, aggregator.columns, weights)
+        if(self.continuous):
+            antHome, antAway = model.refineAnticipatedGoals(probabilities, antHome, antAway, aggregator = aggregator, weights = weights)
+        
+        data = data.assign(anticipatedGoalsHome = antHome)
+        data = data.assign(anticipatedGoalsAway = antAway)
+   
+        return data
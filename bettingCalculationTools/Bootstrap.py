@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Paired bootstrap confidence intervals and model comparisons for all scores of MetricsCalculation
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from bettingCalculationTools.Metrics import MetricsCalculation
+
+
+#sums and counts of the scores per cluster, set once per process of the pool (see initialiseBlock)
+clusterSums = None
+clusterCounts = None
+
+
+#resamples matches (or clusters of matches like seasons or matchdays) with replacement, all models are evaluated on the same resamples (paired bootstrap)
+#replicates are drawn in blocks of index matrices, which are evaluated in a process pool, the results only depend on the seed (not on the number of workers or the block size)
+#only matches or whole clusters are resampled (no moving blocks of consecutive matches)
+class Bootstrap:
+
+    def __init__(self, replicates = 2000, confidence = 0.95, cluster = None, seed = 0, workers = None, blockSize = 100):
+        self.replicates = replicates
+        self.confidence = confidence
+        self.cluster = cluster
+        self.seed = seed
+        self.workers = os.cpu_count() if workers is None else workers
+        self.blockSize = blockSize
+
+
+    #returns the average of every score over all matches and its percentile confidence interval (models are given as in MetricsCalculation.calculateMatchScores)
+    def calculateIntervals(self, data, probabilityModels = {}, goalModels = {}):
+        scores = MetricsCalculation.calculateMatchScores(data, probabilityModels, goalModels)
+        replicates = self.resampleAverages(data, scores)
+        lower, upper = self.calculatePercentiles(replicates)
+        results = pd.DataFrame({'value': scores.mean(), 'lower': lower, 'upper': upper, 'matches': scores.count()}, index = scores.columns)
+        return results.reset_index()
+
+
+    #compares all models with the baseline model on the same matches and returns the average difference of every score (model - baseline),
+    #its percentile confidence interval and the two-sided bootstrap p-value of no difference
+    def compareModels(self, data, baseline, probabilityModels = {}, goalModels = {}):
+        scores = MetricsCalculation.calculateMatchScores(data, probabilityModels, goalModels)
+        differences = {}
+        for model, metric in scores.columns:
+            if(model != baseline and (baseline, metric) in scores):
+                differences[(model, metric)] = scores[(model, metric)] - scores[(baseline, metric)]
+        differences = pd.DataFrame(differences, index = data.index)
+        differences.columns = pd.MultiIndex.from_tuples(differences.columns, names = ['model', 'metric'])
+
+        replicates = self.resampleAverages(data, differences)
+        lower, upper = self.calculatePercentiles(replicates)
+        pValues = np.minimum(1, 2*np.minimum(np.mean(replicates <= 0, axis = 0), np.mean(replicates >= 0, axis = 0)))
+        results = pd.DataFrame({'difference': differences.mean(), 'lower': lower, 'upper': upper, 'pValue': pValues, 'matches': differences.count()}, index = differences.columns)
+        results.insert(0, 'baseline', baseline)
+        return results.reset_index()
+
+
+    #returns the averages of all scores (columns) for all replicates with shape replicates x scores
+    #the scores are summarised per cluster, so that every replicate only needs the number of draws of each cluster (matches with missing scores are ignored)
+    def resampleAverages(self, data, scores):
+        values = scores.to_numpy(dtype = float)
+        if(self.cluster is None):
+            clusters = np.arange(len(data.index))
+        else:
+            clusters = pd.factorize(data[self.cluster])[0]
+        numberClusters = clusters.max() + 1
+        sums = np.zeros((numberClusters, values.shape[1]))
+        np.add.at(sums, clusters, np.nan_to_num(values))
+        counts = np.zeros((numberClusters, values.shape[1]))
+        np.add.at(counts, clusters, ~np.isnan(values))
+
+        #independent random streams for all replicates, which are split into blocks
+        seeds = np.random.SeedSequence(self.seed).spawn(self.replicates)
+        blockSeeds = [seeds[start:start + self.blockSize] for start in range(0, self.replicates, self.blockSize)]
+        if(self.workers > 1 and len(blockSeeds) > 1):
+            with ProcessPoolExecutor(max_workers = self.workers, initializer = initialiseBlock, initargs = (sums, counts)) as executor:
+                blocks = list(executor.map(resampleBlock, blockSeeds))
+        else:
+            initialiseBlock(sums, counts)
+            blocks = list(map(resampleBlock, blockSeeds))
+        return np.concatenate(blocks)
+
+
+    #lower and upper percentiles of the replicates for the confidence level
+    def calculatePercentiles(self, replicates):
+        alpha = (1 - self.confidence) / 2
+        return np.nanquantile(replicates, alpha, axis = 0), np.nanquantile(replicates, 1 - alpha, axis = 0)
+
+
+
+#stores sums and counts of the scores per cluster for all blocks evaluated in this process
+def initialiseBlock(sums, counts):
+    global clusterSums, clusterCounts
+    clusterSums = sums
+    clusterCounts = counts
+
+#draws an index matrix of clusters for a block of replicates (one row per seed) and returns the averages of all scores for each replicate
+def resampleBlock(seeds):
+    numberClusters = len(clusterSums)
+    replicates = len(seeds)
+    indices = np.stack([np.random.default_rng(seed).integers(0, numberClusters, size = numberClusters) for seed in seeds])
+    #number of draws of each cluster in each replicate
+    draws = np.bincount((indices + numberClusters * np.arange(replicates)[:, None]).ravel(), minlength = replicates * numberClusters).reshape(replicates, numberClusters).astype(float)
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        return (draws @ clusterSums) / (draws @ clusterCounts)
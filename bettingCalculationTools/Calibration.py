@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Reliability tables and calibration errors of probabilities or anticipated goals
+"""
+
+import numpy as np
+import pandas as pd
+
+
+#outcomes of matches to be used for the calibration of the probabilities of ProbabilityCalculation
+outcomes = {'home': lambda data: data['goalsHome'] > data['goalsAway'],
+            'draw': lambda data: data['goalsHome'] == data['goalsAway'],
+            'away': lambda data: data['goalsHome'] < data['goalsAway'],
+            'over25': lambda data: data['goalsHome'] + data['goalsAway'] > 2.5,
+            'under25': lambda data: data['goalsHome'] + data['goalsAway'] < 2.5}
+
+
+#calculates reliability tables (average prediction and average observed outcome per bin) for any number of predictions
+#strategy 'quantile' uses bins with the same number of matches, 'uniform' uses bins of the same width between the limits (by default the minimum and maximum prediction)
+#quantile bins are the same as in sklearn.calibration.calibration_curve, uniform bins only with limits (0, 1)
+#bins include their upper edge as in sklearn, with rightClosed = False they include their lower edge as in scipy.stats.binned_statistic (e.g. for anticipated goals)
+class Calibration:
+
+    def __init__(self, bins = 10, strategy = 'quantile', limits = None, rightClosed = True):
+        if(strategy not in ['quantile', 'uniform']):
+            raise ValueError("Unknown strategy "+str(strategy)+", expected 'quantile' or 'uniform'")
+        self.bins = bins
+        self.strategy = strategy
+        self.limits = limits
+        self.rightClosed = rightClosed
+
+
+    #data is a dataframe or a dictionary of methods and their dataframes, predictions maps names to pairs of the column of the prediction and the outcome
+    #outcomes are columns or functions of the data (see outcomes), groups are optional columns (e.g. league and season) with one reliability table per group
+    #returns a tidy dataframe with one row per (method,) group, prediction and non-empty bin
+    def calculateReliability(self, data, predictions, groups = []):
+        if(isinstance(data, pd.DataFrame)):
+            return self.calculateReliabilityMethod(data, predictions, groups)
+        return pd.concat({method: self.calculateReliabilityMethod(data[method], predictions, groups) for method in data}, names = ['method']).reset_index(level = 0).reset_index(drop = True)
+
+
+    #calculates the reliability tables for a single dataframe
+    def calculateReliabilityMethod(self, data, predictions, groups = []):
+        results = []
+        for name, (predictionColumn, outcome) in predictions.items():
+            predicted = data[predictionColumn].to_numpy(dtype = float)
+            observed = np.asarray(outcome(data) if callable(outcome) else data[outcome], dtype = float)
+            if(len(groups) > 0):
+                groupIndices = data.groupby(groups, observed = True, sort = True).indices
+            else:
+                groupIndices = {(): np.arange(len(data.index))}
+            for group, indices in groupIndices.items():
+                table = self.calculateReliabilityTable(predicted[indices], observed[indices])
+                table.insert(0, 'prediction', name)
+                for position, column in enumerate(groups):
+                    table.insert(position, column, group[position] if isinstance(group, tuple) else group)
+                results.append(table)
+        return pd.concat(results, ignore_index = True)
+
+
+    #calculates the reliability table of one prediction, with one sort of the predictions and sums of all bins by reduceat
+    def calculateReliabilityTable(self, predicted, observed):
+        valid = ~(np.isnan(predicted) | np.isnan(observed))
+        predicted = predicted[valid]
+        observed = observed[valid]
+        if(len(predicted) == 0):
+            return pd.DataFrame({'bin': [], 'predicted': [], 'observed': [], 'matches': []})
+        order = np.argsort(predicted, kind = 'stable')
+        predicted = predicted[order]
+        observed = observed[order]
+
+        if(self.strategy == 'quantile'):
+            #linear interpolation of the quantiles on the sorted predictions (as np.quantile)
+            positions = np.linspace(0, 1, self.bins + 1) * (len(predicted) - 1)
+            lower = np.floor(positions).astype(int)
+            upper = np.ceil(positions).astype(int)
+            edges = predicted[lower] + (predicted[upper] - predicted[lower]) * (positions - lower)
+        else:
+            limits = (predicted[0], predicted[-1]) if self.limits is None else self.limits
+            edges = np.linspace(limits[0], limits[1], self.bins + 1)
+
+        #predictions are sorted, so that all bins are consecutive
+        binIds = np.searchsorted(edges[1:-1], predicted, side = 'left' if self.rightClosed else 'right')
+        starts = np.flatnonzero(np.insert(binIds[1:] != binIds[:-1], 0, True))
+        counts = np.diff(np.append(starts, len(predicted)))
+        return pd.DataFrame({'bin': binIds[starts],
+                             'predicted': np.add.reduceat(predicted, starts) / counts,
+                             'observed': np.add.reduceat(observed, starts) / counts,
+                             'matches': counts})
+
+
+    #summarises reliability tables by the expected calibration error (average absolute difference between prediction and outcome weighted by the matches of the bins)
+    #and the maximum calibration error per (method,) group and prediction
+    def summariseReliability(self, reliability):
+        keys = [column for column in reliability.columns if column not in ['bin', 'predicted', 'observed', 'matches']]
+        reliability = reliability.assign(error = np.abs(reliability['predicted'] - reliability['observed']))
+        reliability = reliability.assign(weightedError = reliability['error'] * reliability['matches'])
+        grouped = reliability.groupby(keys, sort = False)
+        summary = pd.DataFrame({'ece': grouped['weightedError'].sum() / grouped['matches'].sum(),
+                                'mce': grouped['error'].max(),
+                                'matches': grouped['matches'].sum()})
+        return summary.reset_index()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Cross-fitting of models on folds of the data, i.e. each match obtains predictions of a model that was fitted without the fold of the match
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+
+#assigns matches to folds and fits one model per fold in a process pool
+#scheme 'timeOrdered' splits the data into the given number of consecutive blocks (data is expected to be sorted by date, two folds are the halves of the data)
+#scheme 'leaveOneSeasonOut' uses every season as one fold
+class CrossFitting:
+
+    def __init__(self, scheme = 'timeOrdered', folds = 2, workers = None, seasonColumn = 'season'):
+        if(scheme not in ['timeOrdered', 'leaveOneSeasonOut']):
+            raise ValueError("Unknown cross-fitting scheme "+str(scheme)+", expected 'timeOrdered' or 'leaveOneSeasonOut'")
+        self.scheme = scheme
+        self.folds = folds
+        self.workers = os.cpu_count() if workers is None else workers
+        self.seasonColumn = seasonColumn
+
+
+    #returns the fold of each match in the order of the data
+    def assignFolds(self, data):
+        if(self.scheme == 'leaveOneSeasonOut'):
+            return pd.factorize(data[self.seasonColumn], sort = True)[0]
+        positions = np.arange(len(data.index))
+        return np.searchsorted(np.floor(np.arange(1, self.folds) * len(data.index) / self.folds), positions, side = 'right')
+
+
+    #fits a model for every fold and returns the out-of-fold predictions for all matches (one row per match)
+    #fitPredictFold(featuresTrain, targetsTrain, featuresTest, startParameters, *arguments) fits a model and returns its predictions and parameters, it has to be defined on module level to be used in the process pool
+    #the first fold is fitted on its own, all further folds are fitted in parallel and are warm-started from the parameters of the first fold (so that the results do not depend on the number of workers)
+    def fitPredict(self, data, fitPredictFold, features, targets, *arguments):
+        foldIds = self.assignFolds(data)
+        folds = np.unique(foldIds)
+        if(len(folds) < 2):
+            raise ValueError("Cross-fitting needs at least two folds, but the data only contains "+str(len(folds)))
+        features = np.asarray(features, dtype = float)
+        targets = np.asarray(targets)
+
+        results = [fitPredictFold(features[foldIds != folds[0]], targets[foldIds != folds[0]], features[foldIds == folds[0]], None, *arguments)]
+        startParameters = results[0][1]
+        trainFeatures = [features[foldIds != fold] for fold in folds[1:]]
+        trainTargets = [targets[foldIds != fold] for fold in folds[1:]]
+        testFeatures = [features[foldIds == fold] for fold in folds[1:]]
+        if(self.workers > 1 and len(folds) > 2):
+            with ProcessPoolExecutor(max_workers = self.workers) as executor:
+                results += list(executor.map(fitPredictFold, trainFeatures, trainTargets, testFeatures, repeat(startParameters), *[repeat(argument) for argument in arguments]))
+        else:
+            results += list(map(fitPredictFold, trainFeatures, trainTargets, testFeatures, repeat(startParameters), *[repeat(argument) for argument in arguments]))
+
+        predictions = None
+        for fold, (foldPredictions, parameters) in zip(folds, results):
+            foldPredictions = np.asarray(foldPredictions, dtype = float).reshape(np.count_nonzero(foldIds == fold), -1)
+            if(predictions is None):
+                predictions = np.full((len(foldIds), foldPredictions.shape[1]), np.nan)
+            predictions[foldIds == fold] = foldPredictions
+        return predictions
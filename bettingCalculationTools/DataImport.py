@@ -5,22 +5,77 @@
 
 import pandas as pd
 import os
+import hashlib
+import logging
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from bettingCalculationTools.Instrumentation import instrumented
+
+
+#default directory for cached input files, which are stored in feather format if pyarrow is installed
+importCacheDirectory = os.path.join(os.path.dirname(__file__), '..', 'data', 'importCache')
+importCacheAvailable = importlib.util.find_spec('pyarrow') is not None
+logger = logging.getLogger(__name__)
 
 
 #used for the import of data from csv to a DataFrame with the expected format
 class DataImporter:
     
-    #imports relevant information from a file of any data source using the given mapping
-    #New data are added to the existing data. If no data is available, the input for existing data should be an empty dataframe
-    def addInputFile(self, existingData, file, mapping, inputFormat = '%d/%m/%y', targetFormat = '%d/%m/%y'):
-        input = pd.read_csv(file, encoding = "latin", on_bad_lines='error')
-        mapping = pd.read_csv(mapping)        
+    #reads a mapping file and returns a dictionary of internal names and the names in the data sources in the order of the mapping (i.e. order of preference)
+    def readMapping(mapping):
+        mapping = pd.read_csv(mapping)
+        sources = {}
+        for row in range(0,len(mapping)):
+            sources.setdefault(mapping['nameInternal'][row], []).append(mapping['nameDataSource'][row])
+        return sources
+    
+    #reads the compact data types of the internal names from the optional column dtype of a mapping file (internal names without a data type are not converted)
+    def readDtypes(mapping):
+        mapping = pd.read_csv(mapping)
+        if('dtype' not in mapping):
+            return {}
+        mapping = mapping.dropna(subset=['dtype']).drop_duplicates(subset=['nameInternal'])
+        return dict(zip(mapping['nameInternal'], mapping['dtype']))
+    
+    #converts all columns with a compact data type, the season is stored as category
+    #nullable integers (e.g. Int8) keep missing values, all other conversions follow pandas
+    def applyDtypes(data, dtypes):
+        dtypes = {column: dtypes[column] for column in dtypes if column in data}
+        if('season' in data):
+            dtypes['season'] = 'category'
+        return data.astype(dtypes)
+    
+    #concatenates compact frames, categories of all frames are unified and sorted (concatenation of different categories would lead to objects and sorting follows the order of categories)
+    def concatenateData(frames):
+        if(len(frames) == 0):
+            return pd.DataFrame()
+        for column in frames[0].columns:
+            if(isinstance(frames[0][column].dtype, pd.CategoricalDtype)):
+                categories = pd.api.types.union_categoricals([frame[column] for frame in frames if column in frame], sort_categories=True).categories
+                frames = [frame.assign(**{column: frame[column].cat.set_categories(categories)}) if column in frame else frame for frame in frames]
+        return pd.concat(frames, ignore_index=True, axis=0)
+    
+    #deletes all matches with missing data in any column that is not in missingDataAllowed
+    def removeMissingData(data, missingDataAllowed = []):
+        for column in data.columns:
+            if(column not in missingDataAllowed):
+                data.dropna(subset=[column], inplace=True)
+        data.reset_index(drop=True, inplace=True)
+        return data
+    
+    #reads the relevant information from a file of any data source using the given (parsed) mapping, only mapped columns are read from the file
+    @instrumented('importFile')
+    def readInputFile(file, sources, inputFormat = '%d/%m/%y', targetFormat = '%d/%m/%y'):
+        names = set(name for names in sources.values() for name in names)
+        input = pd.read_csv(file, encoding = "latin", on_bad_lines='error', usecols = lambda column: column in names)
         newData = pd.DataFrame()
         
-        #add newData if it exists in the input and not yet in the newData (i.e. only first apperance in the mapping is considered)
-        for row in range(0,len(mapping)):
-            if(mapping['nameDataSource'][row] in input and mapping['nameInternal'][row] not in newData):
-                newData[mapping['nameInternal'][row]] = input[mapping['nameDataSource'][row]]
+        #add newData if it exists in the input (i.e. only first apperance in the mapping is considered)
+        for nameInternal in sources:
+            for nameDataSource in sources[nameInternal]:
+                if(nameDataSource in input):
+                    newData[nameInternal] = input[nameDataSource]
+                    break
                 
         #convert date to proper time format and save information on season
         newData['date'] = pd.to_datetime(newData['date'], format=inputFormat)
@@ -29,33 +84,125 @@ class DataImporter:
         newData['season']=seasonStart+"/"+seasonEnd
         newData['date'] = newData['date'].dt.strftime(targetFormat)
 
+        return newData
+    
+    #imports relevant information from a file of any data source using the given mapping
+    #New data are added to the existing data. If no data is available, the input for existing data should be an empty dataframe
+    def addInputFile(self, existingData, file, mapping, inputFormat = '%d/%m/%y', targetFormat = '%d/%m/%y'):
+        newData = DataImporter.readInputFile(file, DataImporter.readMapping(mapping), inputFormat, targetFormat)
         return pd.concat([existingData, newData], ignore_index=True, axis=0)
-
-
-    #internal method to add all existing files, for all variables not in missingDataAllowed, missing data leads to deletion of the whole match from the data
-    def inputAllFiles(root, mapping, inputFormat = '%d/%m/%y', missingDataAllowed = []):
-        
-        data = pd.DataFrame()
-        importer = DataImporter()
+    
+    #calculates the key of a file in the import cache from the file (path, size and modification time or hash of the content), the mapping and the date formats
+    def calculateCacheKey(file, mappingHash, inputFormat, targetFormat, hashContent = False):
+        if(hashContent):
+            with open(file, 'rb') as content:
+                fileKey = [hashlib.sha256(content.read()).hexdigest()]
+        else:
+            stat = os.stat(file)
+            fileKey = [os.path.abspath(file), str(stat.st_size), str(stat.st_mtime_ns)]
+        return hashlib.sha256('|'.join(fileKey + [mappingHash, inputFormat, targetFormat]).encode()).hexdigest()
+    
+    #reads a file from the import cache if it was imported before with the same mapping, otherwise the file is read and added to the cache
+    #sources are the parsed mapping (see readMapping) and mappingHash the hash of the mapping file
+    def readCachedInputFile(file, sources, mappingHash, inputFormat = '%d/%m/%y', targetFormat = '%d/%m/%y', hashContent = False, directory = importCacheDirectory):
+        cachedFile = os.path.join(directory, DataImporter.calculateCacheKey(file, mappingHash, inputFormat, targetFormat, hashContent) + '.feather')
+        if(os.path.exists(cachedFile)):
+            print("Loading cached data for: "+file)
+            return pd.read_feather(cachedFile)
         
+        print("Inserting data from: "+file)
+        newData = DataImporter.readInputFile(file, sources, inputFormat, targetFormat)
+        os.makedirs(directory, exist_ok = True)
+        #write to a temporary file first so that an interrupted run does not leave a broken cache
+        temporaryFile = cachedFile + '.tmp'
+        newData.to_feather(temporaryFile)
+        os.replace(temporaryFile, cachedFile)
+        return newData
+    
+    #reads only the dates of a file to obtain the season (as set by readInputFile) without reading all data
+    def readInputSeason(file, sources, inputFormat = '%d/%m/%y'):
+        dates = pd.read_csv(file, encoding = "latin", on_bad_lines='error', usecols = lambda column: column in sources['date'])
+        dates = pd.to_datetime(dates[[name for name in sources['date'] if name in dates][0]], format=inputFormat)
+        return str(dates.iloc[0].year)+"/"+str(dates.iloc[len(dates.index)-1].year)
+    
+    #lists all input files below root in a deterministic order
+    def listInputFiles(root):
+        filenames = []
         for path, subdirs, files in os.walk(root):
             for name in files:
                 filename = os.path.join(path, name)
                 if("._" not in filename):
-                    print("Inserting data from: "+filename)
-                    data = importer.addInputFile(data, filename, mapping, inputFormat)
+                    filenames.append(filename)
+        return sorted(filenames)
+
+
+    #returns a function that reads a single file with the given mapping, either from the import cache (see readCachedInputFile) or directly from the file
+    #if compact is set, columns are converted to the data types of the mapping (see readDtypes)
+    def createFileReader(mapping, inputFormat = '%d/%m/%y', cache = True, hashContent = False, compact = False):
+        dtypes = DataImporter.readDtypes(mapping) if compact else None
+        #the mapping is only parsed once for all files
+        sources = DataImporter.readMapping(mapping)
         
+        if(cache and not importCacheAvailable):
+            logger.warning("pyarrow is not installed, the import cache is disabled and all files are read from the input")
+        if(cache and importCacheAvailable):
+            with open(mapping, 'rb') as content:
+                mappingHash = hashlib.sha256(content.read()).hexdigest()
+            def readFile(filename):
+                return DataImporter.readCachedInputFile(filename, sources, mappingHash, inputFormat, hashContent = hashContent)
+        else:
+            def readFile(filename):
+                print("Inserting data from: "+filename)
+                return DataImporter.readInputFile(filename, sources, inputFormat)
         
-        print("Total dataset of "+str(len(data))+" matches")
+        if(compact):
+            return lambda filename: DataImporter.applyDtypes(readFile(filename), dtypes)
+        return readFile
+    
+    
+    #generator of the data in chunks of one file (by = 'file') or of all files of one season (by = 'season', in chronological order of the seasons)
+    #only one chunk is kept in memory, missing data is removed as in inputAllFiles, by default the data types of the mapping are used
+    #chunks of seasons can be passed to TeamStateStore.addMatches one after another
+    def streamAllFiles(root, mapping, inputFormat = '%d/%m/%y', missingDataAllowed = [], by = 'season', cache = True, hashContent = False, compact = True):
+        readFile = DataImporter.createFileReader(mapping, inputFormat, cache, hashContent, compact)
+        filenames = DataImporter.listInputFiles(root)
         
-        for column in data.columns:
-            if(column not in missingDataAllowed):
-                data.dropna(subset=[column], inplace=True)
-        data.reset_index(drop=True, inplace=True)
+        if(by == 'file'):
+            groups = [[filename] for filename in filenames]
+        elif(by == 'season'):
+            sources = DataImporter.readMapping(mapping)
+            seasons = {}
+            for filename in filenames:
+                seasons.setdefault(DataImporter.readInputSeason(filename, sources, inputFormat), []).append(filename)
+            groups = [seasons[season] for season in sorted(seasons)]
+        else:
+            raise ValueError("Unknown chunk type "+str(by)+", expected 'file' or 'season'")
+        
+        for group in groups:
+            data = DataImporter.concatenateData([readFile(filename) for filename in group])
+            yield DataImporter.removeMissingData(data, missingDataAllowed)
+    
+    
+    #internal method to add all existing files, for all variables not in missingDataAllowed, missing data leads to deletion of the whole match from the data
+    #files are read in parallel by the given number of worker threads (default is the number of cores) and concatenated once in the order of listInputFiles
+    #if cache is set and pyarrow is installed, unchanged files are loaded from the import cache (see calculateCacheKey, hashContent uses the content instead of path and modification time)
+    #if compact is set, the data types of the mapping are used (e.g. categories for teams and float32 for odds, see readDtypes) to reduce the memory of the data
+    #no file is written, the pipeline exports the imported data to data/data.csv
+    @instrumented('import')
+    def inputAllFiles(root, mapping, inputFormat = '%d/%m/%y', missingDataAllowed = [], workers = None, cache = True, hashContent = False, compact = False):
+        
+        filenames = DataImporter.listInputFiles(root)
+        readFile = DataImporter.createFileReader(mapping, inputFormat, cache, hashContent, compact)
+        
+        with ThreadPoolExecutor(max_workers = os.cpu_count() if workers is None else workers) as executor:
+            frames = list(executor.map(readFile, filenames))
+        data = DataImporter.concatenateData(frames)
         
         print("Total dataset of "+str(len(data))+" matches")
         
-        data.to_csv(os.path.join(os.path.dirname(__file__), "../data\data.csv"))
+        DataImporter.removeMissingData(data, missingDataAllowed)
+        
+        print("Total dataset of "+str(len(data))+" matches")
         
         return data
     
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Lightweight instrumentation of the main calculations (wall time, CPU time, rows, rows per second and peak memory per call) with pluggable sinks
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+import functools
+import tracemalloc
+import pandas as pd
+
+
+#active sinks, instrumentation is disabled (and instrumented functions are called directly) as long as there are no sinks
+sinks = []
+
+#peak memory is only measured if enabled with traceMemory, as tracing slows down all allocations
+memorySettings = {'traceMemory': False, 'startedTracing': False}
+
+#stack of the calls currently measured on the main thread (to combine the peak memory of nested calls)
+memoryFrames = []
+
+
+#collects all measurements in memory, e.g. to analyse them as dataframe
+class MemoryCollector:
+
+    def __init__(self):
+        self.measurements = []
+
+    def record(self, measurement):
+        self.measurements.append(measurement)
+
+    def toDataFrame(self):
+        return pd.DataFrame(self.measurements)
+
+
+#appends every measurement as one line of json to a file
+class JsonFileSink:
+
+    def __init__(self, file):
+        self.file = file
+        self.lock = threading.Lock()
+
+    def record(self, measurement):
+        if(os.path.dirname(self.file) != ''):
+            os.makedirs(os.path.dirname(self.file), exist_ok = True)
+        with self.lock, open(self.file, 'a') as output:
+            output.write(json.dumps(measurement, default = str) + '\n')
+
+
+#writes every measurement to a logger, the measurement is attached to the log record as attribute measurement for structured handlers
+class LoggingSink:
+
+    def __init__(self, logger = None, level = logging.INFO):
+        self.logger = logging.getLogger('bettingCalculationTools') if logger is None else logger
+        self.level = level
+
+    def record(self, measurement):
+        self.logger.log(self.level, "%s (%s): %.3f s wall, %.3f s CPU, %s rows", measurement['stage'], measurement['function'],
+                        measurement['wallSeconds'], measurement['cpuSeconds'], measurement['rows'], extra = {'measurement': measurement})
+
+
+
+#enables the instrumentation with the given sinks (e.g. enableInstrumentation(MemoryCollector()) or enableInstrumentation(JsonFileSink('data/profile.jsonl')))
+#if traceMemory is set, the peak memory allocated during each call is measured with tracemalloc
+def enableInstrumentation(*newSinks, traceMemory = False):
+    sinks.extend(newSinks)
+    memorySettings['traceMemory'] = memorySettings['traceMemory'] or traceMemory
+    if(traceMemory and not tracemalloc.is_tracing()):
+        tracemalloc.start()
+        memorySettings['startedTracing'] = True
+
+#disables the instrumentation and removes all sinks
+def disableInstrumentation():
+    sinks.clear()
+    memorySettings['traceMemory'] = False
+    if(memorySettings['startedTracing']):
+        tracemalloc.stop()
+        memorySettings['startedTracing'] = False
+
+
+#enables the instrumentation for a block of code, e.g. with InstrumentationContext(collector): ...
+class InstrumentationContext:
+
+    def __init__(self, *newSinks, traceMemory = False):
+        self.newSinks = newSinks
+        self.traceMemory = traceMemory
+
+    def __enter__(self):
+        enableInstrumentation(*self.newSinks, traceMemory = self.traceMemory)
+        return self.newSinks[0] if len(self.newSinks) == 1 else self.newSinks
+
+    def __exit__(self, *exception):
+        disableInstrumentation()
+
+
+
+#decorator of the instrumented functions and methods, stage is the name of the step of the analysis (e.g. probabilities)
+#rows are the rows of the returned dataframe, otherwise the rows of the first dataframe given as argument
+def instrumented(stage):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if(not sinks):
+                return function(*args, **kwargs)
+            return measureCall(stage, function, args, kwargs)
+        return wrapper
+    return decorator
+
+
+#calls the function and passes the measurement to all sinks
+def measureCall(stage, function, args, kwargs):
+    traceMemory = memorySettings['traceMemory'] and tracemalloc.is_tracing() and threading.current_thread() is threading.main_thread()
+    if(traceMemory):
+        startMemory = startMemoryFrame()
+    startWall = time.perf_counter()
+    startCpu = time.process_time()
+
+    try:
+        result = function(*args, **kwargs)
+    finally:
+        wallSeconds = time.perf_counter() - startWall
+        cpuSeconds = time.process_time() - startCpu
+        peakMemory = (stopMemoryFrame() - startMemory) / 2**20 if traceMemory else None
+
+    rows = None
+    if(isinstance(result, pd.DataFrame)):
+        rows = len(result.index)
+    else:
+        rows = next((len(argument.index) for argument in list(args) + list(kwargs.values()) if isinstance(argument, pd.DataFrame)), None)
+    calculatorType = getattr(args[0], 'type', None) if len(args) > 0 else None
+    measurement = {'stage': stage,
+                   'function': function.__qualname__,
+                   'type': calculatorType if isinstance(calculatorType, str) else None,
+                   'wallSeconds': wallSeconds,
+                   'cpuSeconds': cpuSeconds,
+                   'rows': rows,
+                   'rowsPerSecond': rows / wallSeconds if rows is not None and wallSeconds > 0 else None,
+                   'peakMemoryMB': peakMemory,
+                   'thread': threading.current_thread().name,
+                   'time': time.strftime('%Y-%m-%d %H:%M:%S')}
+    for sink in sinks:
+        sink.record(measurement)
+    return result
+
+
+#the peak of tracemalloc is reset for every call, the peaks of nested calls are passed on to the calling frame
+def startMemoryFrame():
+    current, peak = tracemalloc.get_traced_memory()
+    if(len(memoryFrames) > 0):
+        memoryFrames[-1]['peak'] = max(memoryFrames[-1]['peak'], peak)
+    tracemalloc.reset_peak()
+    memoryFrames.append({'peak': current})
+    return current
+
+#returns the peak memory since the start of the frame
+def stopMemoryFrame():
+    peak = max(memoryFrames.pop()['peak'], tracemalloc.get_traced_memory()[1])
+    if(len(memoryFrames) > 0):
+        memoryFrames[-1]['peak'] = max(memoryFrames[-1]['peak'], peak)
+    return peak
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Probabilities of derived betting markets (results, over/under, Asian handicap, both teams to score, correct score, double chance) from score matrices
+"""
+
+import numpy as np
+import pandas as pd
+
+
+#calculates the probabilities of any set of markets for batches of score matrices (e.g. of the models of ProbabilityModelling) in one tensor contraction
+#markets are given as tuples of the kind of the market and its parameter:
+#('home',), ('draw',), ('away',), ('homeOrDraw',), ('homeOrAway',), ('drawOrAway',), ('bothScore',), ('notBothScore',), ('score', (goalsHome, goalsAway)),
+#('over', line), ('under', line), ('asianHandicapHome', line), ('asianHandicapAway', line) with lines in steps of 0.25
+#every market has a weight of the stake that wins and a weight of the stake that is refunded for each score (e.g. pushes of whole lines or the half stakes of quarter lines)
+#the probability of a market is the implied probability of its fair odds, i.e. winning weight / (1 - refunded weight), which is the usual probability for markets without refunds
+class MarketAggregator:
+
+    def __init__(self, markets, maxGoals = 10):
+        self.markets = [tuple(market) for market in markets]
+        self.maxGoals = maxGoals
+        self.columns = [MarketAggregator.createColumnName(market) for market in self.markets]
+        #weights with shape markets x (winning, refunded) x home goals x away goals
+        self.weights = np.stack([self.calculateWeights(market) for market in self.markets])
+        self.flatWeights = self.weights.reshape(len(self.markets) * 2, maxGoals * maxGoals).T
+        self.hasRefunds = self.weights[:,1].any(axis=(1,2))
+
+
+    #markets of a whole market board, by default all results, double chances, both teams to score, over/under 0.5 to 5.5,
+    #Asian handicaps from -2.5 to 2.5 (including quarter lines) for both teams and all correct scores up to 5 goals per team
+    def createBoard(overUnderLines = [0.5, 1.5, 2.5, 3.5, 4.5, 5.5], handicapLines = list(np.arange(-2.5, 2.75, 0.25)), maxScore = 5, results = True, doubleChance = True, bothTeamsScore = True):
+        markets = []
+        if(results):
+            markets += [('home',), ('draw',), ('away',)]
+        if(doubleChance):
+            markets += [('homeOrDraw',), ('homeOrAway',), ('drawOrAway',)]
+        if(bothTeamsScore):
+            markets += [('bothScore',), ('notBothScore',)]
+        for line in overUnderLines:
+            markets += [('over', float(line)), ('under', float(line))]
+        for line in handicapLines:
+            markets += [('asianHandicapHome', float(line)), ('asianHandicapAway', float(line))]
+        for goalsHome in range(maxScore + 1):
+            for goalsAway in range(maxScore + 1):
+                markets.append(('score', (goalsHome, goalsAway)))
+        return markets
+
+
+    #column of the probabilities of a market, the results and over/under 2.5 use the columns of ProbabilityCalculation (probHome, ..., probOver25, probUnder25)
+    #lines are written without the decimal point, e.g. probOver25, probUnder325 or probAsianHandicapHome-025
+    def createColumnName(market):
+        kind = market[0]
+        if(kind in ['over', 'under']):
+            return 'prob' + kind.capitalize() + ('%g' % market[1]).replace('.', '')
+        if(kind in ['asianHandicapHome', 'asianHandicapAway']):
+            return 'prob' + kind[0].upper() + kind[1:] + ('%+g' % market[1]).replace('.', '')
+        if(kind == 'score'):
+            return 'probScore' + str(market[1][0]) + '-' + str(market[1][1])
+        return 'prob' + kind[0].upper() + kind[1:]
+
+
+    #weights of the winning and the refunded stake of a market for all scores
+    def calculateWeights(self, market):
+        goalsHome, goalsAway = np.indices((self.maxGoals, self.maxGoals))
+        kind = market[0]
+        weights = np.zeros((2, self.maxGoals, self.maxGoals))
+        if(kind in ['over', 'under', 'asianHandicapHome', 'asianHandicapAway']):
+            margins = {'over': goalsHome + goalsAway - market[1],
+                       'under': market[1] - goalsHome - goalsAway,
+                       'asianHandicapHome': goalsHome - goalsAway + market[1],
+                       'asianHandicapAway': goalsAway - goalsHome + market[1]}[kind]
+            return self.calculateLineWeights(margins, market[1])
+        outcomes = {'home': goalsHome > goalsAway,
+                    'draw': goalsHome == goalsAway,
+                    'away': goalsHome < goalsAway,
+                    'homeOrDraw': goalsHome >= goalsAway,
+                    'homeOrAway': goalsHome != goalsAway,
+                    'drawOrAway': goalsHome <= goalsAway,
+                    'bothScore': (goalsHome > 0) & (goalsAway > 0),
+                    'notBothScore': (goalsHome == 0) | (goalsAway == 0)}
+        if(kind == 'score'):
+            if(max(market[1]) >= self.maxGoals):
+                raise ValueError("Score "+str(market[1])+" is not covered by score matrices of "+str(self.maxGoals)+" goals per team")
+            weights[0][market[1]] = 1
+        elif(kind in outcomes):
+            weights[0] = outcomes[kind]
+        else:
+            raise ValueError("Unknown market "+str(market))
+        return weights
+
+    #bets on lines win for positive and are refunded for zero margins, quarter lines split the stake on the two neighbouring lines
+    def calculateLineWeights(self, margins, line):
+        if((line * 4) % 1 != 0):
+            raise ValueError("Lines have to be multiples of 0.25, but got "+str(line))
+        weights = np.zeros((2,) + margins.shape)
+        shifts = [-0.25, 0.25] if (line * 4) % 2 == 1 else [0.0]
+        for shift in shifts:
+            weights[0] += (margins + shift > 0) / len(shifts)
+            weights[1] += (margins + shift == 0) / len(shifts)
+        return weights
+
+
+    #expects score matrices in the last two dimensions and returns the probabilities of all markets in the last dimension
+    #the score matrices are normalised by their total probability as in ProbabilityModel.summariseProbabilities
+    def calculateMarketProbabilities(self, probabilities):
+        probabilities = np.asarray(probabilities, dtype=float)
+        if(probabilities.shape[-2:] != (self.maxGoals, self.maxGoals)):
+            raise ValueError("Expected score matrices of "+str(self.maxGoals)+" goals per team, but got the shape "+str(probabilities.shape))
+        #one contraction for the winning and refunded weights of all markets
+        sums = (probabilities.reshape(probabilities.shape[:-2] + (-1,)) @ self.flatWeights).reshape(probabilities.shape[:-2] + (len(self.markets), 2))
+        total = probabilities.sum(axis=(-2,-1))[...,None]
+        winning = sums[...,0] / total
+        refunded = sums[...,1] / total
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            return np.where(self.hasRefunds, winning / (1 - refunded), winning)
+
+
+    #returns the probabilities of all markets and their jacobian with respect to the parameters of the score matrices (e.g. anticipated goals home and away)
+    #derivatives are the derivatives of the score matrices with the parameters in the third last dimension (see ProbabilityModel.calculateProbabilityDerivatives)
+    #the jacobian has the markets in the second last and the parameters in the last dimension
+    def calculateMarketJacobian(self, probabilities, derivatives):
+        probabilities = np.asarray(probabilities, dtype=float)
+        derivatives = np.asarray(derivatives, dtype=float)
+        shape = probabilities.shape[:-2]
+        sums = (probabilities.reshape(shape + (-1,)) @ self.flatWeights).reshape(shape + (len(self.markets), 2))
+        derivativesSums = (derivatives.reshape(derivatives.shape[:-2] + (-1,)) @ self.flatWeights).reshape(derivatives.shape[:-2] + (len(self.markets), 2))
+        total = probabilities.sum(axis=(-2,-1))[...,None,None]
+        derivativesTotal = derivatives.sum(axis=(-2,-1))[...,None,None]
+        #quotient rule for the normalisation by the total probability covered by the score matrix
+        values = sums / total
+        derivativesValues = (derivativesSums - values[...,None,:,:] * derivativesTotal) / total[...,None,:,:]
+        winning, refunded = values[...,0], values[...,1]
+        derivativesWinning, derivativesRefunded = derivativesValues[...,0], derivativesValues[...,1]
+        #quotient rule for the markets with refunds
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            marketProbabilities = np.where(self.hasRefunds, winning / (1 - refunded), winning)
+            jacobian = np.where(self.hasRefunds, derivativesWinning / (1 - refunded[...,None,:]) + (winning / (1 - refunded)**2)[...,None,:] * derivativesRefunded, derivativesWinning)
+        return marketProbabilities, np.swapaxes(jacobian, -1, -2)
+
+
+    #writes the probabilities of markets with a line that changes from match to match (e.g. the Asian handicap line of football-data in column AHh)
+    #to the columns of the fixed lines (see createColumnName), all other lines of a match are missing
+    #columns maps the probability columns of the data to the kinds of the markets, e.g. {'probAHHome': 'asianHandicapHome', 'probAHAway': 'asianHandicapAway'}
+    #handicap lines refer to the home team (as AHh), the away team has the opposite line
+    def spreadLines(data, lineColumn, columns):
+        spread = {}
+        for line in np.unique(data[lineColumn].dropna()):
+            matches = data[lineColumn] == line
+            for column, kind in columns.items():
+                spread[MarketAggregator.createColumnName((kind, -float(line) if kind == 'asianHandicapAway' else float(line)))] = data[column].where(matches)
+        return pd.DataFrame(spread, index = data.index)
+
+
+    #prices all markets for every match from the anticipated goals of the given model (e.g. PoissonModel or DixonColesModel)
+    #returns a dataframe with one column per market and the index of the data
+    def priceMatches(self, data, model, columns = ['anticipatedGoalsHome', 'anticipatedGoalsAway']):
+        if(model.maxGoals != self.maxGoals):
+            raise ValueError("The model covers "+str(model.maxGoals)+" goals per team, but the markets "+str(self.maxGoals))
+        probabilities = self.calculateMarketProbabilities(model.calculateProbabilities(data[columns[0]].to_numpy(dtype=float), data[columns[1]].to_numpy(dtype=float)))
+        return pd.DataFrame(probabilities, columns = self.columns, index = data.index)
@@ -3,6 +3,14 @@
 @author: FW
 """
 
+import numpy as np
+import pandas as pd
+import logging
+
+
+#the number of scored matches is logged on the debug level (e.g. logging.basicConfig(level = logging.DEBUG) to show it)
+logger = logging.getLogger(__name__)
+
 #this class provides several methods to calculate accuracy metrics like rank probability score or squared errors
 class MetricsCalculation():
     
@@ -14,7 +22,7 @@ class MetricsCalculation():
     
     #expects a dataframe and calculates RPS for home draw away bets
     def calculateRPSAvgOU(data):
-        print("RPS OU calculated for "+str(len(data))+" matches")
+        logger.debug("RPS OU calculated for %d matches", len(data))
         return MetricsCalculation.calculateRPSOU(data).mean()
     
     #expects a dataframe and calculates RPS for home draw away bets
@@ -26,26 +34,135 @@ class MetricsCalculation():
     
     #expects a dataframe and calculates RPS for home draw away bets
     def calculateRPSAvgHDA(data):
-        print("RPS HDA calculated for "+str(len(data))+" matches")
+        logger.debug("RPS HDA calculated for %d matches", len(data))
         return MetricsCalculation.calculateRPSHDA(data).mean()
     
     #expects a dataframe and calculates squared error between anticipated and actual number of goals
     def calculateSquaredErrorAnticipatedGoals(data):
         squaredHome = (data['anticipatedGoalsHome']-data['goalsHome'])**2
         squaredAway = (data['anticipatedGoalsAway']-data['goalsAway'])**2
-        print("Squared error home and away calculated for "+str(len(data))+" matches")
+        logger.debug("Squared error home and away calculated for %d matches", len(data))
         return squaredHome.mean(), squaredAway.mean()
     
     #same as above, but goal prediction is the average goal difference per team plus the average goal difference across all teams (i.e. information on each teams average goals and the match location)
     def calculateSquaredErrorAverageGoals(data):
         squaredHome = (data['anticipatedGoalsHomeAverage']-data['goalsHome'])**2
         squaredAway = (data['anticipatedGoalsAwayAverage']-data['goalsAway'])**2
-        print("Squared error home and away calculated for "+str(len(data))+" matches")
+        logger.debug("Squared error home and away calculated for %d matches", len(data))
         return squaredHome.mean(), squaredAway.mean()
     
     #same as above, but goal prediction is the average number of home and away teams across all teams (i.e. just information on the match location)
     def calculateSquaredErrorAverageHA(data):
         squaredHome = (data['avgGoalsHomeAllTeams']-data['goalsHome'])**2
         squaredAway = (data['avgGoalsAwayAllTeams']-data['goalsAway'])**2
-        print("Squared error home and away calculated for "+str(len(data))+" matches")
-        return squaredHome.mean(), squaredAway.mean()
\ No newline at end of file
+        logger.debug("Squared error home and away calculated for %d matches", len(data))
+        return squaredHome.mean(), squaredAway.mean()
+    
+    
+    #expects a dataframe and returns indicators of all outcomes (home, draw, away, over 2.5, under 2.5) as one row per match, matches without goals are missing
+    def calculateOutcomeIndicators(data):
+        goalsHome = data['goalsHome'].to_numpy(dtype = float)
+        goalsAway = data['goalsAway'].to_numpy(dtype = float)
+        indicators = np.column_stack([goalsHome > goalsAway, goalsHome == goalsAway, goalsHome < goalsAway,
+                                      goalsHome + goalsAway > 2, goalsHome + goalsAway <= 2]).astype(float)
+        indicators[np.isnan(goalsHome) | np.isnan(goalsAway)] = np.nan
+        return indicators
+    
+    #calculates the scores of several models for each match and returns them with one column per model and metric
+    #probabilityModels maps names of models to their columns of the probabilities of home, draw, away, over 2.5 and under 2.5 (e.g. probHome, probDraw, probAway, probOver25, probUnder25)
+    #goalModels maps names of models to their columns of anticipated home and away goals
+    #metrics are RPS (as above), Brier score and log-loss for HDA and O/U bets and squared errors of home and away goals
+    def calculateMatchScores(data, probabilityModels = {}, goalModels = {}):
+        indicators = MetricsCalculation.calculateOutcomeIndicators(data)
+        scores = {}
+        
+        if(len(probabilityModels) > 0):
+            #probabilities of all models with shape models x matches x outcomes
+            probabilities = np.stack([data[columns].to_numpy(dtype = float) for columns in probabilityModels.values()])
+            errors = probabilities - indicators
+            cumulativeErrors = np.cumsum(errors[:,:,:2], axis = 2)
+            observed = np.where(indicators == 1, probabilities, np.nan)
+            logLosses = -np.log(np.clip(observed, 1e-15, 1))
+            metrics = {'rpsHDA': 0.5*np.sum(cumulativeErrors**2, axis = 2),
+                       'rpsOU': errors[:,:,3]**2,
+                       'brierHDA': np.sum(errors[:,:,:3]**2, axis = 2),
+                       'brierOU': np.sum(errors[:,:,3:]**2, axis = 2),
+                       'logLossHDA': np.nanmax(logLosses[:,:,:3], axis = 2, initial = -np.inf),
+                       'logLossOU': np.nanmax(logLosses[:,:,3:], axis = 2, initial = -np.inf)}
+            for metric in metrics:
+                #matches without observed outcome are missing
+                metrics[metric][metrics[metric] == -np.inf] = np.nan
+            for index, model in enumerate(probabilityModels):
+                for metric in metrics:
+                    scores[(model, metric)] = metrics[metric][index]
+        
+        if(len(goalModels) > 0):
+            goals = data[['goalsHome', 'goalsAway']].to_numpy(dtype = float)
+            anticipatedGoals = np.stack([data[columns].to_numpy(dtype = float) for columns in goalModels.values()])
+            squaredErrors = (anticipatedGoals - goals)**2
+            for model, values in zip(goalModels, squaredErrors):
+                scores[(model, 'squaredErrorHome')] = values[:,0]
+                scores[(model, 'squaredErrorAway')] = values[:,1]
+        
+        scores = pd.DataFrame(scores, index = data.index)
+        scores.columns = pd.MultiIndex.from_tuples(scores.columns, names = ['model', 'metric'])
+        return scores
+    
+    #scores several models at once and returns a tidy dataframe with the average score and the number of matches per model, metric (and group)
+    #models are given as in calculateMatchScores, groups are optional columns (e.g. season, round or league)
+    def scoreModels(data, probabilityModels = {}, goalModels = {}, groups = []):
+        scores = MetricsCalculation.calculateMatchScores(data, probabilityModels, goalModels)
+        if(len(groups) > 0):
+            grouped = scores.groupby([data[group] for group in groups], observed = True)
+            results = pd.concat({'value': grouped.mean().stack(['model', 'metric'], future_stack = True),
+                                 'matches': grouped.count().stack(['model', 'metric'], future_stack = True)}, axis = 1)
+        else:
+            results = pd.concat({'value': scores.mean(), 'matches': scores.count()}, axis = 1)
+        logger.debug("Scores of %d models calculated for %d matches", len(probabilityModels) + len(goalModels), len(data))
+        return results.reset_index()
+    
+    #returns the favourite of each match for all predictors as one matrix with one column per predictor (1 home team, 2 away team, 0 no favourite)
+    #predictors maps names to columns or functions of the data giving the strength of the home team relative to the away team (e.g. difference of ratings)
+    def calculateFavourites(data, predictors):
+        favourites = np.zeros((len(data.index), len(predictors)), dtype = np.int8)
+        for index, predictor in enumerate(predictors.values()):
+            difference = np.asarray(predictor(data) if callable(predictor) else data[predictor], dtype = float)
+            favourites[difference > 0, index] = 1
+            favourites[difference < 0, index] = 2
+        return favourites
+    
+    #calculates how often the favourite of each predictor (see calculateFavourites) won a match for all groupings at once
+    #groupings are lists of columns (an empty list for all matches), draws and matches without favourite are excluded
+    #returns a tidy dataframe with the number of wins of the favourite (hits), matches, rate and confidence interval (see statsmodels proportion_confint) per grouping, group and predictor
+    def calculateWinnerAccuracy(data, predictors, groupings = [[]], method = 'binom_test', alpha = 0.05):
+        from statsmodels.stats.proportion import proportion_confint
+        goalsHome = data['goalsHome'].to_numpy(dtype = float)
+        goalsAway = data['goalsAway'].to_numpy(dtype = float)
+        winner = np.where(goalsHome > goalsAway, 1, np.where(goalsHome < goalsAway, 2, 0))
+        favourites = MetricsCalculation.calculateFavourites(data, predictors)
+        hits = ((favourites == winner[:, None]) & (winner[:, None] != 0)).astype(float)
+        counts = ((favourites != 0) & (winner[:, None] != 0)).astype(float)
+        
+        results = []
+        for grouping in groupings:
+            if(len(grouping) > 0):
+                groupIds, groups = pd.MultiIndex.from_frame(data[grouping]).factorize(sort = True)
+            else:
+                groupIds, groups = np.zeros(len(data.index), dtype = int), None
+            numberGroups = groupIds.max() + 1 if len(groupIds) > 0 else 0
+            #sums of hits and matches of all predictors and groups in one aggregation each (index of group and predictor)
+            cells = (groupIds[:, None] * len(predictors) + np.arange(len(predictors))).ravel()
+            result = pd.DataFrame({'hits': np.bincount(cells, weights = hits.ravel(), minlength = numberGroups * len(predictors)),
+                                   'matches': np.bincount(cells, weights = counts.ravel(), minlength = numberGroups * len(predictors))})
+            result.insert(0, 'predictor', np.tile(list(predictors), numberGroups))
+            for position, column in enumerate(grouping):
+                result.insert(position, column, np.repeat(groups.get_level_values(position), len(predictors)))
+            result.insert(0, 'grouping', 'overall' if len(grouping) == 0 else '/'.join(grouping))
+            results.append(result[result['matches'] > 0])
+        
+        results = pd.concat(results, ignore_index = True)
+        results['hits'] = results['hits'].astype(int)
+        results['matches'] = results['matches'].astype(int)
+        results['rate'] = results['hits'] / results['matches']
+        results['lower'], results['upper'] = proportion_confint(results['hits'].to_numpy(), results['matches'].to_numpy(), alpha = alpha, method = method)
+        return results
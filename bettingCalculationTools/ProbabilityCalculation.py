@@ -5,12 +5,11 @@
 #In this class, several options are provided to obtain outcome probabilities from betting odds
 """
 
+import numpy as np
 import pandas as pd
 from abc import ABC
-import shin
-from statsmodels.miscmodels.ordinal_model import OrderedModel
-import statsmodels.api as sm
-import math as m
+from bettingCalculationTools.CrossFitting import CrossFitting
+from bettingCalculationTools.Instrumentation import instrumented
 
 #defining the interface of objects that calculate outcome probabilities from betting odds.
 class ProbabilityCalculator(ABC):
@@ -23,6 +22,7 @@ class ProbabilityCalculator(ABC):
         pass
     
     #expects a dataframe with data and adds probabilities 
+    @instrumented('probabilities')
     def addProbabilities(self, dataInput):
         data = dataInput.copy()
         #data.reset_index()
@@ -37,6 +37,18 @@ class ProbabilityCalculator(ABC):
 
         return data
     
+    #adds the probabilities of further markets (e.g. other over/under lines, Asian handicaps or both teams to score) from the odds of their complete books
+    #books are pairs of the odds columns and the probability columns of a book, e.g. [(['oddsOver15', 'oddsUnder15'], ['probOver15', 'probUnder15'])]
+    #the probability columns should be named as in MarketAggregator.createColumnName to be used by InvertedPoisson, matches with missing odds obtain missing probabilities
+    #only for calculators that convert the odds of each match (e.g. BasicNormalisation or ShinModel)
+    def addMarketProbabilities(self, dataInput, books):
+        data = dataInput.copy()
+        for oddsColumns, probabilityColumns in books:
+            probabilities = self.calculateProbabilities(*[data[column] for column in oddsColumns])
+            for number, column in enumerate(probabilityColumns):
+                data[column] = probabilities[number]
+        return data
+    
 
 #uses basic normalisation to convert odds into probabilities 
 #(see Štrumbelj, E. (2014). On determining probability forecasts from betting odds. International journal of forecasting, 30(4), 934-943.)
@@ -64,30 +76,65 @@ class BasicNormalisation(ProbabilityCalculator):
 #Also see Štrumbelj, E. (2014). On determining probability forecasts from betting odds. International journal of forecasting, 30(4), 934-943.
 class ShinModel(ProbabilityCalculator):
     
-    def __init__(self):
-        super().__init__('basicNormalisation')
+    #convergenceThreshold and maxIterations control the fixed-point iteration for the insider-trading parameter z
+    def __init__(self, convergenceThreshold = 1e-12, maxIterations = 1000):
+        super().__init__('shinModel')
+        self.convergenceThreshold = convergenceThreshold
+        self.maxIterations = maxIterations
     
+    #expects one array-like of odds per outcome and solves Shin's model for all matches at once
+    #returns a dataframe with one column per outcome (in the order of the given odds)
     def calculateProbabilities(self, *outcomes):
-        results = pd.DataFrame()
-        for row in range(0,len(outcomes[0])):
-            list = []
-            for outcome in outcomes:
-                outcome = outcome.tolist()
-                list.append(outcome[row])
-            results = pd.concat([results, pd.DataFrame([shin.calculate_implied_probabilities(list, full_output=False)])], ignore_index=True, axis=0)
+        odds = np.column_stack([np.asarray(outcome, dtype=float) for outcome in outcomes])
+        inverseOdds = 1/odds
+        sumInverseOdds = inverseOdds.sum(axis=1)
+        
+        z = self.solveInsiderTrading(inverseOdds, sumInverseOdds)
+        
+        #probabilities are written into a preallocated array
+        probabilities = np.empty(odds.shape)
+        np.multiply(4*(1-z)[:,None], inverseOdds**2/sumInverseOdds[:,None], out=probabilities)
+        probabilities += (z**2)[:,None]
+        np.sqrt(probabilities, out=probabilities)
+        probabilities -= z[:,None]
+        probabilities /= (2*(1-z))[:,None]
+        
+        index = outcomes[0].index if isinstance(outcomes[0], pd.Series) else None
+        return pd.DataFrame(probabilities, index=index)
     
-            if(row % 10000 == 0):
-                print("Calculating Shin probabilities for row "+str(row)+ " of "+str(len(outcomes[0])))
-        return results
+    #solves for the insider-trading parameter z of all matches simultaneously
+    #two outcomes have a closed-form solution, otherwise the fixed-point iteration of Jullien & Salanié (1994) is used
+    #matches are frozen once their change in z falls below the convergence threshold
+    def solveInsiderTrading(self, inverseOdds, sumInverseOdds):
+        n = inverseOdds.shape[1]
+        if(n == 2):
+            diffInverseOdds = inverseOdds[:,0] - inverseOdds[:,1]
+            return ((sumInverseOdds - 1) * (diffInverseOdds**2 - sumInverseOdds)) / (sumInverseOdds * (diffInverseOdds**2 - 1))
+        
+        scaledInverseOdds = 4*inverseOdds**2/sumInverseOdds[:,None]
+        z = np.zeros(len(inverseOdds))
+        active = np.arange(len(inverseOdds))
+        iterations = 0
+        while(len(active) > 0 and iterations < self.maxIterations):
+            zActive = z[active]
+            zNew = (np.sqrt(zActive[:,None]**2 + (1-zActive)[:,None]*scaledInverseOdds[active]).sum(axis=1) - 2) / (n - 2)
+            z[active] = zNew
+            #rows with a NaN delta (missing odds) are dropped as well
+            active = active[np.abs(zNew - zActive) > self.convergenceThreshold]
+            iterations += 1
+        return z
     
     
 #uses a logistic regression or an ordered logistic regression in case of three outcomes
 #See Hvattum, L. M., & Arntzen, H. (2010). Using ELO ratings for match result prediction in association football. International Journal of forecasting, 26(3), 460-470.
+#probabilities are obtained out-of-sample by cross-fitting (by default on both halves of the data, see CrossFitting for further schemes)
 class LogisticRegression(ProbabilityCalculator):   
-    def __init__(self):
+    def __init__(self, crossFitting = None):
         super().__init__('logisticRegression')
+        self.crossFitting = CrossFitting() if crossFitting is None else crossFitting
         
         
+    @instrumented('probabilities')
     def addProbabilities(self, dataInput):
         data = dataInput.copy()
         
@@ -98,37 +145,27 @@ class LogisticRegression(ProbabilityCalculator):
         data.insert(len(data.columns),'over25',0)
         data.loc[data['goalsHome'] + data['goalsAway'] > 2, 'over25'] = 1
         
-        #split dataset by half
-        data1 = data.iloc[:m.floor(len(data)/2),:]
-        data2 = data.iloc[m.floor(len(data)/2):,:]
-
-        
-        #calculate models
-        orderedModel1 = OrderedModel(data2['winner'], data2[['oddsHome', 'oddsDraw', 'oddsAway']])
-        regression1 = orderedModel1.fit(method='bfgs')
-        probabilitiesHDA1 = regression1.predict(data1[['oddsHome', 'oddsDraw', 'oddsAway']])
-        
-        orderedModel2 = OrderedModel(data1['winner'], data1[['oddsHome', 'oddsDraw', 'oddsAway']])
-        regression2 = orderedModel2.fit(method='bfgs')
-        probabilitiesHDA2 = regression2.predict(data2[['oddsHome', 'oddsDraw', 'oddsAway']])
-        
-        probabilitiesHDA = pd.concat([probabilitiesHDA1, probabilitiesHDA2])
-
-        logModel1 = sm.Logit(data2['over25'], data2[['oddsOver25', 'oddsUnder25']])
-        regressionOU1 = logModel1.fit()
-        probabilitiesOU1 = regressionOU1.predict(data1[['oddsOver25', 'oddsUnder25']])
-        
-        logModel2 = sm.Logit(data1['over25'], data1[['oddsOver25', 'oddsUnder25']])
-        regressionOU2 = logModel2.fit()
-        probabilitiesOU2 = regressionOU2.predict(data2[['oddsOver25', 'oddsUnder25']])
-                                                  
-        probabilitiesOU = pd.concat([probabilitiesOU1, probabilitiesOU2])
+        #calculate models for all folds
+        probabilitiesHDA = self.crossFitting.fitPredict(data, fitOrderedModelFold, data[['oddsHome', 'oddsDraw', 'oddsAway']], data['winner'])
+        probabilitiesOU = self.crossFitting.fitPredict(data, fitLogitFold, data[['oddsOver25', 'oddsUnder25']], data['over25'])[:,0]
         
-        data['probHome']=probabilitiesHDA[2]
-        data['probDraw']=probabilitiesHDA[1]
-        data['probAway']=probabilitiesHDA[0]
+        data['probHome']=probabilitiesHDA[:,2]
+        data['probDraw']=probabilitiesHDA[:,1]
+        data['probAway']=probabilitiesHDA[:,0]
         data['probOver25']=probabilitiesOU
         data['probUnder25']=1-probabilitiesOU
         
         return data
 
+
+#fits an ordered logistic regression on one fold (see CrossFitting.fitPredict), returns the probabilities of all outcomes and the parameters
+def fitOrderedModelFold(featuresTrain, targetsTrain, featuresTest, startParameters):
+    from statsmodels.miscmodels.ordinal_model import OrderedModel
+    regression = OrderedModel(targetsTrain, featuresTrain).fit(method='bfgs', start_params = startParameters)
+    return regression.predict(featuresTest), regression.params
+
+#fits a logistic regression on one fold (see CrossFitting.fitPredict), returns the probabilities and the parameters
+def fitLogitFold(featuresTrain, targetsTrain, featuresTest, startParameters):
+    import statsmodels.api as sm
+    regression = sm.Logit(targetsTrain, featuresTrain).fit(start_params = startParameters)
+    return regression.predict(featuresTest), regression.params
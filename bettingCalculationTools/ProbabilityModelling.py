@@ -7,58 +7,196 @@ Moreover, a numerical solution to invert such a model and obtain anticipated goa
 """
 
 import os
+import inspect
+import hashlib
+import functools
 import numpy as np
 import pandas as pd
 from abc import ABC
-from scipy.stats import poisson
+from bettingCalculationTools.Markets import MarketAggregator
 
 
+#default directory for cached tables of the models
+tableDirectory = os.path.join(os.path.dirname(__file__), '..', 'data', 'tables')
+
  
 #defining the interface of objects that calculate outcome probabilities through statistical models of matches.
 class ProbabilityModel(ABC):
 
-    def __init__(self, modelType):
+    #names of the summarised probabilities in the order returned by summariseProbabilities
+    probabilityColumns = ['probHome', 'probDraw', 'probAway', 'probOver25', 'probUnder25']
+
+    #maxGoals is the number of goals per team covered by the score matrices (i.e. scores from 0 to maxGoals-1)
+    def __init__(self, modelType, maxGoals = 10):
         self.type = modelType
+        self.maxGoals = maxGoals
+        self.outcomeMasks = self.calculateOutcomeMasks()
 
     #calculates probabilities for a range of outcomes from the given parameters
     def calculateProbabilities(self, outcomes):
         pass
     
-    #expects probabilities for each result and calculates summarised probabilities
+    #calculates boolean masks (home, draw, away, over 2.5, under 2.5) over the score matrix, stacked to a single array
+    #further markets can be calculated by a MarketAggregator (see createMarketAggregator)
+    def calculateOutcomeMasks(self):
+        return self.createMarketAggregator([('home',), ('draw',), ('away',), ('over', 2.5), ('under', 2.5)]).weights[:,0] > 0
+    
+    #creates an aggregator of the given markets for the score matrices of this model (see MarketAggregator)
+    def createMarketAggregator(self, markets):
+        return MarketAggregator(markets, self.maxGoals)
+    
+    #expects probabilities for each result (a single score matrix or a batch of score matrices in the last two dimensions) and calculates summarised probabilities
+    #returns an array of home, draw, away, over 2.5 and under 2.5 probabilities in the last dimension
     def summariseProbabilities(self, probabilities):
-        probabilityHome = 0
-        probabilityDraw = 0
-        probabilityAway = 0
-        probabilityOver25 = 0
-        probabilityUnder25 = 0
-        sum = 0
+        probabilities = np.asarray(probabilities, dtype=float)
+        summarised = np.tensordot(probabilities, self.outcomeMasks, axes=([-2,-1],[1,2]))
+        total = probabilities.sum(axis=(-2,-1))
+        return summarised / np.expand_dims(total, -1)
+    
+    #calculates summarised probabilities for arrays of model parameters in one call
+    def calculateOutcomeProbabilities(self, *parameters):
+        return self.summariseProbabilities(self.calculateProbabilities(*parameters))
+    
+    #calculates the derivatives of the score matrices with respect to the anticipated goals home and away (stacked in the third last dimension)
+    #to be implemented by models that support the continuous inversion
+    def calculateProbabilityDerivatives(self, lambda1, lambda2):
+        pass
+    
+    #calculates summarised probabilities and their jacobian with respect to the anticipated goals home and away for arrays of anticipated goals
+    #the jacobian has the summarised probabilities in the second last and home/away in the last dimension
+    def calculateOutcomeJacobian(self, lambda1, lambda2):
+        probabilities = self.calculateProbabilities(lambda1, lambda2)
+        derivatives = self.calculateProbabilityDerivatives(lambda1, lambda2)
+        total = probabilities.sum(axis=(-2,-1))
+        summarised = np.tensordot(probabilities, self.outcomeMasks, axes=([-2,-1],[1,2])) / total[...,None]
+        #quotient rule for the normalisation by the total probability covered by the score matrix
+        derivativesSummarised = np.tensordot(derivatives, self.outcomeMasks, axes=([-2,-1],[1,2]))
+        derivativesSummarised -= summarised[...,None,:] * derivatives.sum(axis=(-2,-1))[...,None]
+        derivativesSummarised /= total[...,None,None]
+        return summarised, np.swapaxes(derivativesSummarised, -1, -2)
+    
+    #calculates the probabilities of the markets of an aggregator and their jacobian with respect to the anticipated goals home and away (see MarketAggregator.calculateMarketJacobian)
+    def calculateMarketJacobian(self, aggregator, lambda1, lambda2):
+        return aggregator.calculateMarketJacobian(self.calculateProbabilities(lambda1, lambda2), self.calculateProbabilityDerivatives(lambda1, lambda2))
+    
+    #refines anticipated goals (e.g. the best-fitting cells of a table) to the continuous least-squares solution for the given probabilities (one row per match)
+    #all matches are solved at once by Levenberg-Marquardt steps with analytic derivatives, anticipated goals are kept non-negative
+    #by default the probabilities are those of summariseProbabilities, otherwise the probabilities of the markets of the given aggregator (see MarketAggregator)
+    #weights are the weights of the squared differences of the markets (one per column), missing probabilities are left out of the sum of a match
+    def refineAnticipatedGoals(self, probabilities, antHome, antAway, maxIterations = 100, tolerance = 1e-10, aggregator = None, weights = None):
+        probabilities = np.asarray(probabilities, dtype=float)
+        anticipations = np.column_stack([antHome, antAway]).astype(float)
+        if(aggregator is None):
+            calculateMarkets = self.calculateOutcomeProbabilities
+            calculateJacobian = self.calculateOutcomeJacobian
+        else:
+            calculateMarkets = lambda lambda1, lambda2: aggregator.calculateMarketProbabilities(self.calculateProbabilities(lambda1, lambda2))
+            calculateJacobian = lambda lambda1, lambda2: self.calculateMarketJacobian(aggregator, lambda1, lambda2)
+        #weights of every match and market, missing probabilities have a weight of 0
+        weights = np.where(np.isnan(probabilities), 0.0, np.ones(probabilities.shape[1]) if weights is None else np.asarray(weights, dtype=float))
+        observed = np.where(weights > 0, probabilities, 0.0)
         
-        for i in range(0,10):
-            for j in range(0,10):
-                if (i>j):
-                    probabilityHome += probabilities[i][j]
-                elif (i==j):
-                    probabilityDraw += probabilities[i][j]
-                else:
-                    probabilityAway += probabilities[i][j]
-                if (i+j>2):
-                    probabilityOver25 += probabilities[i][j]
-                else:
-                    probabilityUnder25 += probabilities[i][j]
-                sum += probabilities[i][j]
+        active = np.flatnonzero((weights > 0).any(axis=1) & ~np.isnan(anticipations).any(axis=1))
+        damping = np.full(len(probabilities), 1e-3)
+        residuals = np.where(weights[active] > 0, calculateMarkets(anticipations[active,0], anticipations[active,1]) - observed[active], 0.0)
+        costs = np.full(len(probabilities), np.nan)
+        costs[active] = (weights[active] * residuals**2).sum(axis=1)
         
-        return [probabilityHome/sum, probabilityDraw/sum, probabilityAway/sum, probabilityOver25/sum, probabilityUnder25/sum]
-    
-    #calculates a table with all combinations of anticipated goals home and away
-    def calculateTable(self):
-        table = pd.DataFrame()
-        for antHome in np.arange(0.0,6.0,0.025):
-            print("Calculating model probabilities for anticipated number of home goals: "+str(antHome))
-            for antAway in np.arange(0.0,6.0,0.025):
-                table = pd.concat([table, pd.DataFrame([[antHome, antAway] + self.summariseProbabilities(self.calculateProbabilities(antHome, antAway))])], ignore_index=True, axis=0)
-        table.columns = ['antHome', 'antAway', 'probHome', 'probDraw', 'probAway', 'probOver25', 'probUnder25']
+        iterations = 0
+        while(len(active) > 0 and iterations < maxIterations):
+            summarised, jacobian = calculateJacobian(anticipations[active,0], anticipations[active,1])
+            residuals = np.where(weights[active] > 0, summarised - observed[active], 0.0)
+            jacobian = np.where(weights[active,:,None] > 0, jacobian, 0.0)
+            weightedJacobian = jacobian * weights[active,:,None]
+            gradient = np.einsum('nki,nk->ni', weightedJacobian, residuals)
+            hessian = np.einsum('nki,nkj->nij', weightedJacobian, jacobian)
+            hessian += damping[active,None,None] * (np.eye(2) * (hessian.diagonal(axis1=1, axis2=2)[:,:,None] + 1e-12))
+            #matches whose markets only identify a combination of the anticipated goals (e.g. only over/under) take the minimum-norm step,
+            #which leaves the unidentified direction at the starting values
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                singular = np.linalg.cond(hessian) > 1e12
+            step = np.empty(gradient.shape)
+            step[~singular] = np.linalg.solve(hessian[~singular], -gradient[~singular,:,None])[...,0]
+            step[singular] = (np.linalg.pinv(hessian[singular], rcond = 1e-12) @ -gradient[singular,:,None])[...,0]
+            
+            candidates = np.maximum(anticipations[active] + step, 0)
+            candidateResiduals = np.where(weights[active] > 0, calculateMarkets(candidates[:,0], candidates[:,1]) - observed[active], 0.0)
+            candidateCosts = (weights[active] * candidateResiduals**2).sum(axis=1)
+            
+            #accepted steps reduce the damping, rejected steps increase it
+            accepted = candidateCosts <= costs[active]
+            anticipations[active[accepted]] = candidates[accepted]
+            costs[active[accepted]] = candidateCosts[accepted]
+            damping[active] = np.where(accepted, damping[active] / 10, damping[active] * 10)
+            
+            #matches are finished once the steps become negligible or no further improvement is possible
+            finished = (accepted & (np.abs(step).max(axis=1) < tolerance)) | (damping[active] > 1e10)
+            active = active[~finished]
+            iterations += 1
+            
+        return anticipations[:,0], anticipations[:,1]
+    
+    #calculates a table with all combinations of anticipated goals home and away on a grid from start (inclusive) to stop (exclusive)
+    #all grid cells are calculated in one batched call, dtype defines the precision of the stored table (e.g. np.float32 or np.float64)
+    #rows are optional indices of the anticipated home goals of the grid to calculate only a part of the table (see obtainTables)
+    def calculateTable(self, start = 0.0, stop = 6.0, step = 0.025, dtype = np.float64, rows = None):
+        grid = np.arange(start, stop, step)
+        antHome, antAway = np.meshgrid(grid if rows is None else grid[rows], grid, indexing='ij')
+        antHome = antHome.ravel()
+        antAway = antAway.ravel()
+        probabilities = self.calculateOutcomeProbabilities(antHome, antAway)
+        table = pd.DataFrame(np.column_stack([antHome, antAway, probabilities]).astype(dtype))
+        table.columns = ['antHome', 'antAway'] + self.probabilityColumns
+        return table
+    
+    #calculates a table of the probabilities of the markets of an aggregator on the same grid as calculateTable (columns antHome, antAway and the columns of the aggregator)
+    def calculateMarketTable(self, aggregator, start = 0.0, stop = 6.0, step = 0.025, dtype = np.float64):
+        grid = np.arange(start, stop, step)
+        antHome, antAway = np.meshgrid(grid, grid, indexing='ij')
+        antHome = antHome.ravel()
+        antAway = antAway.ravel()
+        probabilities = aggregator.calculateMarketProbabilities(self.calculateProbabilities(antHome, antAway))
+        table = pd.DataFrame(np.column_stack([antHome, antAway, probabilities]).astype(dtype))
+        table.columns = ['antHome', 'antAway'] + aggregator.columns
         return table
     
+    #identifies the model, its parameters and the version of its code in the file names of cached tables, to be extended by models with further parameters
+    #tables calculated by an earlier version of the model (e.g. before a change of its probabilities) are not reused
+    def tableKey(self):
+        return self.type + '_maxGoals' + str(self.maxGoals) + '_code' + calculateSourceKey(type(self))
+    
+    #file of the cached table of the given grid
+    def tableFile(self, start = 0.0, stop = 6.0, step = 0.025, dtype = np.float64, directory = tableDirectory):
+        return os.path.join(directory, self.tableKey() + '_' + '_'.join(str(float(value)) for value in [start, stop, step]) + '_' + np.dtype(dtype).name + '.npy')
+    
+    #returns the table for the given grid, which is loaded from a binary cache if it was calculated before and calculated and cached otherwise
+    def obtainTable(self, start = 0.0, stop = 6.0, step = 0.025, dtype = np.float64, directory = tableDirectory):
+        file = self.tableFile(start, stop, step, dtype, directory)
+        if(os.path.exists(file)):
+            return pd.DataFrame(np.load(file), columns = ['antHome', 'antAway'] + self.probabilityColumns)
+        
+        table = self.calculateTable(start, stop, step, dtype)
+        self.cacheTable(table, file)
+        return table
+    
+    #returns the market table of an aggregator (see calculateMarketTable), cached as obtainTable with a hash of the markets and the code of the aggregator in the file name
+    def obtainMarketTable(self, aggregator, start = 0.0, stop = 6.0, step = 0.025, dtype = np.float64, directory = tableDirectory):
+        marketsKey = hashlib.sha256(repr((aggregator.maxGoals, aggregator.markets, calculateSourceKey(type(aggregator)))).encode()).hexdigest()[:16]
+        file = os.path.join(directory, self.tableKey() + '_markets' + marketsKey + '_' + '_'.join(str(float(value)) for value in [start, stop, step]) + '_' + np.dtype(dtype).name + '.npy')
+        if(os.path.exists(file)):
+            return pd.DataFrame(np.load(file), columns = ['antHome', 'antAway'] + aggregator.columns)
+        
+        table = self.calculateMarketTable(aggregator, start, stop, step, dtype)
+        self.cacheTable(table, file)
+        return table
+    
+    #stores a table in the binary cache
+    def cacheTable(self, table, file):
+        os.makedirs(os.path.dirname(file), exist_ok = True)
+        #write to a temporary file first so that an interrupted run does not leave a broken cache
+        temporaryFile = file + '.tmp.npy'
+        np.save(temporaryFile, table.to_numpy())
+        os.replace(temporaryFile, file)
     
     #saves a table in csv format in a given file 
     def saveTable(self, table, file):
@@ -78,25 +216,264 @@ class ProbabilityModel(ABC):
         minIndex = sumDiffs.idxmin()
         return table['antHome'][minIndex], table['antAway'][minIndex]
     
+    #builds a KD-tree over the probability columns of a table to find the best-fitting cells of many matches at once
+    def buildTableIndex(self, table):
+        from scipy.spatial import cKDTree
+        return cKDTree(table[self.probabilityColumns].to_numpy(dtype=float))
+    
+    #given an array of outcome probabilities (one row per match), obtain the best-fitting anticipated goals for all matches in one query
+    #the nearest neighbour in euclidean distance minimises the same sum of squared differences as obtainAnticipatedGoals
+    #matches with missing probabilities obtain missing anticipated goals
+    def obtainAllAnticipatedGoals(self, table, probabilities, tableIndex = None):
+        if(tableIndex is None):
+            tableIndex = self.buildTableIndex(table)
+        probabilities = np.asarray(probabilities, dtype=float)
+        valid = ~np.isnan(probabilities).any(axis=1)
+        
+        antHome = np.full(len(probabilities), np.nan)
+        antAway = np.full(len(probabilities), np.nan)
+        _, minIndex = tableIndex.query(probabilities[valid])
+        antHome[valid] = table['antHome'].to_numpy()[minIndex]
+        antAway[valid] = table['antAway'].to_numpy()[minIndex]
+        return antHome, antAway
+    
+    
+    #obtains the best-fitting cells of a table for matches with any subset of the given probability columns (e.g. the columns of a market table, see calculateMarketTable)
+    #minimises the weighted sum of squared differences over the available probabilities of each match (weights as in refineAnticipatedGoals)
+    #frequent patterns of available columns are solved in one query of a KD-tree over the columns scaled by the square roots of the weights,
+    #the matches of rare patterns (fewer than minTreeMatches) are compared with all cells in chunks of chunkSize matches
+    #matches without any available probability obtain missing anticipated goals
+    def obtainMarketAnticipatedGoals(self, table, probabilities, columns, weights = None, minTreeMatches = 200, chunkSize = 100):
+        from scipy.spatial import cKDTree
+        probabilities = np.asarray(probabilities, dtype=float)
+        weights = np.ones(len(columns)) if weights is None else np.asarray(weights, dtype=float)
+        scales = np.sqrt(weights)
+        tableProbabilities = table[columns].to_numpy(dtype=float) * scales
+        tableHome = table['antHome'].to_numpy()
+        tableAway = table['antAway'].to_numpy()
+        available = ~np.isnan(probabilities) & (weights > 0)
+        patterns, inverse, counts = np.unique(available, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        
+        antHome = np.full(len(probabilities), np.nan)
+        antAway = np.full(len(probabilities), np.nan)
+        for number, pattern in enumerate(patterns):
+            if(not pattern.any() or counts[number] < minTreeMatches):
+                continue
+            matches = np.flatnonzero(inverse == number)
+            #cells with undefined probabilities (e.g. Asian handicaps that are always refunded without goals) cannot be chosen
+            cells = np.flatnonzero(~np.isnan(tableProbabilities[:,pattern]).any(axis=1))
+            _, minIndex = cKDTree(tableProbabilities[cells][:,pattern]).query(probabilities[matches][:,pattern] * scales[pattern])
+            antHome[matches] = tableHome[cells[minIndex]]
+            antAway[matches] = tableAway[cells[minIndex]]
+        
+        #weighted sums of squared differences of rare patterns without the constant sum of the squared probabilities of a match
+        rare = np.flatnonzero(available.any(axis=1) & (counts[inverse] < minTreeMatches))
+        undefined = np.isnan(tableProbabilities)
+        cellProbabilities = np.where(undefined, 0.0, tableProbabilities)
+        for chunk in range(0, len(rare), chunkSize):
+            matches = rare[chunk:chunk+chunkSize]
+            masks = available[matches].astype(float)
+            scaled = np.where(available[matches], probabilities[matches] * scales, 0.0)
+            distances = masks @ (cellProbabilities**2).T - 2 * scaled @ cellProbabilities.T
+            distances[(masks @ undefined.T) > 0] = np.inf
+            minIndex = distances.argmin(axis=1)
+            antHome[matches] = tableHome[minIndex]
+            antAway[matches] = tableAway[minIndex]
+        return antHome, antAway
+    
     
 #independent Poisson model
 class PoissonModel(ProbabilityModel):
     
-    def __init__(self):
-        super().__init__('poissonModel')
+    def __init__(self, maxGoals = 10):
+        super().__init__('poissonModel', maxGoals)
+    
+    #calculates the Poisson probabilities of 0 to maxGoals-1 goals for an array of expected goals, using the recurrence p(k) = p(k-1)*lambda/k
+    def calculateGoalProbabilities(self, expectedGoals):
+        expectedGoals = np.asarray(expectedGoals, dtype=float)
+        probabilities = np.empty(expectedGoals.shape + (self.maxGoals,))
+        probabilities[...,0] = np.exp(-expectedGoals)
+        for goals in range(1, self.maxGoals):
+            probabilities[...,goals] = probabilities[...,goals-1] * expectedGoals / goals
+        return probabilities
+    
+    #the derivative of the Poisson probability of k goals with respect to lambda is p(k-1) - p(k)
+    def calculateGoalDerivatives(self, expectedGoals, probabilities):
+        derivatives = -probabilities
+        derivatives[...,1:] += probabilities[...,:-1]
+        return derivatives
+    
+    def calculateProbabilityDerivatives(self, lambda1, lambda2):
+        lambda1, lambda2 = np.broadcast_arrays(np.asarray(lambda1, dtype=float), np.asarray(lambda2, dtype=float))
+        probabilitiesHome = self.calculateGoalProbabilities(lambda1)
+        probabilitiesAway = self.calculateGoalProbabilities(lambda2)
+        derivativesHome = self.calculateGoalDerivatives(lambda1, probabilitiesHome)
+        derivativesAway = self.calculateGoalDerivatives(lambda2, probabilitiesAway)
+        return np.stack([derivativesHome[...,:,None] * probabilitiesAway[...,None,:],
+                         probabilitiesHome[...,:,None] * derivativesAway[...,None,:]], axis=-3)
+    
+    #expects (arrays of) anticipated goals home and away and returns the score matrices in the last two dimensions
+    #rows refer to home goals, columns to away goals
+    def calculateProbabilities(self, lambda1, lambda2):
+        lambda1, lambda2 = np.broadcast_arrays(np.asarray(lambda1, dtype=float), np.asarray(lambda2, dtype=float))
+        probabilitiesHome = self.calculateGoalProbabilities(lambda1)
+        probabilitiesAway = self.calculateGoalProbabilities(lambda2)
+        return probabilitiesHome[...,:,None] * probabilitiesAway[...,None,:]
+    
+    
+    
+#Poisson model with the correction of Dixon and Coles for the low scores 0:0, 1:0, 0:1 and 1:1 (negative rho increases the probability of draws)
+#(see Dixon, M. J., & Coles, S. G. (1997). Modelling association football scores and inefficiencies in the football betting market. Journal of the Royal Statistical Society: Series C, 46(2), 265-280.)
+class DixonColesModel(PoissonModel):
+    
+    def __init__(self, rho = -0.1, maxGoals = 10):
+        super().__init__(maxGoals)
+        self.type = 'dixonColesModel'
+        self.rho = rho
+    
+    def tableKey(self):
+        return super().tableKey() + '_rho' + str(float(self.rho))
+    
+    #correction factors of the scores 0:0, 0:1, 1:0 and 1:1 (in this order), factors are kept non-negative for large anticipated goals
+    def calculateCorrections(self, lambda1, lambda2):
+        return np.maximum(np.stack([1 - lambda1 * lambda2 * self.rho, 1 + lambda1 * self.rho, 1 + lambda2 * self.rho, np.full(lambda1.shape, 1 - self.rho)], axis=-1), 0)
+    
+    def calculateProbabilities(self, lambda1, lambda2):
+        lambda1, lambda2 = np.broadcast_arrays(np.asarray(lambda1, dtype=float), np.asarray(lambda2, dtype=float))
+        probabilities = super().calculateProbabilities(lambda1, lambda2)
+        probabilities[...,:2,:2] *= self.calculateCorrections(lambda1, lambda2).reshape(lambda1.shape + (2, 2))
+        return probabilities
+    
+    #product rule of the Poisson probabilities and the correction factors of the low scores
+    def calculateProbabilityDerivatives(self, lambda1, lambda2):
+        lambda1, lambda2 = np.broadcast_arrays(np.asarray(lambda1, dtype=float), np.asarray(lambda2, dtype=float))
+        derivatives = super().calculateProbabilityDerivatives(lambda1, lambda2)
+        probabilities = super().calculateProbabilities(lambda1, lambda2)[...,:2,:2]
+        corrections = self.calculateCorrections(lambda1, lambda2).reshape(lambda1.shape + (2, 2))
+        clipped = corrections == 0
+        derivativesCorrectionHome = np.stack([-lambda2 * self.rho, np.full(lambda1.shape, self.rho), np.zeros(lambda1.shape), np.zeros(lambda1.shape)], axis=-1).reshape(lambda1.shape + (2, 2))
+        derivativesCorrectionAway = np.stack([-lambda1 * self.rho, np.zeros(lambda1.shape), np.full(lambda1.shape, self.rho), np.zeros(lambda1.shape)], axis=-1).reshape(lambda1.shape + (2, 2))
+        for side, derivativesCorrection in enumerate([derivativesCorrectionHome, derivativesCorrectionAway]):
+            derivatives[...,side,:2,:2] = derivatives[...,side,:2,:2] * corrections + probabilities * np.where(clipped, 0, derivativesCorrection)
+        return derivatives
+    
+    
+#bivariate Poisson model with home goals X1 + X3 and away goals X2 + X3 of independent Poisson variables, X3 has the mean covariance and adds correlated goals
+#the anticipated goals are the means of the home and away goals (X1 and X2 have means anticipated goals - covariance, with a minimum of 0)
+#(see Karlis, D., & Ntzoufras, I. (2003). Analysis of sports data by using bivariate Poisson models. Journal of the Royal Statistical Society: Series D, 52(3), 381-393.)
+class BivariatePoissonModel(PoissonModel):
+    
+    def __init__(self, covariance = 0.1, maxGoals = 10):
+        if(covariance < 0):
+            raise ValueError("The covariance of the bivariate Poisson model has to be non-negative, but got "+str(covariance))
+        super().__init__(maxGoals)
+        self.type = 'bivariatePoissonModel'
+        self.covariance = covariance
+        self.covarianceProbabilities = super().calculateGoalProbabilities(covariance)
+    
+    def tableKey(self):
+        return super().tableKey() + '_covariance' + str(float(self.covariance))
+    
+    #sums the score matrices of all numbers of correlated goals k, with k goals added to the independent goals of both teams
+    def combineGoals(self, goalsHome, goalsAway):
+        probabilities = np.zeros(np.broadcast_shapes(goalsHome.shape[:-1], goalsAway.shape[:-1]) + (self.maxGoals, self.maxGoals))
+        for goals in range(self.maxGoals):
+            probabilities[...,goals:,goals:] += self.covarianceProbabilities[goals] * goalsHome[...,:self.maxGoals-goals,None] * goalsAway[...,None,:self.maxGoals-goals]
+        return probabilities
     
     def calculateProbabilities(self, lambda1, lambda2):
-        probabilities=[]
-        for i in range(0,10):
-            column = []
-            for j in range(0,10):
-                column.append(poisson.pmf(i, lambda1)*poisson.pmf(j, lambda2))
-            probabilities.append(column)
+        lambda1, lambda2 = np.broadcast_arrays(np.asarray(lambda1, dtype=float), np.asarray(lambda2, dtype=float))
+        return self.combineGoals(self.calculateGoalProbabilities(np.maximum(lambda1 - self.covariance, 0)), self.calculateGoalProbabilities(np.maximum(lambda2 - self.covariance, 0)))
+    
+    def calculateProbabilityDerivatives(self, lambda1, lambda2):
+        lambda1, lambda2 = np.broadcast_arrays(np.asarray(lambda1, dtype=float), np.asarray(lambda2, dtype=float))
+        independent1 = np.maximum(lambda1 - self.covariance, 0)
+        independent2 = np.maximum(lambda2 - self.covariance, 0)
+        probabilitiesHome = self.calculateGoalProbabilities(independent1)
+        probabilitiesAway = self.calculateGoalProbabilities(independent2)
+        #the derivatives vanish where the independent goals are clipped at 0
+        derivativesHome = self.calculateGoalDerivatives(independent1, probabilitiesHome) * (lambda1 > self.covariance)[...,None]
+        derivativesAway = self.calculateGoalDerivatives(independent2, probabilitiesAway) * (lambda2 > self.covariance)[...,None]
+        return np.stack([self.combineGoals(derivativesHome, probabilitiesAway), self.combineGoals(probabilitiesHome, derivativesAway)], axis=-3)
+    
+    
+#independent negative binomial goals with means of the anticipated goals and the variance mean + mean^2 / dispersion (overdispersion compared to the Poisson model)
+#the Poisson model is obtained for an infinite dispersion
+#the score matrices cover 20 goals per team by default, as the heavier tails lose too much probability at 10 goals (e.g. 4 % of the score matrix for 3.5 anticipated goals
+#per team and a dispersion of 5, which shifts the mean of the normalised probabilities by 0.17 goals, compared to less than 0.001 goals at 20 goals per team)
+class NegativeBinomialModel(PoissonModel):
+    
+    def __init__(self, dispersion = 10.0, maxGoals = 20):
+        if(dispersion <= 0):
+            raise ValueError("The dispersion of the negative binomial model has to be positive, but got "+str(dispersion))
+        super().__init__(maxGoals)
+        self.type = 'negativeBinomialModel'
+        self.dispersion = dispersion
+    
+    def tableKey(self):
+        return super().tableKey() + '_dispersion' + str(float(self.dispersion))
+    
+    #uses the recurrence p(k) = p(k-1) * (k-1+r)/k * lambda/(r+lambda) with dispersion r
+    def calculateGoalProbabilities(self, expectedGoals):
+        expectedGoals = np.asarray(expectedGoals, dtype=float)
+        ratio = expectedGoals / (self.dispersion + expectedGoals)
+        probabilities = np.empty(expectedGoals.shape + (self.maxGoals,))
+        probabilities[...,0] = (self.dispersion / (self.dispersion + expectedGoals))**self.dispersion
+        for goals in range(1, self.maxGoals):
+            probabilities[...,goals] = probabilities[...,goals-1] * (goals - 1 + self.dispersion) / goals * ratio
         return probabilities
     
+    #the derivative of p(k) with respect to lambda is p(k-1) * (k-1+r)/(r+lambda) - p(k) * (k+r)/(r+lambda)
+    def calculateGoalDerivatives(self, expectedGoals, probabilities):
+        goals = np.arange(self.maxGoals)
+        denominator = (self.dispersion + np.asarray(expectedGoals, dtype=float))[...,None]
+        derivatives = -probabilities * (goals + self.dispersion) / denominator
+        derivatives[...,1:] += probabilities[...,:-1] * (goals[1:] - 1 + self.dispersion) / denominator
+        return derivatives
+
+
+
+#models that can be chosen by name (e.g. in the command-line entry point)
+probabilityModels = {'poissonModel': PoissonModel,
+                     'dixonColesModel': DixonColesModel,
+                     'bivariatePoissonModel': BivariatePoissonModel,
+                     'negativeBinomialModel': NegativeBinomialModel}
+
+
+#hash of the source of a class and all of its base classes (e.g. PoissonModel and ProbabilityModel for DixonColesModel), calculated once per class
+@functools.lru_cache(maxsize = None)
+def calculateSourceKey(modelClass):
+    classes = [base for base in modelClass.__mro__ if base not in (object, ABC)]
+    return hashlib.sha256(''.join(inspect.getsource(base) for base in classes).encode()).hexdigest()[:16]
 
 
+#calculates the rows of the table of a model, defined on module level to be used in the process pool of obtainTables
+def calculateModelTableRows(model, rows, start, stop, step, dtype):
+    return model.calculateTable(start, stop, step, dtype, rows)
 
-#mod = PoissonModel()
-#table = mod.calculateTable()
-#mod.saveTable(table, os.path.join(os.path.dirname(__file__), "../data\Table.csv"))
\ No newline at end of file
+#returns the tables of several models (e.g. a Dixon-Coles model for several values of rho) for the same grid
+#tables that are not cached yet are split into chunks of rows (anticipated home goals), which are calculated in parallel by a process pool,
+#so that also a single table is calculated by all workers, the tables are cached per model and parameters (see tableKey) by the calling process
+#models with the same table are only calculated once
+def obtainTables(models, start = 0.0, stop = 6.0, step = 0.025, dtype = np.float64, directory = tableDirectory, workers = None):
+    workers = os.cpu_count() if workers is None else workers
+    uniqueModels = list({model.tableKey(): model for model in models}.values())
+    missingModels = [model for model in uniqueModels if not os.path.exists(model.tableFile(start, stop, step, dtype, directory))]
+    tables = {}
+    if(workers > 1 and len(missingModels) > 0):
+        #imported here, as the process pool is only needed to calculate tables
+        from concurrent.futures import ProcessPoolExecutor
+        #at least one chunk per worker
+        chunks = np.array_split(np.arange(len(np.arange(start, stop, step))), -(-workers // len(missingModels)))
+        tasks = [(model, rows) for model in missingModels for rows in chunks]
+        with ProcessPoolExecutor(max_workers = min(workers, len(tasks))) as executor:
+            parts = list(executor.map(calculateModelTableRows, *zip(*tasks), *[[value] * len(tasks) for value in [start, stop, step, dtype]]))
+        for index, model in enumerate(missingModels):
+            table = pd.concat(parts[index * len(chunks):(index + 1) * len(chunks)], ignore_index = True)
+            model.cacheTable(table, model.tableFile(start, stop, step, dtype, directory))
+            tables[model.tableKey()] = table
+    for model in uniqueModels:
+        if(model.tableKey() not in tables):
+            tables[model.tableKey()] = model.obtainTable(start, stop, step, dtype, directory)
+    return [tables[model.tableKey()] for model in models]
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Makes the modules of the repository importable by the tests (the scripts on the top level and the package bettingCalculationTools) and builds the synthetic matches and input files shared by the tests
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from SyntheticData import SyntheticDataGenerator
+from bettingCalculationTools.DataImport import DataImporter
+from bettingCalculationTools.ProbabilityModelling import PoissonModel
+
+
+mapping = os.path.join(os.path.dirname(__file__), '..', 'inputMappings', 'inputMappingMatchDataAverageOdds.csv')
+missingDataAllowed = ['shotsHome', 'shotsAway', 'shotsTargetHome', 'shotsTargetAway']
+
+
+#matches of leagues with several divisions over several seasons (double round robin with random results), the worst teams of a division are relegated and the best teams of the division below are promoted after each season
+def createLeagues(divisions = 2, teams = 6, seasons = 3, relegated = 1, seed = 0):
+    rng = np.random.default_rng(seed)
+    members = [['Team' + str(division * teams + team) for team in range(teams)] for division in range(divisions)]
+    matches = []
+    for season in range(seasons):
+        start = pd.Timestamp(2000 + season, 8, 1)
+        points = []
+        for division in range(divisions):
+            pairs = [(home, away) for home in members[division] for away in members[division] if home != away]
+            order = rng.permutation(len(pairs))
+            goals = rng.poisson([1.5, 1.1], (len(pairs), 2))
+            for number, pair in enumerate(order):
+                matches.append({'date': start + pd.Timedelta(weeks = number // (teams // 2)), 'league': 'League' + str(division + 1), 'season': str(2000 + season) + '/' + str(2001 + season),
+                                'teamHome': pairs[pair][0], 'teamAway': pairs[pair][1], 'goalsHome': goals[number, 0], 'goalsAway': goals[number, 1]})
+            table = pd.DataFrame(matches[-len(pairs):])
+            table = pd.concat([table.assign(team = table['teamHome'], points = np.sign(table['goalsHome'] - table['goalsAway'])),
+                               table.assign(team = table['teamAway'], points = np.sign(table['goalsAway'] - table['goalsHome']))])
+            points.append(table.groupby('team')['points'].sum().reindex(members[division]).sort_values(ascending = False, kind = 'stable').index.tolist())
+        for division in range(divisions):
+            promoted = points[division + 1][:relegated] if division + 1 < divisions else []
+            relegatedTeams = points[division - 1][-relegated:] if division > 0 else []
+            members[division] = relegatedTeams + points[division][relegated if division > 0 else 0:len(points[division]) - len(promoted)] + promoted
+    data = pd.DataFrame(matches).sort_values(by = ['date', 'league', 'teamHome'], kind = 'stable').reset_index(drop = True)
+    data['result'] = np.select([data['goalsHome'] > data['goalsAway'], data['goalsHome'] == data['goalsAway']], ['H', 'D'], 'A')
+    return data
+
+
+#input files of SyntheticDataGenerator (two divisions of six teams over three seasons), written once for all tests
+@pytest.fixture(scope = 'session')
+def syntheticDirectory(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('synthetic'))
+    SyntheticDataGenerator(countries = 1, divisions = 2, teams = 6, seasons = 3, relegated = 1).generate(directory)
+    return directory
+
+
+#seasons of the synthetic input files imported without the import cache
+def streamSyntheticFiles(directory, compact = False, **arguments):
+    return list(DataImporter.streamAllFiles(directory, mapping, missingDataAllowed = missingDataAllowed, cache = False, compact = compact, **arguments))
+
+
+#market probabilities of a Poisson model for known anticipated goals
+def createMarketMatches(markets, number = 50, seed = 0):
+    rng = np.random.default_rng(seed)
+    model = PoissonModel()
+    antHome = rng.uniform(0.4, 2.8, number)
+    antAway = rng.uniform(0.3, 2.2, number)
+    aggregator = model.createMarketAggregator(markets)
+    probabilities = aggregator.calculateMarketProbabilities(model.calculateProbabilities(antHome, antAway))
+    return pd.DataFrame(probabilities, columns = aggregator.columns), antHome, antAway
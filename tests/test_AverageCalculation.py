@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Tests of the vectorised averages of AverageCalculation
+"""
+
+import numpy as np
+import pandas as pd
+from AverageCalculation import AverageCalculation
+
+
+#averages of all previous matches of a team in the same season, calculated match by match
+def calculateAveragesLoop(data):
+    sums = {}
+    averages = np.zeros((2, len(data.index)))
+    for i, match in data.iterrows():
+        for side, (team, goals) in enumerate([(match['teamHome'], match['goalsHome']), (match['teamAway'], match['goalsAway'])]):
+            season, matches, total = sums.get(team, (None, 0, 0.0))
+            if(season != match['season']):
+                matches, total = 0, 0.0
+            averages[side, i] = total / matches if matches > 0 else 0
+            sums[team] = (match['season'], matches + 1, total + goals)
+    return averages
+
+
+def createMatches(number = 300, seed = 0):
+    rng = np.random.default_rng(seed)
+    teams = np.array(['team' + str(team) for team in range(8)])
+    pairs = np.array([rng.choice(len(teams), 2, replace = False) for match in range(number)])
+    return pd.DataFrame({'teamHome': teams[pairs[:,0]], 'teamAway': teams[pairs[:,1]],
+                         'season': np.where(np.arange(number) < number // 2, '2000/2001', '2001/2002'),
+                         'goalsHome': rng.poisson(1.5, number).astype(float), 'goalsAway': rng.poisson(1.1, number).astype(float),
+                         'pointsHome': 0, 'pointsAway': 0})
+
+
+def test_teamAveragesEqualLoop():
+    data = createMatches()
+    np.testing.assert_allclose(AverageCalculation.calculateTeamAverages(data)['goals'], calculateAveragesLoop(data))
+
+
+#a missing goal value only affects the later matches of the same team in the same season
+def test_missingGoalsOnlyAffectTheirTeamAndSeason():
+    data = createMatches()
+    data.loc[10, 'goalsHome'] = np.nan
+    averages = AverageCalculation.calculateTeamAverages(data)['goals']
+    expected = calculateAveragesLoop(data)
+    np.testing.assert_allclose(averages, expected)
+    team = data.loc[10, 'teamHome']
+    affected = np.vstack([(data['teamHome'] == team), (data['teamAway'] == team)]) & (np.arange(len(data.index)) > 10) & (data['season'] == data.loc[10, 'season']).to_numpy()
+    assert np.isnan(averages[affected]).all()
+    assert not np.isnan(averages[~affected]).any()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Smoke test of the benchmark on tiny synthetic data and of the comparison of two runs
+"""
+
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from Benchmark import Benchmark
+
+
+@pytest.fixture(scope = 'module')
+def run(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('benchmarks')
+    benchmark = Benchmark([24], repeats = 1, stages = ['import', 'averages', 'elo'], directory = str(directory), generatorArguments = {'divisions': 1, 'teams': 4, 'relegated': 1})
+    file = str(directory / 'run.json')
+    return benchmark, benchmark.run(file), file
+
+
+def test_runOfTinyStages(run):
+    benchmark, results, file = run
+    assert list(results['stage']) == ['import', 'averages', 'elo']
+    assert (results['matches'] == 24).all() and (results['size'] == 24).all()
+    assert (results['seconds'] > 0).all() and (results['peakMemoryMB'] > 0).all()
+    with open(file) as content:
+        saved = json.load(content)
+    assert {'commit', 'python', 'numpy', 'pandas', 'cpus'} <= set(saved['environment'])
+    pd.testing.assert_frame_equal(Benchmark.loadResults(file), results)
+    #stages need the stages of their input
+    with pytest.raises(ValueError):
+        Benchmark([24], repeats = 1, stages = ['elo'], directory = benchmark.directory, generatorArguments = {'divisions': 1, 'teams': 4, 'relegated': 1}).run(file + '.elo')
+
+
+#stages that are slower or use more memory than the threshold allows compared to the baseline are flagged as regressions
+def test_compareResultsFlagsRegressions(run, tmp_path):
+    benchmark, results, file = run
+    assert not Benchmark.compareResults(file, file)['regression'].any()
+    with open(file) as content:
+        baseline = json.load(content)
+    baseline['results'][1]['seconds'] = results['seconds'][1] / 2
+    baseline['results'][2]['peakMemoryMB'] = results['peakMemoryMB'][2] / 1.1
+    baselineFile = str(tmp_path / 'baseline.json')
+    with open(baselineFile, 'w') as output:
+        json.dump(baseline, output)
+    comparison = Benchmark.compareResults(baselineFile, file).set_index('stage')
+    np.testing.assert_allclose(comparison.loc['averages', 'ratioSeconds'], 2)
+    assert list(comparison['regression']) == [False, True, False]
+    assert list(Benchmark.compareResults(baselineFile, file, threshold = 1.05).set_index('stage')['regression']) == [False, True, True]
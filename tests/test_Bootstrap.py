@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Tests of the paired bootstrap against a naive resample of the matches of each cluster
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from bettingCalculationTools.Bootstrap import Bootstrap
+from bettingCalculationTools.Metrics import MetricsCalculation
+
+
+probabilityColumns = ['probHome', 'probDraw', 'probAway', 'probOver25', 'probUnder25']
+
+
+#matches of 12 seasons with the true probabilities of their outcomes, flat probabilities and some missing goals
+def createMatches(number = 600, seed = 0):
+    rng = np.random.default_rng(seed)
+    probabilities = rng.dirichlet([4, 3, 3], number)
+    over = rng.uniform(0.3, 0.7, number)
+    outcomes = (rng.uniform(size = number)[:, None] > np.cumsum(probabilities, axis = 1)[:, :2]).sum(axis = 1)
+    goalsHome = np.where(outcomes == 0, 2, np.where(outcomes == 1, 1, 0)).astype(float)
+    goalsAway = np.where(outcomes == 2, 2, np.where(outcomes == 1, 1, 0)).astype(float)
+    #a third goal for over 2.5 without changing the winner
+    goalsHome += (rng.uniform(size = number) < over) & (outcomes != 1)
+    goalsHome[rng.choice(number, 20, replace = False)] = np.nan
+    data = pd.DataFrame({'season': rng.choice([str(year) + '/' + str(year + 1) for year in range(2000, 2012)], number), 'goalsHome': goalsHome, 'goalsAway': goalsAway,
+                         'probHome': probabilities[:,0], 'probDraw': probabilities[:,1], 'probAway': probabilities[:,2], 'probOver25': over, 'probUnder25': 1 - over})
+    data['probHomeFlat'] = data['probDrawFlat'] = data['probAwayFlat'] = 1 / 3
+    data['probOver25Flat'] = data['probUnder25Flat'] = 0.5
+    return data
+
+
+models = {'true': probabilityColumns, 'flat': [column + 'Flat' for column in probabilityColumns]}
+
+
+#averages of all scores for every replicate by concatenating the rows of the drawn clusters, with the same draws as the bootstrap (one random stream per replicate)
+def resampleNaive(scores, clusters, replicates, seed):
+    clusterIds = pd.factorize(clusters)[0]
+    numberClusters = clusterIds.max() + 1
+    rows = [np.flatnonzero(clusterIds == cluster) for cluster in range(numberClusters)]
+    averages = []
+    for replicateSeed in np.random.SeedSequence(seed).spawn(replicates):
+        drawn = np.random.default_rng(replicateSeed).integers(0, numberClusters, size = numberClusters)
+        averages.append(np.nanmean(scores.to_numpy()[np.concatenate([rows[cluster] for cluster in drawn])], axis = 0))
+    return np.array(averages)
+
+
+@pytest.mark.parametrize('cluster', [None, 'season'])
+def test_clusterSumsEqualNaiveResample(cluster):
+    data = createMatches()
+    scores = MetricsCalculation.calculateMatchScores(data, models)
+    bootstrap = Bootstrap(replicates = 50, cluster = cluster, seed = 3, workers = 1, blockSize = 16)
+    expected = resampleNaive(scores, data.index if cluster is None else data[cluster], 50, 3)
+    np.testing.assert_allclose(bootstrap.resampleAverages(data, scores), expected, rtol = 1e-12)
+    #the intervals are the percentiles of these replicates
+    results = bootstrap.calculateIntervals(data, models).set_index(['model', 'metric'])
+    np.testing.assert_allclose(results['lower'], np.nanquantile(expected, 0.025, axis = 0), rtol = 1e-12)
+    np.testing.assert_allclose(results['upper'], np.nanquantile(expected, 0.975, axis = 0), rtol = 1e-12)
+    np.testing.assert_allclose(results['value'], scores.mean(), rtol = 1e-12)
+    assert (results['matches'] == 580).all()
+
+
+#the replicates only depend on the seed, not on the number of workers (process pool or serial) or the block size
+def test_resultsDoNotDependOnWorkersOrBlockSize():
+    data = createMatches()
+    expected = Bootstrap(replicates = 45, cluster = 'season', workers = 1, blockSize = 100).calculateIntervals(data, models)
+    for workers, blockSize in [(1, 1), (1, 7), (2, 10), (3, 45)]:
+        result = Bootstrap(replicates = 45, cluster = 'season', workers = workers, blockSize = blockSize).calculateIntervals(data, models)
+        pd.testing.assert_frame_equal(result, expected)
+    other = Bootstrap(replicates = 45, cluster = 'season', seed = 1, workers = 1).calculateIntervals(data, models)
+    assert not np.allclose(other['lower'], expected['lower'])
+
+
+def test_compareModelsPValues():
+    data = createMatches(3000)
+    bootstrap = Bootstrap(replicates = 400, cluster = 'season', workers = 1)
+    data['probHomeCopy'], data['probDrawCopy'], data['probAwayCopy'], data['probOver25Copy'], data['probUnder25Copy'] = [data[column] for column in probabilityColumns]
+    results = bootstrap.compareModels(data, 'true', dict(models, copy = [column + 'Copy' for column in probabilityColumns])).set_index(['model', 'metric'])
+    assert set(results['baseline']) == {'true'}
+    #identical models never differ
+    copy = results.loc['copy']
+    assert (copy['difference'] == 0).all() and (copy['lower'] == 0).all() and (copy['upper'] == 0).all() and (copy['pValue'] == 1).all()
+    #the flat probabilities are clearly worse than the true probabilities of home, draw and away
+    flat = results.loc['flat']
+    for metric in ['rpsHDA', 'brierHDA', 'logLossHDA']:
+        assert flat.loc[metric, 'difference'] > 0 and flat.loc[metric, 'lower'] > 0 and flat.loc[metric, 'pValue'] == 0
+    #the p-values are twice the smaller share of replicates on either side of zero
+    scores = MetricsCalculation.calculateMatchScores(data, models)
+    differences = pd.DataFrame({metric: scores[('flat', metric)] - scores[('true', metric)] for metric in flat.index})
+    replicates = bootstrap.resampleAverages(data, differences)
+    expected = np.minimum(1, 2 * np.minimum(np.mean(replicates <= 0, axis = 0), np.mean(replicates >= 0, axis = 0)))
+    np.testing.assert_allclose(flat['pValue'], expected)
+    np.testing.assert_allclose(flat['difference'], differences.mean())
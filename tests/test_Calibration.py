@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Tests of the reliability tables against sklearn.calibration.calibration_curve and scipy.stats.binned_statistic
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import binned_statistic
+from sklearn.calibration import calibration_curve
+from bettingCalculationTools.Calibration import Calibration
+
+
+#probabilities with ties (rounded to steps of 0.02) and outcomes drawn from them
+def createPredictions(number = 2000, seed = 0):
+    rng = np.random.default_rng(seed)
+    predicted = np.round(rng.beta(2, 3, number) / 0.02) * 0.02
+    observed = (rng.uniform(size = number) < predicted).astype(float)
+    return predicted, observed
+
+
+@pytest.mark.parametrize('bins', [5, 10, 23])
+@pytest.mark.parametrize('strategy, limits', [('quantile', None), ('uniform', (0, 1))])
+def test_binsEqualCalibrationCurve(bins, strategy, limits):
+    predicted, observed = createPredictions()
+    table = Calibration(bins, strategy, limits).calculateReliabilityTable(predicted, observed)
+    expectedObserved, expectedPredicted = calibration_curve(observed, predicted, n_bins = bins, strategy = strategy)
+    np.testing.assert_allclose(table['predicted'], expectedPredicted, rtol = 1e-12)
+    np.testing.assert_allclose(table['observed'], expectedObserved, rtol = 1e-12)
+    assert table['matches'].sum() == len(predicted)
+
+
+#by default the uniform bins span the minimum and maximum prediction instead of (0, 1)
+def test_defaultUniformBinsSpanThePredictions():
+    predicted, observed = createPredictions()
+    default = Calibration(10, 'uniform').calculateReliabilityTable(predicted, observed)
+    spanned = Calibration(10, 'uniform', (predicted.min(), predicted.max())).calculateReliabilityTable(predicted, observed)
+    pd.testing.assert_frame_equal(default, spanned)
+    expectedObserved, expectedPredicted = calibration_curve(observed, predicted, n_bins = 10, strategy = 'uniform')
+    assert len(default) != len(expectedPredicted) or not np.allclose(default['predicted'], expectedPredicted)
+
+
+#bins including their lower edge equal the means of binned_statistic (e.g. for anticipated goals on a grid of 0.25 with values on the edges)
+def test_leftClosedBinsEqualBinnedStatistic():
+    rng = np.random.default_rng(1)
+    predicted = np.clip(np.round(rng.gamma(4, 0.35, 1000) * 4) / 4, 0, 4)
+    observed = rng.poisson(predicted).astype(float)
+    edges = np.linspace(0, 4, 17)
+    table = Calibration(16, 'uniform', (0, 4), rightClosed = False).calculateReliabilityTable(predicted, observed)
+    meansPredicted, _, binNumbers = binned_statistic(predicted, predicted, 'mean', bins = edges)
+    meansObserved = binned_statistic(predicted, observed, 'mean', bins = edges)[0]
+    counts = binned_statistic(predicted, observed, 'count', bins = edges)[0]
+    nonEmpty = counts > 0
+    np.testing.assert_array_equal(table['bin'], np.flatnonzero(nonEmpty))
+    np.testing.assert_allclose(table['predicted'], meansPredicted[nonEmpty], rtol = 1e-12)
+    np.testing.assert_allclose(table['observed'], meansObserved[nonEmpty], rtol = 1e-12)
+    np.testing.assert_array_equal(table['matches'], counts[nonEmpty])
+    #with bins including their upper edge, predictions on inner edges move to the lower bin
+    rightClosed = Calibration(16, 'uniform', (0, 4)).calculateReliabilityTable(predicted, observed)
+    assert np.isin(predicted, edges[1:-1]).any() and not np.array_equal(rightClosed['matches'], table['matches'])
+
+
+def test_summaryErrors():
+    predicted, observed = createPredictions()
+    data = pd.DataFrame({'probHome': predicted, 'home': observed, 'league': np.tile(['A1', 'B1'], 1000)})
+    calibration = Calibration(10)
+    reliability = calibration.calculateReliability({'shin': data, 'basic': data.assign(probHome = data['probHome'] * 0.8)}, {'home': ('probHome', 'home')}, ['league'])
+    summary = calibration.summariseReliability(reliability).set_index(['method', 'league', 'prediction']).sort_index()
+    for (method, league, prediction), row in summary.iterrows():
+        table = reliability[(reliability['method'] == method) & (reliability['league'] == league)]
+        errors = np.abs(table['predicted'] - table['observed'])
+        assert np.isclose(row['ece'], np.sum(errors * table['matches']) / table['matches'].sum())
+        assert np.isclose(row['mce'], errors.max())
+        assert row['matches'] == 1000
+    #down-scaled probabilities are worse calibrated
+    assert (summary.loc['basic', 'ece'].to_numpy() > summary.loc['shin', 'ece'].to_numpy()).all()
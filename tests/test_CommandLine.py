@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Smoke tests of the command-line entry point (help of all subcommands, no heavy imports at start-up) and of the plot subcommand
+"""
+
+import os
+import sys
+import types
+import importlib.util
+import subprocess
+import pytest
+
+
+repositoryDirectory = os.path.join(os.path.dirname(__file__), '..')
+subcommands = ['import', 'averages', 'probabilities', 'anticipated-goals', 'markets', 'elo', 'evaluate', 'plot', 'benchmark']
+
+
+#the entry point __main__.py as a module (without running main)
+@pytest.fixture(scope = 'module')
+def commandLine():
+    spec = importlib.util.spec_from_file_location('commandLine', os.path.join(repositoryDirectory, '__main__.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+#runs the repository as in the README (python BettingOddsPerformanceAnalysis ...)
+@pytest.mark.parametrize('subcommand', subcommands)
+def test_helpOfAllSubcommands(subcommand):
+    result = subprocess.run([sys.executable, repositoryDirectory, subcommand, '--help'], capture_output = True, text = True, timeout = 60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.startswith('usage:') and subcommand in result.stdout
+
+
+def test_parserOfAllSubcommands(commandLine):
+    parser = commandLine.createParser()
+    assert set(parser._subparsers._group_actions[0].choices) == set(subcommands)
+    arguments = parser.parse_args(['anticipated-goals', '--input', 'in.csv', '--output', 'out.csv', '--method', 'walkForward', '--forgetting', '0.99'])
+    assert arguments.function == commandLine.runAnticipatedGoals and arguments.forgetting == 0.99
+    with pytest.raises(SystemExit):
+        parser.parse_args(['plot', '--analysis', 'unknown'])
+
+
+#the help of a subcommand imports none of the heavy modules (see the docstring of __main__.py)
+def test_helpImportsNoHeavyModules():
+    code = ("import sys, runpy\n"
+            "sys.argv = ['BettingOddsPerformanceAnalysis', 'plot', '--help']\n"
+            "try:\n"
+            "    runpy.run_path(" + repr(repositoryDirectory) + ", run_name = '__main__')\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "print(sorted({name.split('.')[0] for name in sys.modules} & {'pandas', 'matplotlib', 'scipy', 'sklearn', 'statsmodels'}))\n")
+    result = subprocess.run([sys.executable, '-c', code], capture_output = True, text = True, timeout = 60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith('[]')
+
+
+#the analysis runs on the given input folder and mapping, its figures are saved and plt.show is restored afterwards (also if the analysis fails)
+@pytest.mark.parametrize('fails', [False, True])
+def test_plotSavesFiguresAndRestoresShow(commandLine, monkeypatch, tmp_path, fails):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    calls = []
+    def runAnalysis(root, mapping):
+        calls.append((root, mapping))
+        plt.figure()
+        plt.plot([0, 1], [1, 0])
+        plt.show()
+        if(fails):
+            raise RuntimeError("analysis failed")
+    monkeypatch.setitem(sys.modules, 'AnalysisTest', types.SimpleNamespace(runAnalysis = runAnalysis))
+    monkeypatch.setitem(commandLine.analyses, 'test', 'AnalysisTest')
+    show = plt.show
+    arguments = commandLine.createParser().parse_args(['plot', '--analysis', 'winner', '--root', str(tmp_path / 'input'), '--mapping', 'mapping.csv', '--output', str(tmp_path / 'figures')])
+    arguments.analysis = 'test'
+    if(fails):
+        with pytest.raises(RuntimeError):
+            commandLine.runPlot(arguments)
+    else:
+        commandLine.runPlot(arguments)
+    assert plt.show is show
+    assert calls == [(str(tmp_path / 'input'), 'mapping.csv')]
+    assert os.listdir(tmp_path / 'figures') == ['test_1.png']
+
+
+#importing an analysis script does not build its pipeline (only runAnalysis does)
+@pytest.mark.parametrize('analysis', ['AnalysisCalibration', 'AnalysisShotsSuccess', 'AnalysisWinnerPrediction'])
+def test_analysisImportBuildsNoPipeline(analysis, monkeypatch):
+    import DataPipeline
+    def createStandardPipeline(*args, **kwargs):
+        raise AssertionError("pipeline built at import")
+    monkeypatch.setattr(DataPipeline, 'createStandardPipeline', createStandardPipeline)
+    monkeypatch.delitem(sys.modules, analysis, raising = False)
+    module = importlib.import_module(analysis)
+    assert not hasattr(module, 'pipeline')
+    monkeypatch.delitem(sys.modules, analysis)
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Tests of the folds of CrossFitting and of the cross-fitted regressions against the former fits on both halves of the data
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+from statsmodels.miscmodels.ordinal_model import OrderedModel
+from sklearn import linear_model
+from conftest import streamSyntheticFiles
+from bettingCalculationTools.CrossFitting import CrossFitting
+from bettingCalculationTools.ProbabilityCalculation import LogisticRegression, fitOrderedModelFold, fitLogitFold
+from bettingCalculationTools.AnticipatedGoalsCalculation import Regression, fitRegressionFold
+
+
+oddsColumns = ['oddsHome', 'oddsDraw', 'oddsAway', 'oddsUnder25', 'oddsOver25']
+
+
+@pytest.fixture(scope = 'module')
+def matches(syntheticDirectory):
+    data = pd.concat(streamSyntheticFiles(syntheticDirectory), ignore_index = True)
+    data.sort_values(by = ['date', 'teamHome', 'teamAway'], inplace = True)
+    return data.reset_index(drop = True)
+
+
+#anticipated goals of the former regressions, fitted on one half of the data (split at int(len*0.5)) and predicted for the other half
+def calculateFormerRegression(data, regressionType):
+    row = int(len(data) * 0.5)
+    halves = [data.iloc[:row], data.iloc[row:]]
+    predictions = []
+    for fit, predict in [(1, 0), (0, 1)]:
+        goals = []
+        for target in ['goalsHome', 'goalsAway']:
+            regression = linear_model.PoissonRegressor() if regressionType == 'poisson' else linear_model.LinearRegression()
+            regression.fit(halves[fit][oddsColumns], halves[fit][target])
+            goals.append(regression.predict(halves[predict][oddsColumns]))
+        predictions.append(np.column_stack(goals))
+    return np.vstack(predictions)
+
+
+#probabilities of the former (ordered) logistic regressions on both halves (split at floor(len/2))
+def calculateFormerLogisticRegression(data):
+    data = data.assign(winner = np.select([data['goalsHome'] > data['goalsAway'], data['goalsHome'] == data['goalsAway']], [2, 1], 0),
+                       over25 = (data['goalsHome'] + data['goalsAway'] > 2).astype(int))
+    halves = [data.iloc[:len(data) // 2], data.iloc[len(data) // 2:]]
+    probabilitiesHDA = []
+    probabilitiesOU = []
+    for fit, predict in [(1, 0), (0, 1)]:
+        regression = OrderedModel(halves[fit]['winner'], halves[fit][['oddsHome', 'oddsDraw', 'oddsAway']]).fit(method = 'bfgs', disp = False)
+        probabilitiesHDA.append(np.asarray(regression.predict(halves[predict][['oddsHome', 'oddsDraw', 'oddsAway']])))
+        regression = sm.Logit(halves[fit]['over25'], halves[fit][['oddsOver25', 'oddsUnder25']]).fit(disp = False)
+        probabilitiesOU.append(np.asarray(regression.predict(halves[predict][['oddsOver25', 'oddsUnder25']])))
+    return np.vstack(probabilitiesHDA), np.concatenate(probabilitiesOU)
+
+
+@pytest.mark.parametrize('number', [10, 11, 180])
+def test_defaultFoldsAreTheFormerHalves(number):
+    folds = CrossFitting().assignFolds(pd.DataFrame(index = range(number)))
+    np.testing.assert_array_equal(folds, np.arange(number) >= int(number * 0.5))
+
+
+def test_timeOrderedFoldsAreConsecutiveBlocks():
+    np.testing.assert_array_equal(CrossFitting(folds = 3).assignFolds(pd.DataFrame(index = range(10))), [0, 0, 0, 1, 1, 1, 2, 2, 2, 2])
+    folds = CrossFitting(folds = 7).assignFolds(pd.DataFrame(index = range(100)))
+    assert (np.diff(folds) >= 0).all()
+    assert set(np.bincount(folds)) == {14, 15}
+
+
+def test_leaveOneSeasonOutFolds():
+    data = pd.DataFrame({'season': ['2001/2002', '2000/2001', '2001/2002', '2002/2003', '2000/2001']})
+    np.testing.assert_array_equal(CrossFitting('leaveOneSeasonOut').assignFolds(data), [1, 0, 1, 2, 0])
+    with pytest.raises(ValueError):
+        CrossFitting('leaveOneSeasonOut').fitPredict(data.iloc[[1, 4]], fitRegressionFold, np.ones((2, 1)), np.ones((2, 1)), 'linear')
+    with pytest.raises(ValueError):
+        CrossFitting('random')
+
+
+#linear regressions equal the former fits, the Poisson fit of the second half is warm-started from the first half and stops at a slightly different point within the tolerance of the solver
+@pytest.mark.parametrize('regressionType, tolerance', [('linear', 1e-10), ('poisson', 1e-3)])
+def test_defaultRegressionEqualsFormerHalves(matches, regressionType, tolerance):
+    result = Regression(regressionType).addAnticipatedGoals(matches.copy())
+    expected = calculateFormerRegression(matches, regressionType)
+    np.testing.assert_allclose(result[['anticipatedGoalsHome', 'anticipatedGoalsAway']].to_numpy(), expected, atol = tolerance)
+
+
+def test_defaultLogisticRegressionEqualsFormerHalves(matches):
+    result = LogisticRegression().addProbabilities(matches)
+    expectedHDA, expectedOU = calculateFormerLogisticRegression(matches)
+    np.testing.assert_allclose(result[['probAway', 'probDraw', 'probHome']].to_numpy(), expectedHDA, atol = 1e-4)
+    np.testing.assert_allclose(result['probOver25'], expectedOU, atol = 1e-4)
+
+
+#warm-started fits converge to the same models as cold fits (within the tolerance of the solvers, e.g. tol = 1e-4 of PoissonRegressor)
+@pytest.mark.parametrize('fitPredictFold, columns, target, arguments', [(fitRegressionFold, oddsColumns, ['goalsHome', 'goalsAway'], ('poisson',)),
+                                                                      (fitOrderedModelFold, ['oddsHome', 'oddsDraw', 'oddsAway'], 'result', ()),
+                                                                      (fitLogitFold, ['oddsOver25', 'oddsUnder25'], 'over25', ())], ids = ['poisson', 'orderedModel', 'logit'])
+def test_warmStartedFitsEqualColdFits(matches, fitPredictFold, columns, target, arguments):
+    data = matches.assign(result = np.select([matches['goalsHome'] > matches['goalsAway'], matches['goalsHome'] == matches['goalsAway']], [2, 1], 0),
+                          over25 = (matches['goalsHome'] + matches['goalsAway'] > 2).astype(int))
+    features = data[columns].to_numpy(dtype = float)
+    targets = data[target].to_numpy()
+    first, second = np.arange(len(data)) < 90, np.arange(len(data)) >= 90
+    startPredictions, startParameters = fitPredictFold(features[second], targets[second], features[first], None, *arguments)
+    cold, coldParameters = fitPredictFold(features[first], targets[first], features[second], None, *arguments)
+    warm, warmParameters = fitPredictFold(features[first], targets[first], features[second], startParameters, *arguments)
+    np.testing.assert_allclose(np.asarray(warm, dtype = float), np.asarray(cold, dtype = float), atol = 1e-3)
+
+
+#the folds after the first are fitted in a process pool with several workers, all of them are warm-started from the first fold, so the number of workers does not change the results
+@pytest.mark.parametrize('scheme, folds', [('timeOrdered', 4), ('leaveOneSeasonOut', 2)])
+def test_parallelFitsEqualSerialFits(matches, scheme, folds):
+    goals = matches[['goalsHome', 'goalsAway']]
+    serial = CrossFitting(scheme, folds, workers = 1).fitPredict(matches, fitRegressionFold, matches[oddsColumns], goals, 'poisson')
+    parallel = CrossFitting(scheme, folds, workers = 2).fitPredict(matches, fitRegressionFold, matches[oddsColumns], goals, 'poisson')
+    np.testing.assert_array_equal(parallel, serial)
+    assert not np.isnan(serial).any()
+    #every fold is predicted by a model fitted without it
+    foldIds = CrossFitting(scheme, folds).assignFolds(matches)
+    for fold in np.unique(foldIds):
+        expected, parameters = fitRegressionFold(matches.loc[foldIds != fold, oddsColumns].to_numpy(dtype = float), goals[foldIds != fold].to_numpy(), matches.loc[foldIds == fold, oddsColumns].to_numpy(dtype = float), None, 'poisson')
+        np.testing.assert_allclose(serial[foldIds == fold], expected, atol = 1e-3)
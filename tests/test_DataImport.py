@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Tests of the import of synthetic input files with and without the import cache and with several threads
+"""
+
+import os
+import time
+import logging
+import pandas as pd
+import pytest
+from conftest import mapping, missingDataAllowed
+from bettingCalculationTools import DataImport
+from bettingCalculationTools.DataImport import DataImporter
+
+
+#the mapping is parsed once per import (and once more for the seasons of the files), not once per file
+def test_mappingIsParsedOncePerImport(syntheticDirectory, tmp_path, monkeypatch):
+    pytest.importorskip('pyarrow')
+    readMapping = DataImporter.readMapping
+    readCachedInputFile = DataImporter.readCachedInputFile
+    calls = []
+    monkeypatch.setattr(DataImporter, 'readMapping', lambda mapping: calls.append(mapping) or readMapping(mapping))
+    monkeypatch.setattr(DataImporter, 'readCachedInputFile', lambda *arguments, **keywords: readCachedInputFile(*arguments, directory = str(tmp_path), **keywords))
+    
+    frames = {}
+    for cache in [False, True, True]:
+        calls.clear()
+        frames[cache] = pd.concat(DataImporter.streamAllFiles(syntheticDirectory, mapping, missingDataAllowed = missingDataAllowed, by = 'season', cache = cache, compact = False), ignore_index = True)
+        assert len(calls) == 2
+    assert len(os.listdir(str(tmp_path))) == len(DataImporter.listInputFiles(syntheticDirectory))
+    pd.testing.assert_frame_equal(frames[True], frames[False])
+
+
+#files are read by several threads, the rows are concatenated in the order of the files (the first files finish last here) as in a serial import
+def test_parallelImportEqualsSerialImport(syntheticDirectory, monkeypatch):
+    filenames = DataImporter.listInputFiles(syntheticDirectory)
+    readInputFile = DataImporter.readInputFile
+    def readInputFileSlowly(file, *arguments):
+        time.sleep(0.02 * (len(filenames) - filenames.index(file)))
+        return readInputFile(file, *arguments)
+    monkeypatch.setattr(DataImporter, 'readInputFile', readInputFileSlowly)
+    serial = DataImporter.inputAllFiles(syntheticDirectory, mapping, missingDataAllowed = missingDataAllowed, workers = 1, cache = False)
+    parallel = DataImporter.inputAllFiles(syntheticDirectory, mapping, missingDataAllowed = missingDataAllowed, workers = 4, cache = False)
+    pd.testing.assert_frame_equal(parallel, serial)
+    expected = pd.concat([readInputFile(filename, DataImporter.readMapping(mapping)) for filename in filenames], ignore_index = True)
+    pd.testing.assert_frame_equal(serial, DataImporter.removeMissingData(expected, missingDataAllowed))
+
+
+#without pyarrow the import cache is skipped with a warning and the files are read directly
+def test_importWithoutPyarrowSkipsTheCache(syntheticDirectory, monkeypatch, caplog):
+    monkeypatch.setattr(DataImport, 'importCacheAvailable', False)
+    monkeypatch.setattr(DataImporter, 'readCachedInputFile', lambda *arguments, **keywords: pytest.fail("the cache is not used without pyarrow"))
+    with caplog.at_level(logging.WARNING, logger = DataImport.__name__):
+        data = DataImporter.inputAllFiles(syntheticDirectory, mapping, missingDataAllowed = missingDataAllowed, cache = True)
+    assert 'import cache is disabled' in caplog.text
+    pd.testing.assert_frame_equal(data, DataImporter.inputAllFiles(syntheticDirectory, mapping, missingDataAllowed = missingDataAllowed, cache = False))
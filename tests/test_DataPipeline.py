@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Tests of the caching of the stages of DataPipeline (keys, cache directory and memory cache)
+"""
+
+import importlib
+import pandas as pd
+import DataPipeline
+from DataPipeline import DataPipeline as Pipeline, PipelineStage
+
+
+calls = []
+
+def createData(size):
+    calls.append('data')
+    return pd.DataFrame({'goals': range(size)})
+
+def doubleGoals(data):
+    calls.append('double')
+    return data.assign(doubleGoals = 2 * data['goals'])
+
+
+def createPipeline(directory, version = 1, size = 3):
+    return Pipeline([PipelineStage('data', createData, [], {'size': size}, ['goals']),
+                     PipelineStage('double', doubleGoals, ['data'], {}, ['doubleGoals'], version = version)], directory = str(directory))
+
+
+def test_stagesAreLoadedFromTheCache(tmp_path):
+    DataPipeline.memoryCache.clear()
+    calls.clear()
+    first = createPipeline(tmp_path).obtain('double')
+    DataPipeline.memoryCache.clear()
+    second = createPipeline(tmp_path).obtain('double')
+    pd.testing.assert_frame_equal(first, second)
+    assert calls == ['data', 'double']
+
+
+#changed parameters of a stage and changed versions of the calculation execute the stage (and only this stage) again
+def test_changedStagesAreExecutedAgain(tmp_path):
+    DataPipeline.memoryCache.clear()
+    calls.clear()
+    createPipeline(tmp_path).obtain('double')
+    DataPipeline.memoryCache.clear()
+    createPipeline(tmp_path, version = 2).obtain('double')
+    assert calls == ['data', 'double', 'double']
+    DataPipeline.memoryCache.clear()
+    assert len(createPipeline(tmp_path, version = 2, size = 4).obtain('double').index) == 4
+    assert calls == ['data', 'double', 'double', 'data', 'double']
+
+
+def test_keysDependOnTheSourceOfTheStages(tmp_path):
+    pipeline = createPipeline(tmp_path)
+    stage = pipeline.stages['double']
+    key = pipeline.calculateKey(stage, ['hash'])
+    stage.function = createData
+    assert pipeline.calculateKey(stage, ['hash']) != key
+
+
+#the modules of the calculations of the standard stages are part of their keys
+def test_modulesOfTheStandardStages():
+    pipeline = DataPipeline.createStandardPipeline('input', 'mapping.csv')
+    modules = {name: [module.__name__ for module in Pipeline.findModules(stage.function)] for name, stage in pipeline.stages.items()}
+    assert 'AverageCalculation' in modules['averages']
+    assert 'bettingCalculationTools.ProbabilityCalculation' in modules['shin']
+    assert {'bettingCalculationTools.AnticipatedGoalsCalculation', 'bettingCalculationTools.ProbabilityModelling', 'bettingCalculationTools.Markets'} <= set(modules['invertedPoisson'])
+    assert 'EloModel' in modules['elo']
+    assert 'DataPipeline' not in modules['shin']
+
+
+#a changed calculation in a module used by a stage changes the key, even though the function of the stage is unchanged
+def test_keysDependOnTheModulesUsedByTheStages(tmp_path, monkeypatch):
+    (tmp_path / 'stageCalculation.py').write_text("def calculate(data):\n    return data\n")
+    (tmp_path / 'stageFunctions.py').write_text("import stageCalculation\n\ndef addGoals(data):\n    return stageCalculation.calculate(data)\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(DataPipeline, 'sourceDirectory', str(tmp_path))
+    stageFunctions = importlib.import_module('stageFunctions')
+    pipeline = Pipeline([PipelineStage('goals', stageFunctions.addGoals, [], {}, [])], directory = str(tmp_path / 'cache'))
+    key = pipeline.calculateKey(pipeline.stages['goals'], [])
+    assert [module.__name__ for module in Pipeline.findModules(stageFunctions.addGoals)] == ['stageCalculation']
+    (tmp_path / 'stageCalculation.py').write_text("def calculate(data):\n    return 2 * data\n")
+    assert pipeline.calculateKey(pipeline.stages['goals'], []) != key
+
+
+#the memory cache keeps the results used last only
+def test_memoryCacheIsLimited(tmp_path, monkeypatch):
+    DataPipeline.memoryCache.clear()
+    monkeypatch.setattr(DataPipeline, 'memoryCacheSize', 1)
+    calls.clear()
+    first = createPipeline(tmp_path).obtain('double')
+    assert len(DataPipeline.memoryCache) == 1
+    pd.testing.assert_frame_equal(createPipeline(tmp_path, size = 4).obtain('double').iloc[:3], first)
+    assert len(DataPipeline.memoryCache) == 1
+    assert calls == ['data', 'double', 'data', 'double']
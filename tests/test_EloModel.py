@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Regression tests of the Elo ratings and the promotion/relegation flags on leagues with three divisions and on the synthetic input files of SyntheticDataGenerator, the expected values were calculated by the former loop over all matches
+"""
+
+import pandas as pd
+import pytest
+from conftest import createLeagues, streamSyntheticFiles
+from EloModel import EloRating
+
+
+@pytest.fixture(scope = 'module')
+def ratings():
+    return EloRating().calculateRating(createLeagues(divisions = 3, teams = 6, seasons = 4, relegated = 2, seed = 1), 25, 80)
+
+
+def test_eloRatingsEqualFormerLoop(ratings):
+    assert len(ratings.index) == 360
+    assert ratings['eloHome'].sum() == pytest.approx(358785.31348558207, rel = 1e-12)
+    assert ratings['eloAway'].sum() == pytest.approx(360165.84573222004, rel = 1e-12)
+    assert (ratings['eloHome']**2).sum() == pytest.approx(358934654.58860385, rel = 1e-12)
+
+
+def test_promotionRelegationFlagsEqualFormerLoop(ratings):
+    assert ratings['leagueChangeHome'].value_counts().to_dict() == {0: 314, 2: 21, -1: 16, -2: 5, 1: 4}
+    assert ratings['leagueChangeAway'].value_counts().to_dict() == {0: 322, -1: 14, 2: 9, 1: 8, -2: 7}
+
+
+@pytest.fixture(scope = 'module')
+def syntheticRatings(syntheticDirectory):
+    data = pd.concat(streamSyntheticFiles(syntheticDirectory), ignore_index = True)
+    return EloRating().calculateRating(data, 25, 80)
+
+
+def test_eloRatingsOfSyntheticFilesEqualFormerLoop(syntheticRatings):
+    assert len(syntheticRatings.index) == 180
+    assert syntheticRatings['eloHome'].sum() == pytest.approx(176505.58691078698, rel = 1e-12)
+    assert syntheticRatings['eloAway'].sum() == pytest.approx(178926.22509070596, rel = 1e-12)
+    assert (syntheticRatings['eloHome']**2).sum() == pytest.approx(176273664.22317094, rel = 1e-12)
+    assert syntheticRatings['leagueChangeHome'].value_counts().to_dict() == {0: 164, 2: 7, -1: 7, -2: 2}
+    assert syntheticRatings['leagueChangeAway'].value_counts().to_dict() == {0: 160, 2: 9, -1: 9, 1: 2}
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Tests of the instrumented decorator (measurements, peak memory of nested calls, calls without sinks) and of all sinks
+"""
+
+import json
+import time
+import logging
+import threading
+import tracemalloc
+import numpy as np
+import pandas as pd
+import pytest
+from bettingCalculationTools import Instrumentation
+from bettingCalculationTools.Instrumentation import instrumented, InstrumentationContext, MemoryCollector, JsonFileSink, LoggingSink
+
+
+#calculator with a type as the calculators of ProbabilityCalculation and AnticipatedGoalsCalculation
+class Calculator:
+
+    def __init__(self):
+        self.type = 'test'
+
+    @instrumented('probabilities')
+    def addProbabilities(self, data):
+        time.sleep(0.01)
+        return data.assign(prob = 0.5)
+
+    @instrumented('metrics')
+    def scoreMatches(self, data, weights = None):
+        return float(data['goals'].mean())
+
+
+@instrumented('allocation')
+def allocate(megabytes, inner = 0):
+    values = np.ones(int(megabytes * 2**20 / 8))
+    if(inner > 0):
+        allocate(inner)
+    return float(values.sum())
+
+
+@instrumented('failure')
+def fail(exception):
+    raise exception
+
+
+@pytest.fixture
+def data():
+    return pd.DataFrame({'goals': np.arange(50)})
+
+
+#without sinks the functions are called directly and their results and exceptions are passed through unchanged
+def test_noSinksPassThrough(data, monkeypatch):
+    def measureCall(*args):
+        raise AssertionError("measured without sinks")
+    monkeypatch.setattr(Instrumentation, 'measureCall', measureCall)
+    assert Instrumentation.sinks == []
+    calculator = Calculator()
+    result = calculator.addProbabilities(data)
+    pd.testing.assert_frame_equal(result, data.assign(prob = 0.5))
+    assert calculator.scoreMatches(data) == 24.5
+    exception = KeyError('goalsHome')
+    with pytest.raises(KeyError) as raised:
+        fail(exception)
+    assert raised.value is exception
+    assert Calculator.addProbabilities.__name__ == 'addProbabilities' and Calculator.addProbabilities.__qualname__ == 'Calculator.addProbabilities'
+
+
+def test_measurementFields(data):
+    calculator = Calculator()
+    with InstrumentationContext(MemoryCollector()) as collector:
+        result = calculator.addProbabilities(data)
+        score = calculator.scoreMatches(weights = None, data = data.iloc[:20])
+        with pytest.raises(ValueError):
+            fail(ValueError("no measurement"))
+    assert Instrumentation.sinks == []
+    pd.testing.assert_frame_equal(result, data.assign(prob = 0.5))
+    assert score == 9.5
+    measurements = collector.toDataFrame()
+    #failed calls are not recorded
+    assert list(measurements['function']) == ['Calculator.addProbabilities', 'Calculator.scoreMatches']
+    assert list(measurements['stage']) == ['probabilities', 'metrics']
+    assert list(measurements['type']) == ['test', 'test']
+    #rows of the returned dataframe, otherwise of the first dataframe given as argument
+    assert list(measurements['rows']) == [50, 20]
+    first = collector.measurements[0]
+    assert first['wallSeconds'] >= 0.01 and first['cpuSeconds'] >= 0
+    assert first['rowsPerSecond'] == pytest.approx(50 / first['wallSeconds'])
+    assert first['peakMemoryMB'] is None and first['thread'] == threading.main_thread().name
+    assert set(first) == {'stage', 'function', 'type', 'wallSeconds', 'cpuSeconds', 'rows', 'rowsPerSecond', 'peakMemoryMB', 'thread', 'time'}
+
+
+#the peak of a call includes the peaks of its nested calls, even if they were reached before the own allocations of the call
+def test_peakMemoryOfNestedCalls():
+    tracing = tracemalloc.is_tracing()
+    with InstrumentationContext(MemoryCollector(), traceMemory = True) as collector:
+        allocate(4, inner = 16)
+        allocate(2)
+        thread = threading.Thread(target = allocate, args = (2,))
+        thread.start()
+        thread.join()
+    assert tracemalloc.is_tracing() == tracing
+    inner, outer, single, other = collector.measurements
+    assert inner['peakMemoryMB'] == pytest.approx(16, rel = 0.05)
+    assert outer['peakMemoryMB'] >= 20 * 0.95
+    assert single['peakMemoryMB'] == pytest.approx(2, rel = 0.05)
+    #memory is only traced on the main thread
+    assert other['peakMemoryMB'] is None and other['thread'] != threading.main_thread().name
+
+
+def test_jsonFileSink(data, tmp_path):
+    file = tmp_path / 'profiles' / 'profile.jsonl'
+    with InstrumentationContext(MemoryCollector(), JsonFileSink(str(file))) as (collector, sink):
+        Calculator().addProbabilities(data)
+        Calculator().scoreMatches(data)
+    lines = file.read_text().splitlines()
+    assert [json.loads(line) for line in lines] == collector.measurements
+    #further runs are appended
+    with InstrumentationContext(JsonFileSink(str(file))):
+        Calculator().scoreMatches(data)
+    assert len(file.read_text().splitlines()) == 3
+
+
+def test_loggingSink(data, caplog):
+    logger = logging.getLogger('bettingCalculationTools.test')
+    with caplog.at_level(logging.DEBUG, logger = 'bettingCalculationTools'):
+        with InstrumentationContext(LoggingSink()):
+            Calculator().addProbabilities(data)
+        with InstrumentationContext(LoggingSink(logger, logging.DEBUG)):
+            Calculator().scoreMatches(data)
+    first, second = caplog.records
+    assert first.name == 'bettingCalculationTools' and first.levelno == logging.INFO
+    assert first.getMessage().startswith('probabilities (Calculator.addProbabilities): ') and first.getMessage().endswith(' s CPU, 50 rows')
+    assert first.measurement['rows'] == 50
+    assert second.name == 'bettingCalculationTools.test' and second.levelno == logging.DEBUG and second.measurement['stage'] == 'metrics'
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Tests of the inversion of the models of ProbabilityModelling for the standard and further markets, also with missing markets
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import createMarketMatches
+from bettingCalculationTools.AnticipatedGoalsCalculation import InvertedPoisson
+from bettingCalculationTools.ProbabilityModelling import PoissonModel
+
+
+#the nearest neighbours of the KD-tree are the cells of the smallest sum of squared differences found match by match before
+def test_nearestNeighboursEqualSearchOfSingleMatches():
+    model = PoissonModel()
+    table = model.calculateTable(step = 0.1)
+    rng = np.random.default_rng(1)
+    probabilities = model.calculateOutcomeProbabilities(rng.uniform(0.3, 3, 40), rng.uniform(0.3, 3, 40)) + rng.normal(0, 0.01, (40, 5))
+    antHome, antAway = model.obtainAllAnticipatedGoals(table, probabilities)
+    for match in range(40):
+        expected = model.obtainAnticipatedGoals(table, pd.Series(probabilities[match], index = model.probabilityColumns))
+        assert (antHome[match], antAway[match]) == pytest.approx(expected)
+
+
+standardMarkets = [('home',), ('draw',), ('away',), ('over', 2.5), ('under', 2.5)]
+
+
+def test_defaultMarketsEqualStandardInversion(tmp_path):
+    data, antHome, antAway = createMarketMatches(standardMarkets)
+    for continuous in [False, True]:
+        standard = InvertedPoisson(step = 0.1, tableDirectory = str(tmp_path), continuous = continuous).addAnticipatedGoals(data)
+        markets = InvertedPoisson(step = 0.1, tableDirectory = str(tmp_path), continuous = continuous, markets = standardMarkets).addAnticipatedGoals(data)
+        np.testing.assert_allclose(markets['anticipatedGoalsHome'], standard['anticipatedGoalsHome'], atol = 1e-6)
+        np.testing.assert_allclose(markets['anticipatedGoalsAway'], standard['anticipatedGoalsAway'], atol = 1e-6)
+    np.testing.assert_allclose(standard['anticipatedGoalsHome'], antHome, atol = 1e-6)
+    np.testing.assert_allclose(standard['anticipatedGoalsAway'], antAway, atol = 1e-6)
+
+
+def test_continuousInversionOfFurtherMarkets(tmp_path):
+    markets = standardMarkets + [('over', 1.5), ('under', 1.5), ('asianHandicapHome', -0.25), ('asianHandicapAway', 0.25), ('bothScore',)]
+    data, antHome, antAway = createMarketMatches(markets)
+    data.iloc[::3, :3] = np.nan
+    data.iloc[1::3, 3:7] = np.nan
+    result = InvertedPoisson(step = 0.1, tableDirectory = str(tmp_path), continuous = True, markets = markets, weights = {'probHome': 2.0}).addAnticipatedGoals(data)
+    np.testing.assert_allclose(result['anticipatedGoalsHome'], antHome, atol = 1e-6)
+    np.testing.assert_allclose(result['anticipatedGoalsAway'], antAway, atol = 1e-6)
+
+
+#matches with only over/under or only the home win identify a single combination of the anticipated goals, which must not break the other matches
+def test_continuousInversionWithUnidentifiedMatches(tmp_path):
+    data, antHome, antAway = createMarketMatches(standardMarkets, 30)
+    data.loc[:4, ['probHome', 'probDraw', 'probAway']] = np.nan
+    data.loc[5:9, ['probDraw', 'probAway', 'probOver25', 'probUnder25']] = np.nan
+    model = PoissonModel()
+    for weights in [{'probOver25': 1.0}, {}]:
+        grid = InvertedPoisson(step = 0.1, tableDirectory = str(tmp_path), weights = weights).addAnticipatedGoals(data)
+        result = InvertedPoisson(step = 0.1, tableDirectory = str(tmp_path), continuous = True, weights = weights).addAnticipatedGoals(data)
+        assert result[['anticipatedGoalsHome', 'anticipatedGoalsAway']].notna().all().all()
+        fitted = model.calculateOutcomeProbabilities(result['anticipatedGoalsHome'].to_numpy(), result['anticipatedGoalsAway'].to_numpy())
+        np.testing.assert_allclose(fitted[:5,3], data['probOver25'][:5], atol = 1e-8)
+        np.testing.assert_allclose(fitted[5:10,0], data['probHome'][5:10], atol = 1e-8)
+        #the unidentified direction stays close to the start on the grid
+        assert (np.abs(result['anticipatedGoalsHome'] - grid['anticipatedGoalsHome'])[:10] < 0.5).all()
+        np.testing.assert_allclose(result['anticipatedGoalsHome'][10:], antHome[10:], atol = 1e-6)
+        np.testing.assert_allclose(result['anticipatedGoalsAway'][10:], antAway[10:], atol = 1e-6)
+
+
+def test_unknownWeightColumnsAreRejected(tmp_path):
+    data, _, _ = createMarketMatches(standardMarkets, 5)
+    with pytest.raises(ValueError):
+        InvertedPoisson(step = 0.1, tableDirectory = str(tmp_path), weights = {'probOver2.5': 2.0}).addAnticipatedGoals(data)
+
+
+def test_marketTablesAreCachedByMarkets(tmp_path):
+    model = PoissonModel()
+    aggregator = model.createMarketAggregator(standardMarkets + [('bothScore',)])
+    table = model.obtainMarketTable(aggregator, step = 0.25, directory = str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == 1
+    pd.testing.assert_frame_equal(model.obtainMarketTable(aggregator, step = 0.25, directory = str(tmp_path)), table)
+    pd.testing.assert_frame_equal(table, model.calculateMarketTable(aggregator, step = 0.25))
+    model.obtainMarketTable(model.createMarketAggregator(standardMarkets), step = 0.25, directory = str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == 2
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Tests of the weights and probabilities of the derived markets of MarketAggregator
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from bettingCalculationTools.Markets import MarketAggregator
+from bettingCalculationTools.ProbabilityModelling import DixonColesModel
+
+
+model = DixonColesModel(-0.1)
+scoreMatrices = model.calculateProbabilities(np.array([0.4, 1.3, 2.7]), np.array([1.1, 0.8, 0.3]))
+
+
+def test_standardMarketsEqualSummarisedProbabilities():
+    aggregator = model.createMarketAggregator([('home',), ('draw',), ('away',), ('over', 2.5), ('under', 2.5)])
+    np.testing.assert_allclose(aggregator.calculateMarketProbabilities(scoreMatrices), model.summariseProbabilities(scoreMatrices), atol = 1e-15)
+    assert aggregator.columns == model.probabilityColumns
+
+
+#quarter lines split the stake on the neighbouring lines
+@pytest.mark.parametrize('kind', ['over', 'under', 'asianHandicapHome', 'asianHandicapAway'])
+@pytest.mark.parametrize('line', [-1.25, -0.75, -0.25, 0.25, 0.75, 2.25])
+def test_quarterLinesAreAveragesOfNeighbouringLines(kind, line):
+    aggregator = MarketAggregator([(kind, line), (kind, line - 0.25), (kind, line + 0.25)])
+    np.testing.assert_array_equal(aggregator.weights[0], (aggregator.weights[1] + aggregator.weights[2]) / 2)
+
+
+def test_identitiesOfMarkets():
+    markets = [('home',), ('draw',), ('away',), ('homeOrDraw',), ('drawOrAway',), ('bothScore',), ('notBothScore',), ('over', 1.5), ('under', 1.5),
+               ('asianHandicapHome', 0.0), ('asianHandicapAway', 0.0), ('asianHandicapHome', -0.5), ('asianHandicapHome', 0.5), ('asianHandicapAway', -0.25), ('asianHandicapHome', 0.25)]
+    probabilities = pd.DataFrame(model.createMarketAggregator(markets).calculateMarketProbabilities(scoreMatrices), columns = MarketAggregator(markets).columns)
+    np.testing.assert_allclose(probabilities['probHomeOrDraw'], probabilities['probHome'] + probabilities['probDraw'])
+    np.testing.assert_allclose(probabilities['probBothScore'] + probabilities['probNotBothScore'], 1)
+    np.testing.assert_allclose(probabilities['probOver15'] + probabilities['probUnder15'], 1)
+    #draw no bet and handicaps without refunds
+    np.testing.assert_allclose(probabilities['probAsianHandicapHome+0'], probabilities['probHome'] / (probabilities['probHome'] + probabilities['probAway']))
+    np.testing.assert_allclose(probabilities['probAsianHandicapHome+0'] + probabilities['probAsianHandicapAway+0'], 1)
+    np.testing.assert_allclose(probabilities['probAsianHandicapHome-05'], probabilities['probHome'])
+    np.testing.assert_allclose(probabilities['probAsianHandicapHome+05'], probabilities['probHomeOrDraw'])
+    np.testing.assert_allclose(probabilities['probAsianHandicapHome+025'] + probabilities['probAsianHandicapAway-025'], 1)
+
+
+def test_marketJacobianEqualsFiniteDifferences():
+    aggregator = model.createMarketAggregator(MarketAggregator.createBoard())
+    antHome, antAway = np.array([0.4, 1.3, 2.7]), np.array([1.1, 0.8, 0.3])
+    probabilities, jacobian = model.calculateMarketJacobian(aggregator, antHome, antAway)
+    step = 1e-6
+    home = (aggregator.calculateMarketProbabilities(model.calculateProbabilities(antHome + step, antAway)) - aggregator.calculateMarketProbabilities(model.calculateProbabilities(antHome - step, antAway))) / (2 * step)
+    away = (aggregator.calculateMarketProbabilities(model.calculateProbabilities(antHome, antAway + step)) - aggregator.calculateMarketProbabilities(model.calculateProbabilities(antHome, antAway - step))) / (2 * step)
+    np.testing.assert_allclose(jacobian[...,0], home, atol = 1e-8)
+    np.testing.assert_allclose(jacobian[...,1], away, atol = 1e-8)
+
+
+def test_spreadLines():
+    data = pd.DataFrame({'line': [-0.5, -0.25, -0.5, np.nan], 'probAHHome': [0.5, 0.55, 0.6, 0.4], 'probAHAway': [0.5, 0.45, 0.4, 0.6]})
+    spread = MarketAggregator.spreadLines(data, 'line', {'probAHHome': 'asianHandicapHome', 'probAHAway': 'asianHandicapAway'})
+    assert sorted(spread.columns) == sorted(['probAsianHandicapHome-05', 'probAsianHandicapAway+05', 'probAsianHandicapHome-025', 'probAsianHandicapAway+025'])
+    np.testing.assert_array_equal(spread['probAsianHandicapHome-05'], [0.5, np.nan, 0.6, np.nan])
+    np.testing.assert_array_equal(spread['probAsianHandicapAway+025'], [np.nan, 0.45, np.nan, np.nan])
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Tests of the scores of several models in one pass (MetricsCalculation.scoreModels) against the scores of single models
+"""
+
+import logging
+import numpy as np
+import pandas as pd
+from bettingCalculationTools.Metrics import MetricsCalculation
+
+
+def createMatches(number = 100, seed = 0):
+    rng = np.random.default_rng(seed)
+    probabilities = rng.dirichlet([4, 3, 3], number)
+    over = rng.uniform(0.3, 0.7, number)
+    data = pd.DataFrame({'goalsHome': rng.poisson(1.4, number), 'goalsAway': rng.poisson(1.1, number),
+                         'probHome': probabilities[:,0], 'probDraw': probabilities[:,1], 'probAway': probabilities[:,2], 'probOver25': over, 'probUnder25': 1 - over,
+                         'anticipatedGoalsHome': rng.uniform(0.5, 2.5, number), 'anticipatedGoalsAway': rng.uniform(0.5, 2, number)})
+    data['probHomeFlat'] = data['probDrawFlat'] = data['probAwayFlat'] = 1 / 3
+    data['probOver25Flat'] = data['probUnder25Flat'] = 0.5
+    return data
+
+
+def test_scoresEqualScoresOfSingleModels():
+    data = createMatches()
+    models = {'odds': ['probHome', 'probDraw', 'probAway', 'probOver25', 'probUnder25'],
+              'flat': ['probHomeFlat', 'probDrawFlat', 'probAwayFlat', 'probOver25Flat', 'probUnder25Flat']}
+    scores = MetricsCalculation.scoreModels(data, models, {'goals': ['anticipatedGoalsHome', 'anticipatedGoalsAway']}).set_index(['model', 'metric'])['value']
+    for model, columns in models.items():
+        renamed = data[columns].set_axis(models['odds'], axis = 1).assign(goalsHome = data['goalsHome'], goalsAway = data['goalsAway'])
+        assert np.isclose(scores[(model, 'rpsHDA')], MetricsCalculation.calculateRPSHDA(renamed).mean())
+        assert np.isclose(scores[(model, 'rpsOU')], MetricsCalculation.calculateRPSOU(renamed).mean())
+    squaredHome, squaredAway = MetricsCalculation.calculateSquaredErrorAnticipatedGoals(data)
+    assert np.isclose(scores[('goals', 'squaredErrorHome')], squaredHome)
+    assert np.isclose(scores[('goals', 'squaredErrorAway')], squaredAway)
+    assert np.isclose(scores[('flat', 'brierHDA')], 2 / 3)
+    assert np.isclose(scores[('flat', 'logLossOU')], np.log(2))
+
+
+#the scores write nothing to the standard output, the number of matches is logged on the debug level
+def test_scoresAreLoggedInsteadOfPrinted(capsys, caplog):
+    data = createMatches()
+    with caplog.at_level(logging.DEBUG, logger = 'bettingCalculationTools.Metrics'):
+        MetricsCalculation.scoreModels(data, {'odds': ['probHome', 'probDraw', 'probAway', 'probOver25', 'probUnder25']})
+        MetricsCalculation.calculateRPSAvgHDA(data)
+        MetricsCalculation.calculateRPSAvgOU(data)
+        MetricsCalculation.calculateSquaredErrorAnticipatedGoals(data)
+    assert capsys.readouterr().out == ''
+    assert [record.getMessage() for record in caplog.records] == ['Scores of 1 models calculated for 100 matches', 'RPS HDA calculated for 100 matches',
+                                                                  'RPS OU calculated for 100 matches', 'Squared error home and away calculated for 100 matches']
+
+
+#counts, rates and intervals of the former evaluation of each predictor (favourite per predictor, draws excluded, groups by season and round)
+def calculateFormerAccuracy(data, favourites):
+    from statsmodels.stats.proportion import proportion_confint
+    data = data.assign(winner = 0)
+    data.loc[data['goalsHome'] > data['goalsAway'], 'winner'] = 1
+    data.loc[data['goalsHome'] < data['goalsAway'], 'winner'] = 2
+    data = data[data['winner'] != 0]
+    results = {}
+    for variable in favourites:
+        dataEval = data[favourites[variable][data.index] != 0].assign(favourite = favourites[variable][data.index][favourites[variable][data.index] != 0])
+        n = len(dataEval.index)
+        favouriteWins = len(dataEval[dataEval['winner'] == dataEval['favourite']].index)
+        results[('overall', variable)] = (favouriteWins, n, favouriteWins/n) + proportion_confint(favouriteWins, n, method = 'binom_test')
+        nSeason = dataEval.groupby(['season', 'round'])['season'].count()
+        favoriteWinsSeason = dataEval[dataEval['winner'] == dataEval['favourite']].groupby(['season', 'round'])['season'].count()
+        results[('season/round', variable)] = favoriteWinsSeason / nSeason
+        dataEval = dataEval[dataEval['round'] == 'second']
+        n = len(dataEval.index)
+        favouriteWins = len(dataEval[dataEval['winner'] == dataEval['favourite']].index)
+        results[('second', variable)] = (favouriteWins, n, favouriteWins/n) + proportion_confint(favouriteWins, n, method = 'binom_test')
+    return results
+
+
+def test_winnerAccuracyEqualsFormerEvaluation():
+    rng = np.random.default_rng(2)
+    number = 3000
+    data = pd.DataFrame({'season': rng.choice(['2000/2001', '2001/2002', '2002/2003'], number), 'round': rng.choice(['first', 'second'], number),
+                         'goalsHome': rng.poisson(1.4, number).astype(float), 'goalsAway': rng.poisson(1.1, number).astype(float),
+                         'oddsHome': rng.choice([1.5, 2.0, 2.5, 3.0], number), 'oddsAway': rng.choice([1.5, 2.0, 2.5, 3.0], number),
+                         'eloHome': rng.normal(1500, 100, number), 'eloAway': rng.normal(1500, 100, number)})
+    data.loc[rng.choice(number, 30, replace = False), 'goalsHome'] = np.nan
+    data.loc[rng.choice(number, 30, replace = False), 'eloHome'] = np.nan
+    #a weak predictor, which never picks the winner in some groups
+    data['rare'] = np.where(rng.uniform(size = number) < 0.01, 1.0, 0.0)
+    predictors = {'location': lambda data: np.ones(len(data.index)),
+                  'odds': lambda data: data['oddsAway'] - data['oddsHome'],
+                  'elo': lambda data: data['eloHome'] + 80 - data['eloAway'],
+                  'rare': 'rare'}
+    accuracy = MetricsCalculation.calculateWinnerAccuracy(data, predictors, groupings = [[], ['round'], ['season', 'round']])
+    #favourites as in the former analysis
+    favourites = {'location': pd.Series(1, index = data.index),
+                  'odds': pd.Series(np.select([data['oddsHome'] < data['oddsAway'], data['oddsHome'] > data['oddsAway']], [1, 2], 0), index = data.index),
+                  'elo': pd.Series(np.select([data['eloHome'] + 80 > data['eloAway'], data['eloHome'] + 80 < data['eloAway']], [1, 2], 0), index = data.index),
+                  'rare': pd.Series((data['rare'] > 0).astype(int), index = data.index)}
+    expected = calculateFormerAccuracy(data, favourites)
+    overall = accuracy[accuracy['grouping'] == 'overall'].set_index('predictor')
+    second = accuracy[(accuracy['grouping'] == 'round') & (accuracy['round'] == 'second')].set_index('predictor')
+    bySeason = accuracy[accuracy['grouping'] == 'season/round'].set_index(['predictor', 'season', 'round']).sort_index()
+    for variable in predictors:
+        for results, key in [(overall, 'overall'), (second, 'second')]:
+            assert tuple(results.loc[variable, ['hits', 'matches']]) == expected[(key, variable)][:2]
+            np.testing.assert_allclose(results.loc[variable, ['rate', 'lower', 'upper']].to_numpy(dtype = float), expected[(key, variable)][2:], rtol = 1e-12)
+        #the former rates per season and round were missing for groups without any win of the favourite, they are 0 now
+        former = expected[('season/round', variable)]
+        np.testing.assert_allclose(bySeason.loc[variable, 'rate'].reindex(former.index).to_numpy(), former.fillna(0).to_numpy(), rtol = 1e-12)
+    assert expected[('season/round', 'rare')].isna().any()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Tests of the conversion of betting odds into probabilities by basic normalisation and Shin's model
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.optimize import brentq
+from bettingCalculationTools.ProbabilityCalculation import BasicNormalisation, ShinModel
+
+
+#probabilities of Shin's model for a single match, z is the root of the sum of the probabilities minus 1
+def calculateShinProbabilities(odds):
+    inverseOdds = 1 / np.asarray(odds, dtype = float)
+    sumInverseOdds = inverseOdds.sum()
+    probabilities = lambda z: (np.sqrt(z**2 + 4 * (1 - z) * inverseOdds**2 / sumInverseOdds) - z) / (2 * (1 - z))
+    z = brentq(lambda z: probabilities(z).sum() - 1, 0, 0.5, xtol = 1e-15)
+    return probabilities(z)
+
+
+def createOdds(outcomes, number = 200, seed = 0):
+    rng = np.random.default_rng(seed)
+    probabilities = rng.dirichlet(np.full(outcomes, 3.0), number)
+    margins = rng.uniform(0.02, 0.12, (number, 1))
+    return [pd.Series(column) for column in (1 / (probabilities * (1 + margins))).T]
+
+
+#three outcomes use the fixed-point iteration, two outcomes the closed-form solution
+@pytest.mark.parametrize('outcomes', [2, 3])
+def test_shinEqualsSingleMatchSolution(outcomes):
+    odds = createOdds(outcomes)
+    probabilities = ShinModel().calculateProbabilities(*odds).to_numpy()
+    expected = np.array([calculateShinProbabilities(row) for row in np.column_stack(odds)])
+    np.testing.assert_allclose(probabilities, expected, atol = 1e-10)
+    np.testing.assert_allclose(probabilities.sum(axis=1), 1, atol = 1e-10)
+
+
+def test_missingOddsLeadToMissingProbabilities():
+    odds = createOdds(3, 20)
+    odds[1][5] = np.nan
+    for calculator in [ShinModel(), BasicNormalisation()]:
+        probabilities = np.column_stack(calculator.calculateProbabilities(*odds)) if isinstance(calculator, BasicNormalisation) else calculator.calculateProbabilities(*odds).to_numpy()
+        assert np.isnan(probabilities[5]).all()
+        assert not np.isnan(np.delete(probabilities, 5, axis=0)).any()
+
+
+def test_marketProbabilitiesOfFurtherBooks():
+    overOdds, underOdds = createOdds(2, 20)
+    data = pd.DataFrame({'oddsOver15': overOdds, 'oddsUnder15': underOdds})
+    data = ShinModel().addMarketProbabilities(data, [(['oddsOver15', 'oddsUnder15'], ['probOver15', 'probUnder15'])])
+    expected = np.array([calculateShinProbabilities(row) for row in np.column_stack([overOdds, underOdds])])
+    np.testing.assert_allclose(data[['probOver15', 'probUnder15']].to_numpy(), expected, atol = 1e-10)
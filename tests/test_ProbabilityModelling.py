@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Tests of the score models of ProbabilityModelling (derivatives, inversion, truncation and tables)
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import poisson
+from bettingCalculationTools.ProbabilityModelling import PoissonModel, DixonColesModel, BivariatePoissonModel, NegativeBinomialModel, obtainTables
+
+
+models = [PoissonModel(), DixonColesModel(-0.1), BivariatePoissonModel(0.1), NegativeBinomialModel(5)]
+antHome = np.array([0.4, 1.3, 2.7, 3.5])
+antAway = np.array([1.1, 0.8, 0.3, 2.2])
+
+
+@pytest.mark.parametrize('model', models, ids = lambda model: model.type)
+def test_derivativesEqualFiniteDifferences(model):
+    derivatives = model.calculateProbabilityDerivatives(antHome, antAway)
+    step = 1e-6
+    home = (model.calculateProbabilities(antHome + step, antAway) - model.calculateProbabilities(antHome - step, antAway)) / (2 * step)
+    away = (model.calculateProbabilities(antHome, antAway + step) - model.calculateProbabilities(antHome, antAway - step)) / (2 * step)
+    np.testing.assert_allclose(derivatives[:,0], home, atol = 1e-8)
+    np.testing.assert_allclose(derivatives[:,1], away, atol = 1e-8)
+    summarised, jacobian = model.calculateOutcomeJacobian(antHome, antAway)
+    homeOutcomes = (model.calculateOutcomeProbabilities(antHome + step, antAway) - model.calculateOutcomeProbabilities(antHome - step, antAway)) / (2 * step)
+    np.testing.assert_allclose(jacobian[...,0], homeOutcomes, atol = 1e-8)
+
+
+#the continuous inversion of a model recovers the anticipated goals the probabilities were calculated with
+@pytest.mark.parametrize('model', models, ids = lambda model: model.type)
+def test_continuousInversionRecoversAnticipatedGoals(model):
+    probabilities = model.calculateOutcomeProbabilities(antHome, antAway)
+    table = model.calculateTable(step = 0.1)
+    startHome, startAway = model.obtainAllAnticipatedGoals(table, probabilities)
+    home, away = model.refineAnticipatedGoals(probabilities, startHome, startAway)
+    np.testing.assert_allclose(home, antHome, atol = 1e-6)
+    np.testing.assert_allclose(away, antAway, atol = 1e-6)
+
+
+#the truncation of the heavier tails of the negative binomial model hardly shifts the mean for realistic anticipated goals
+@pytest.mark.parametrize('dispersion', [2, 5, 10])
+def test_negativeBinomialTruncation(dispersion):
+    model = NegativeBinomialModel(dispersion)
+    expectedGoals = np.array([0.5, 1.5, 2.5, 3.5])
+    probabilities = model.calculateGoalProbabilities(expectedGoals)
+    means = (probabilities * np.arange(model.maxGoals)).sum(axis=-1) / probabilities.sum(axis=-1)
+    assert (probabilities.sum(axis=-1) > 0.998).all()
+    np.testing.assert_allclose(means, expectedGoals, atol = 0.02)
+
+
+def test_tablesOfEqualModelsAreCalculatedOnce(tmp_path):
+    tables = obtainTables([DixonColesModel(-0.1), DixonColesModel(-0.1), PoissonModel()], step = 0.5, directory = str(tmp_path), workers = 2)
+    assert len(list(tmp_path.iterdir())) == 2
+    pd.testing.assert_frame_equal(tables[0], tables[1])
+    pd.testing.assert_frame_equal(tables[2], PoissonModel().calculateTable(step = 0.5))
+
+
+#the score matrices of the Poisson model equal the products of the probabilities of scipy (as calculated match by match before)
+def test_poissonScoreMatricesEqualScipy():
+    model = PoissonModel()
+    goals = np.arange(model.maxGoals)
+    expected = np.stack([np.outer(poisson.pmf(goals, home), poisson.pmf(goals, away)) for home, away in zip(antHome, antAway)])
+    np.testing.assert_allclose(model.calculateProbabilities(antHome, antAway), expected, rtol = 1e-12, atol = 1e-300)
+    summarised = model.summariseProbabilities(expected)
+    homeWins = np.array([np.tril(matrix, -1).sum() / matrix.sum() for matrix in expected])
+    overs = np.array([matrix[np.add.outer(goals, goals) > 2].sum() / matrix.sum() for matrix in expected])
+    np.testing.assert_allclose(summarised[:,0], homeWins)
+    np.testing.assert_allclose(summarised[:,3], overs)
+
+
+#the batched table equals the probabilities calculated cell by cell
+def test_tableEqualsProbabilitiesOfSingleCells():
+    model = PoissonModel()
+    table = model.calculateTable(step = 0.5)
+    assert len(table.index) == 12 * 12
+    for index in [0, 13, 77, 143]:
+        cell = table.iloc[index]
+        np.testing.assert_allclose(cell[model.probabilityColumns].to_numpy(dtype = float), model.calculateOutcomeProbabilities(cell['antHome'], cell['antAway']), atol = 1e-15)
+
+
+def test_cachedTableEqualsCalculatedTable(tmp_path):
+    model = PoissonModel()
+    table = model.obtainTable(step = 0.5, directory = str(tmp_path))
+    pd.testing.assert_frame_equal(model.obtainTable(step = 0.5, directory = str(tmp_path)), table)
+    pd.testing.assert_frame_equal(table, model.calculateTable(step = 0.5))
+
+
+#a single table is split into chunks of rows for all workers, the chunks equal the table calculated at once (up to rounding of the batched calculation)
+@pytest.mark.parametrize('workers', [1, 3])
+def test_singleTableIsSplitAcrossWorkers(tmp_path, workers):
+    model = DixonColesModel(-0.1)
+    table = obtainTables([model], step = 0.25, directory = str(tmp_path), workers = workers)[0]
+    pd.testing.assert_frame_equal(table, model.calculateTable(step = 0.25), rtol = 1e-12, atol = 1e-15)
+    assert [file.name for file in tmp_path.iterdir()] == [os.path.basename(model.tableFile(step = 0.25, directory = str(tmp_path)))]
+    parts = [model.calculateTable(step = 0.25, rows = rows) for rows in np.array_split(np.arange(24), 5)]
+    pd.testing.assert_frame_equal(pd.concat(parts, ignore_index = True), table, rtol = 1e-12, atol = 1e-15)
+    #cached tables are loaded
+    pd.testing.assert_frame_equal(obtainTables([model], step = 0.25, directory = str(tmp_path), workers = workers)[0], table)
+
+
+#the keys of the cached tables change with the code of the models, so that tables of an earlier version are not reused
+def test_tableKeysDependOnTheCode():
+    class ChangedPoissonModel(PoissonModel):
+        def calculateProbabilities(self, lambda1, lambda2):
+            return super().calculateProbabilities(lambda1 * 1.01, lambda2)
+    assert PoissonModel().tableKey() == PoissonModel().tableKey()
+    assert PoissonModel().tableKey().startswith('poissonModel_maxGoals10_code')
+    assert ChangedPoissonModel().tableKey() != PoissonModel().tableKey()
+    assert ChangedPoissonModel().tableKey().startswith('poissonModel_maxGoals10_code')
+    #the parameters are still part of the keys
+    assert DixonColesModel(-0.1).tableKey() != DixonColesModel(-0.05).tableKey()
+    assert DixonColesModel(-0.1).tableKey().endswith('_rho-0.1')
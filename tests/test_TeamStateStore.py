@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Tests of the incremental calculation of averages and Elo ratings by TeamStateStore on compact synthetic data
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import streamSyntheticFiles
+from TeamStateStore import TeamStateStore
+from bettingCalculationTools.DataImport import DataImporter
+
+
+@pytest.fixture(scope = 'module')
+def seasons(syntheticDirectory):
+    return streamSyntheticFiles(syntheticDirectory, compact = True)
+
+
+#teams are categories in compact data, grouping by team must neither warn nor add unobserved teams
+@pytest.mark.filterwarnings('error::FutureWarning')
+def test_incrementalUpdatesEqualFullRecalculation(seasons, tmp_path):
+    store = TeamStateStore(str(tmp_path / 'state.json'), 25, 80)
+    incremental = pd.concat([store.addMatches(season) for season in seasons], ignore_index = True)
+    data = DataImporter.concatenateData(seasons)
+    assert len(incremental.index) == len(data.index)
+    assert (store.checkConsistency(data, incremental) < 1e-9).all()
+    assert all(isinstance(division, int) for division in store.state['checkpoint']['elo']['divisions'].values())
+    assert not any(pd.isna(rating) for rating in store.state['checkpoint']['elo']['ratings'].values())
+
+
+def test_storedStateIsContinued(seasons, tmp_path):
+    file = str(tmp_path / 'state.json')
+    TeamStateStore(file, 25, 80).addMatches(DataImporter.concatenateData(seasons[:2]))
+    continued = TeamStateStore(file, 25, 80).addMatches(seasons[2])
+    full = TeamStateStore(None, 25, 80).addMatches(DataImporter.concatenateData(seasons))
+    merged = continued.merge(full, on = ['date', 'teamHome', 'teamAway'], suffixes = ('', 'Full'))
+    assert len(merged.index) == len(seasons[2].index)
+    np.testing.assert_allclose(merged['eloHome'], merged['eloHomeFull'])
+    np.testing.assert_allclose(merged['anticipatedGoalsHomeAverage'], merged['anticipatedGoalsHomeAverageFull'])
+
+
+#a team promoted after the first season that misses the last 40 days of this season is finalised before its next appearance if replayDays is shorter, so that its flags and Elo ratings differ from a full recalculation
+#(the incremental updates write no files, e.g. no export of the averages)
+@pytest.mark.parametrize('replayDays, consistent', [(365, True), (30, False)])
+def test_reappearanceAfterMoreThanReplayDaysIsFlagged(seasons, replayDays, consistent, monkeypatch):
+    first = seasons[0]
+    dates = pd.to_datetime(first['date'], format = '%d/%m/%y')
+    team = 'ATeam11'
+    absent = ((first['teamHome'] == team) | (first['teamAway'] == team)) & (dates > dates.max() - pd.Timedelta(days = 40))
+    assert absent.any()
+    data = [first[~absent]] + seasons[1:]
+    monkeypatch.setattr(pd.DataFrame, 'to_csv', lambda *arguments, **keywords: pytest.fail("no file is written"))
+    store = TeamStateStore(None, 25, 80, replayDays = replayDays)
+    incremental = pd.concat([store.addMatches(season) for season in data], ignore_index = True)
+    differences = store.checkConsistency(DataImporter.concatenateData(data), incremental)
+    assert (differences < 1e-9).all() == consistent
+    assert (differences[['avgGoalsHome', 'avgGoalsAway', 'anticipatedGoalsHomeAverage']] < 1e-9).all()
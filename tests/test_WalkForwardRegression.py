@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+@author: FW
+
+#Tests of the walk-forward regression against batch least squares refits on all earlier dates
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import streamSyntheticFiles
+from bettingCalculationTools.AnticipatedGoalsCalculation import WalkForwardRegression
+
+
+@pytest.fixture(scope = 'module')
+def matches(syntheticDirectory):
+    data = pd.concat(streamSyntheticFiles(syntheticDirectory), ignore_index = True)
+    data.sort_values(by = ['date', 'teamHome', 'teamAway'], inplace = True)
+    return data.reset_index(drop = True)
+
+
+@pytest.fixture(scope = 'module')
+def arrays(matches):
+    odds = matches[['oddsHome', 'oddsDraw', 'oddsAway', 'oddsUnder25', 'oddsOver25']].to_numpy(dtype = float)
+    features = np.column_stack([np.ones(len(matches.index)), odds])
+    targets = matches[['goalsHome', 'goalsAway']].to_numpy(dtype = float)
+    return matches['date'].to_numpy(), features, targets
+
+
+#weighted least squares with the ridge penalty of the initial covariance, which the recursive least squares solve exactly
+def fitBatch(features, targets, weights, penalty):
+    weightedFeatures = features * weights[:, None]
+    return np.linalg.solve(features.T @ weightedFeatures + penalty * np.eye(features.shape[1]), weightedFeatures.T @ targets)
+
+
+#predictions of a batch refit on all matches of earlier dates for every date, each match weighted by forgetting to the power of the number of matches of later dates
+def predictBatch(dates, features, targets, forgetting, minimumMatches, initialVariance):
+    predictions = np.full(targets.shape, np.nan)
+    dateEnds = np.searchsorted(dates, dates, side = 'right')
+    for date in np.unique(dates):
+        current = dates == date
+        start = np.argmax(current)
+        if(start < minimumMatches):
+            continue
+        earlier = np.arange(len(dates)) < start
+        weights = forgetting**(start - dateEnds[earlier])
+        #the prior of the initial covariance is forgotten as well
+        penalty = forgetting**start / initialVariance
+        predictions[current] = features[current] @ fitBatch(features[earlier], targets[earlier], weights, penalty)
+    return predictions
+
+
+#without forgetting the block update per date equals an ordinary least squares refit on all earlier dates
+def test_recursiveUpdateEqualsBatchRefit(arrays):
+    dates, features, targets = arrays
+    result = WalkForwardRegression(forgetting = 1.0, minimumMatches = 30).predictWalkForward(dates, features, targets)
+    expected = predictBatch(dates, features, targets, 1.0, 30, 1e6)
+    np.testing.assert_allclose(result, expected, rtol = 1e-6, atol = 1e-8)
+    #the penalty of the initial covariance is negligible against ordinary least squares
+    start = np.argmax(dates == dates[150])
+    ordinary = np.linalg.lstsq(features[:start], targets[:start], rcond = None)[0]
+    np.testing.assert_allclose(result[dates == dates[150]], features[dates == dates[150]] @ ordinary, atol = 1e-3)
+
+
+#the covariance is divided by forgetting to the power of the block size, so a match is down-weighted by forgetting to the power of the number of matches of later dates
+def test_forgettingDecaysPerMatch(arrays):
+    dates, features, targets = arrays
+    result = WalkForwardRegression(forgetting = 0.99, minimumMatches = 30).predictWalkForward(dates, features, targets)
+    expected = predictBatch(dates, features, targets, 0.99, 30, 1e6)
+    np.testing.assert_allclose(result, expected, rtol = 1e-6, atol = 1e-8)
+    #a block of 8 matches decays the earlier information by forgetting**8 and weights its own matches equally
+    coefficients = np.zeros((features.shape[1], targets.shape[1]))
+    covariance = 1e6 * np.eye(features.shape[1])
+    blockCoefficients, blockCovariance = WalkForwardRegression(forgetting = 0.9).updateRecursiveLeastSquares(coefficients, covariance, features[:8], targets[:8])
+    covariance = covariance / 0.9**8
+    for row in range(8):
+        coefficients, covariance = WalkForwardRegression(forgetting = 1.0).updateRecursiveLeastSquares(coefficients, covariance, features[row:row+1], targets[row:row+1])
+    np.testing.assert_allclose(blockCoefficients, coefficients, rtol = 1e-6)
+    np.testing.assert_allclose(blockCovariance, covariance, rtol = 1e-6)
+
+
+#the goals of a date never enter the predictions of the same or earlier dates
+def test_noLookahead(arrays):
+    dates, features, targets = arrays
+    calculator = WalkForwardRegression(forgetting = 0.995, minimumMatches = 30)
+    result = calculator.predictWalkForward(dates, features, targets)
+    for date in [dates[40], dates[150], dates[-1]]:
+        changed = targets.copy()
+        changed[dates >= date] += 10
+        np.testing.assert_array_equal(calculator.predictWalkForward(dates, features, changed)[dates <= date], result[dates <= date])
+
+
+@pytest.mark.parametrize('minimumMatches', [0, 1, 25, 100])
+def test_firstMatchesAreNotPredicted(matches, minimumMatches):
+    result = WalkForwardRegression(minimumMatches = minimumMatches).addAnticipatedGoals(matches.copy())
+    predicted = result['anticipatedGoalsHome'].notna().to_numpy()
+    assert not predicted[:minimumMatches].any()
+    #the predictions start with the first date that begins after the first minimumMatches matches
+    dateStarts = np.flatnonzero(np.insert(result['date'].to_numpy()[1:] != result['date'].to_numpy()[:-1], 0, True))
+    firstPrediction = dateStarts[dateStarts >= minimumMatches][0]
+    np.testing.assert_array_equal(predicted, np.arange(len(predicted)) >= firstPrediction)
+    assert result['anticipatedGoalsAway'].notna().to_numpy().tolist() == predicted.tolist()